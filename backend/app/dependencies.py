@@ -0,0 +1,12 @@
+from fastapi import HTTPException, Request
+from services.langflow_service import LangFlowService
+
+
+def get_langflow_service(request: Request) -> LangFlowService:
+    """Get the application-wide LangFlow service created at startup"""
+    service = getattr(request.app.state, "langflow_service", None)
+    if service is None:
+        # Flow not configured (or the app was started without its lifespan)
+        detail = getattr(request.app.state, "langflow_error", None) or "LangFlow service is not initialized"
+        raise HTTPException(status_code=500, detail=detail)
+    return service
@@ -1,12 +1,124 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from app.routes import onboarding
+from app.services.config_loader import get_config_loader
+from app.services.jobs import get_job_queue
+from app.services.speculation import get_speculative_starts
+from app.utils.logging_setup import setup_logging, shutdown_logging
+from services import fastjson, metrics
+from services.curriculum import get_curriculum_index
+from services.langflow_service import LangFlowService
+import asyncio
+import logging
 import os
+import time
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+HTTP_IN_FLIGHT = metrics.Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled"
+)
+HTTP_REQUESTS = metrics.Counter(
+    "http_requests_total",
+    "Handled requests by route template and status code",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = metrics.Histogram(
+    "http_request_duration_seconds",
+    "Request handling time by route template, until the response is fully sent",
+    ["method", "route"]
+)
+
+
+class MetricsMiddleware:
+    """Track in-flight requests and time each request by its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Set by the router once a route matched - templates keep label cardinality low
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route_path)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route_path, status=status)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the shared LangFlow service at startup and close it at shutdown
+
+    The service's settings come from the config loader, which also
+    watches the config file and applies changes while the app runs.
+    """
+    setup_logging()  # No-op unless a previous shutdown stopped it
+    app.state.langflow_service = None
+    app.state.langflow_error = None
+    watcher = None
+    try:
+        config_loader = get_config_loader()
+        app.state.langflow_service = LangFlowService(config=config_loader.snapshot)
+    except (ValueError, FileNotFoundError) as e:
+        # Flow not configured - keep serving, routes report the error
+        app.state.langflow_error = str(e)
+        logger.warning("LangFlow service not configured: %s", e)
+    else:
+        await app.state.langflow_service.warm_up()
+        if app.state.langflow_service.config.components.get("exercise_curriculum"):
+            # Map (or build, if the guide changed) the retrieval index before the first request
+            get_curriculum_index()
+        # Config file edits apply without a restart (CONFIG_WATCH=false to turn off)
+        config_loader.subscribe(app.state.langflow_service.apply_config)
+        if os.getenv('CONFIG_WATCH', 'true').lower() == 'true':
+            watcher = asyncio.create_task(
+                config_loader.watch(poll_interval=float(os.getenv('CONFIG_POLL_SECONDS', 2)))
+            )
+
+    yield
+
+    if watcher is not None:
+        watcher.cancel()
+    # Jobs still queued or running are saved as failed
+    await get_job_queue().aclose()
+    speculative = get_speculative_starts()
+    if speculative is not None:
+        # Unclaimed speculative runs - stop them before their client closes
+        await speculative.aclose()
+    if app.state.langflow_service is not None:
+        await app.state.langflow_service.aclose()
+    shutdown_logging()
+
 
 app = FastAPI(
     title="WriteBot API",
     description="Backend API for WriteBot onboarding workflow",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson when installed (FAST_JSON=false to force the standard library)
+    default_response_class=ORJSONResponse if fastjson.ENABLED else JSONResponse
 )
 
 # CORS configuration
@@ -21,6 +133,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(onboarding.router)
 
@@ -44,6 +158,20 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Scenario cache hit/miss counters (null when the cache is disabled)"""
+    service = app.state.langflow_service
+    cache = service.scenario_cache if service else None
+    return {"scenario_cache": cache.stats() if cache else None}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics (text exposition format)"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
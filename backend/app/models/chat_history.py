@@ -0,0 +1,442 @@
+"""
+Chat history - append-only per-session log of exercise chat turns
+
+Flow 3 keeps its own memory keyed by session_id, but the backend needs the
+transcript too: to replay or resume a chat, to export it, and to send
+LangFlow a bounded window of recent turns instead of letting its memory
+grow for the whole session.
+
+Turns get consecutive offsets per session (0, 1, 2, ...) and are never
+changed once written. InMemoryChatHistory keeps each session's log as a
+list of fixed-size segments, so "last N turns" and "turns since offset"
+jump straight to the right segment and copy only the window.
+SQLiteChatHistory stores turns keyed by (session_id, offset) in the
+session database, so the same reads are index range scans. Both drop a
+session's oldest turns past max_turns.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.models.session_store import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS
+from services.metrics import Histogram
+
+CHAT_HISTORY_SECONDS = Histogram(
+    "chat_history_duration_seconds",
+    "Time spent in chat history operations",
+    ["operation"]
+)
+
+DEFAULT_MAX_TURNS = 500
+SEGMENT_TURNS = 64
+
+ROLE_USER = "user"
+ROLE_ASSISTANT = "assistant"
+
+
+class ChatTurn(NamedTuple):
+    """One message in an exercise chat"""
+    role: str                # "user" or "assistant"
+    content: str
+    exercise: Optional[str]  # Title of the exercise the turn belongs to
+    created_at: float        # Unix time
+
+
+class ChatWindow(NamedTuple):
+    """A run of consecutive turns from one session's log"""
+    offset: int              # Offset of turns[0]
+    turns: List[ChatTurn]
+    next_offset: int         # Offset the next appended turn will get
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "next_offset": self.next_offset,
+            "turns": [
+                {
+                    "offset": self.offset + i,
+                    "role": turn.role,
+                    "content": turn.content,
+                    "exercise": turn.exercise,
+                    "created_at": datetime.fromtimestamp(turn.created_at).isoformat()
+                }
+                for i, turn in enumerate(self.turns)
+            ]
+        }
+
+
+class ChatHistory(ABC):
+    """Interface for chat history backends"""
+
+    @abstractmethod
+    def append(
+        self,
+        session_id: str,
+        turns: Iterable[Tuple[str, str]],
+        exercise: Optional[str] = None
+    ) -> int:
+        """
+        Append turns to a session's log in one write
+
+        Args:
+            session_id: Session the chat belongs to
+            turns: (role, content) pairs, oldest first
+            exercise: Exercise the turns belong to (default: the exercise of
+                the session's last turn)
+
+        Returns:
+            Offset of the first appended turn
+        """
+
+    @abstractmethod
+    def since(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> ChatWindow:
+        """Up to limit turns starting at offset (or the oldest turn still kept)"""
+
+    @abstractmethod
+    def last(self, session_id: str, count: int) -> ChatWindow:
+        """The session's last count turns"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove a session's log"""
+
+
+class _ChatLog:
+    """One session's turns as fixed-size segments - all full except the last"""
+
+    __slots__ = ("segments", "start", "end", "exercise")
+
+    def __init__(self):
+        self.segments: List[List[ChatTurn]] = []
+        self.start = 0   # Offset of segments[0][0]; always a multiple of SEGMENT_TURNS
+        self.end = 0     # Offset of the next turn
+        self.exercise: Optional[str] = None
+
+    def append(self, turn: ChatTurn):
+        if not self.segments or len(self.segments[-1]) == SEGMENT_TURNS:
+            self.segments.append([])
+        self.segments[-1].append(turn)
+        self.end += 1
+
+    def trim(self, max_turns: int):
+        # Drop whole segments only, so offsets map to segments by division
+        while self.end - self.start - SEGMENT_TURNS >= max_turns:
+            self.segments.pop(0)
+            self.start += SEGMENT_TURNS
+
+    def window(self, offset: int, limit: Optional[int]) -> ChatWindow:
+        offset = min(max(offset, self.start), self.end)
+        stop = self.end if limit is None else min(self.end, offset + max(limit, 0))
+        turns: List[ChatTurn] = []
+        index, position = divmod(offset - self.start, SEGMENT_TURNS)
+        while len(turns) < stop - offset:
+            segment = self.segments[index]
+            turns.extend(segment[position:position + stop - offset - len(turns)])
+            index, position = index + 1, 0
+        return ChatWindow(offset, turns, self.end)
+
+
+class InMemoryChatHistory(ChatHistory):
+    """
+    In-process chat history with sliding TTL and LRU eviction per session
+
+    Matches InMemorySessionStore, so a chat log lives about as long as its
+    session.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = DEFAULT_MAX_TURNS,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_sessions: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # session_id -> (expires_at, log), oldest access first
+        self._logs: "OrderedDict[str, Tuple[float, _ChatLog]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str, now: float) -> Optional[_ChatLog]:
+        entry = self._logs.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._logs[session_id]
+            return None
+        self._logs[session_id] = (now + self.ttl_seconds, entry[1])
+        self._logs.move_to_end(session_id)
+        return entry[1]
+
+    def append(self, session_id, turns, exercise=None) -> int:
+        now = time.monotonic()
+        created_at = time.time()
+        with self._lock:
+            log = self._get(session_id, now)
+            if log is None:
+                log = _ChatLog()
+                self._logs[session_id] = (now + self.ttl_seconds, log)
+                while len(self._logs) > self.max_sessions:
+                    self._logs.popitem(last=False)
+            if exercise is not None:
+                log.exercise = sys.intern(exercise)
+            offset = log.end
+            for role, content in turns:
+                log.append(ChatTurn(sys.intern(role), content, log.exercise, created_at))
+            log.trim(self.max_turns)
+            return offset
+
+    def since(self, session_id, offset=0, limit=None) -> ChatWindow:
+        with self._lock:
+            log = self._get(session_id, time.monotonic())
+            if log is None:
+                return ChatWindow(0, [], 0)
+            return log.window(offset, limit)
+
+    def last(self, session_id, count) -> ChatWindow:
+        with self._lock:
+            log = self._get(session_id, time.monotonic())
+            if log is None:
+                return ChatWindow(0, [], 0)
+            return log.window(log.end - count, count)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._logs.pop(session_id, None)
+
+
+class SQLiteChatHistory(ChatHistory):
+    """
+    Durable chat history in the SQLite session database
+
+    Turns are rows keyed by (session_id, seq) in a WITHOUT ROWID table, so
+    a window is a range scan of the primary key. Appends take the write
+    lock up front (BEGIN IMMEDIATE), so workers appending to the same
+    session can't hand out the same offset. Logs whose last turn is older
+    than the TTL are purged periodically on write.
+    """
+
+    PURGE_EVERY = 100  # appends between expired-log purges
+
+    def __init__(self, db_path: str, max_turns: int = DEFAULT_MAX_TURNS, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.db_path = str(db_path)
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_turns ("
+            " session_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " exercise TEXT,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _end(self, conn: sqlite3.Connection, session_id: str) -> int:
+        row = conn.execute("SELECT MAX(seq) FROM chat_turns WHERE session_id = ?", (session_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def append(self, session_id, turns, exercise=None) -> int:
+        created_at = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last = conn.execute(
+                "SELECT seq, exercise FROM chat_turns WHERE session_id = ? ORDER BY seq DESC LIMIT 1",
+                (session_id,)
+            ).fetchone()
+            offset = 0 if last is None else last[0] + 1
+            if exercise is None and last is not None:
+                exercise = last[1]
+            rows = [
+                (session_id, offset + i, role, content, exercise, created_at)
+                for i, (role, content) in enumerate(turns)
+            ]
+            conn.executemany(
+                "INSERT INTO chat_turns (session_id, seq, role, content, exercise, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "DELETE FROM chat_turns WHERE session_id = ? AND seq < ?",
+                (session_id, offset + len(rows) - self.max_turns)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM chat_turns WHERE session_id IN ("
+                    " SELECT session_id FROM chat_turns GROUP BY session_id HAVING MAX(created_at) <= ?)",
+                    (created_at - self.ttl_seconds,)
+                )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return offset
+
+    def _window(self, conn: sqlite3.Connection, session_id: str, rows: List[tuple]) -> ChatWindow:
+        end = self._end(conn, session_id)
+        if not rows:
+            return ChatWindow(end, [], end)
+        return ChatWindow(rows[0][0], [ChatTurn(*row[1:]) for row in rows], end)
+
+    def since(self, session_id, offset=0, limit=None) -> ChatWindow:
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT seq, role, content, exercise, created_at FROM chat_turns"
+            " WHERE session_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+            (session_id, offset, -1 if limit is None else max(limit, 0))
+        ).fetchall()
+        return self._window(conn, session_id, rows)
+
+    def last(self, session_id, count) -> ChatWindow:
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT seq, role, content, exercise, created_at FROM chat_turns"
+            " WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, max(count, 0))
+        ).fetchall()
+        rows.reverse()
+        return self._window(conn, session_id, rows)
+
+    def delete(self, session_id):
+        conn = self._connection()
+        conn.execute("DELETE FROM chat_turns WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+
+def create_chat_history_from_env() -> ChatHistory:
+    """
+    Create the chat history backend matching the session store
+
+    Environment:
+        SESSION_STORE: 'memory' (default) or 'sqlite' - chat logs are kept
+            alongside sessions
+        CHAT_HISTORY_MAX_TURNS: Turns kept per session (default: 500)
+        SESSION_TTL_SECONDS, SESSION_MAX_ENTRIES, SESSION_DB_PATH: As for
+            the session store
+    """
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    max_turns = int(os.getenv("CHAT_HISTORY_MAX_TURNS", DEFAULT_MAX_TURNS))
+    ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+
+    if backend == "memory":
+        return InMemoryChatHistory(
+            max_turns=max_turns,
+            ttl_seconds=ttl_seconds,
+            max_sessions=int(os.getenv("SESSION_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        )
+    if backend == "sqlite":
+        return SQLiteChatHistory(
+            db_path=os.getenv("SESSION_DB_PATH", "data/sessions.db"),
+            max_turns=max_turns,
+            ttl_seconds=ttl_seconds
+        )
+    raise ValueError(f"Unknown SESSION_STORE '{backend}'. Use 'memory' or 'sqlite'")
+
+
+# Chat history backend (created on first use)
+_history: Optional[ChatHistory] = None
+
+
+def get_chat_history() -> ChatHistory:
+    """Get singleton chat history instance"""
+    global _history
+    if _history is None:
+        _history = create_chat_history_from_env()
+    return _history
+
+
+def set_chat_history(history: ChatHistory):
+    """Replace the chat history backend (e.g. for benchmarks)"""
+    global _history
+    _history = history
+
+
+def context_prompt(window: ChatWindow, message: str) -> str:
+    """
+    Flow 3 input carrying recent turns, for runs that don't use LangFlow's memory
+
+    Args:
+        window: Recent turns, oldest first
+        message: The student's new message
+
+    Returns:
+        The transcript followed by the new message, or the message alone
+        if there are no earlier turns
+    """
+    if not window.turns:
+        return message
+    lines = ["Conversation so far:"]
+    for turn in window.turns:
+        speaker = "Coach" if turn.role == ROLE_ASSISTANT else "Student"
+        lines.append(f"{speaker}: {turn.content}")
+    lines.append("")
+    lines.append(f"Student's new message: {message}")
+    return "\n".join(lines)
+
+
+def export_exercise_chat(
+    history: ChatHistory,
+    session_id: str,
+    exercises: Optional[List[Dict[str, Any]]],
+    exercise_title: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    One exercise's chat in the docs/example-chat-history-exercise-5.json shape
+
+    Args:
+        history: Chat history backend
+        session_id: Session to export
+        exercises: The session's parsed exercises (for id and focus)
+        exercise_title: Exercise to export (default: the most recent one)
+
+    Returns:
+        {"exercise_id", "exercise_title", "exercise_focus", "chat_history":
+        [{"role", "content"}], "metadata"}, or None if the session has no
+        turns for that exercise
+    """
+    window = history.since(session_id, 0)
+    if exercise_title is None:
+        exercise_title = next((turn.exercise for turn in reversed(window.turns) if turn.exercise), None)
+    turns = [turn for turn in window.turns if turn.exercise == exercise_title]
+    if not turns:
+        return None
+
+    exercise = next((ex for ex in exercises or [] if ex.get("title") == exercise_title), {})
+    started = datetime.fromtimestamp(turns[0].created_at)
+    return {
+        "exercise_id": exercise.get("id"),
+        "exercise_title": exercise_title,
+        "exercise_focus": exercise.get("focus", ""),
+        "chat_history": [{"role": turn.role, "content": turn.content} for turn in turns],
+        "metadata": {
+            "completion_time_minutes": round((turns[-1].created_at - turns[0].created_at) / 60),
+            "student_messages": sum(1 for turn in turns if turn.role == ROLE_USER),
+            "date": started.date().isoformat()
+        }
+    }
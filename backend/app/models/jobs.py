@@ -0,0 +1,262 @@
+"""
+Jobs - state of background flow runs, kept alongside sessions
+
+A job is one flow run submitted by a client that doesn't wait for it:
+queued, then running, then succeeded (with the route's usual response
+as its result) or failed (with the HTTP status and detail the route
+would have returned). The job queue (app.services.jobs) writes each
+state change here, and clients read it back by job ID.
+
+InMemoryJobStore keeps jobs in this process; SQLiteJobStore keeps them in
+the session database, so any worker can answer a poll for a job another
+worker is running. Jobs expire JOB_TTL_SECONDS after their last change.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.models.session_store import DEFAULT_MAX_ENTRIES
+from services import fastjson
+from services.metrics import Histogram
+
+JOB_STORE_SECONDS = Histogram(
+    "job_store_duration_seconds",
+    "Time spent in job store operations",
+    ["operation"]
+)
+
+DEFAULT_JOB_TTL_SECONDS = 60 * 60
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class Job:
+    """One background flow run and its outcome"""
+
+    __slots__ = ("job_id", "kind", "session_id", "status", "created_at", "updated_at", "result", "error")
+
+    def __init__(self, kind: str, session_id: str, job_id: Optional[str] = None):
+        self.job_id = job_id or str(uuid.uuid4())
+        self.kind = kind
+        self.session_id = session_id
+        self.status = JOB_QUEUED
+        self.created_at = datetime.now()
+        self.updated_at = self.created_at
+        self.result: Optional[Dict[str, Any]] = None
+        # {"status": <HTTP status>, "detail": ...} once failed
+        self.error: Optional[Dict[str, Any]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert job to dictionary"""
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+            "result": self.result,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        """Rebuild a job from to_dict() output"""
+        job = cls(data["kind"], data["session_id"], data["job_id"])
+        job.status = data["status"]
+        job.created_at = datetime.fromisoformat(data["created_at"])
+        job.updated_at = datetime.fromisoformat(data["updated_at"])
+        job.result = data.get("result")
+        job.error = data.get("error")
+        return job
+
+
+class JobStore(ABC):
+    """Interface for job storage backends"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by ID, or None if missing or expired"""
+
+    @abstractmethod
+    def save(self, job: Job):
+        """Insert or replace a job, restarting its TTL"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored jobs"""
+
+
+class InMemoryJobStore(JobStore):
+    """
+    In-process job store with TTL and a cap on stored jobs
+
+    Jobs are kept in order of their last change, so the first to expire
+    (or to be dropped past max_entries) are always at the front.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_JOB_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # job_id -> (expires_at, job), oldest change first
+        self._jobs: "OrderedDict[str, Tuple[float, Job]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._jobs[job_id]
+                return None
+            return entry[1]
+
+    def save(self, job: Job):
+        now = time.monotonic()
+        with self._lock:
+            self._jobs[job.job_id] = (now + self.ttl_seconds, job)
+            self._jobs.move_to_end(job.job_id)
+            while self._jobs:
+                job_id, (expires_at, _) = next(iter(self._jobs.items()))
+                if expires_at > now and len(self._jobs) <= self.max_entries:
+                    break
+                del self._jobs[job_id]
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Durable job store in the SQLite session database
+
+    Each thread gets its own connection. Expired rows are purged
+    periodically on write.
+    """
+
+    PURGE_EVERY = 100  # writes between expired-row purges
+
+    def __init__(self, db_path: str, ttl_seconds: float = DEFAULT_JOB_TTL_SECONDS):
+        self.db_path = str(db_path)
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires_at ON jobs (expires_at)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connection().execute(
+            "SELECT data FROM jobs WHERE job_id = ? AND expires_at > ?",
+            (job_id, time.time())
+        ).fetchone()
+        return None if row is None else Job.from_dict(fastjson.loads(row[0]))
+
+    def save(self, job: Job):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, data, expires_at) VALUES (?, ?, ?)",
+            (job.job_id, fastjson.dumps(job.to_dict()), now + self.ttl_seconds)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+        conn.commit()
+
+    def __len__(self) -> int:
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE expires_at > ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+
+def create_job_store_from_env() -> JobStore:
+    """
+    Create the job store matching the session store
+
+    Environment:
+        SESSION_STORE: 'memory' (default) or 'sqlite' - jobs are kept
+            alongside sessions
+        JOB_TTL_SECONDS: How long a job is kept after its last change
+            (default: 3600)
+        SESSION_MAX_ENTRIES, SESSION_DB_PATH: As for the session store
+    """
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    ttl_seconds = float(os.getenv("JOB_TTL_SECONDS", DEFAULT_JOB_TTL_SECONDS))
+
+    if backend == "memory":
+        return InMemoryJobStore(
+            ttl_seconds=ttl_seconds,
+            max_entries=int(os.getenv("SESSION_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        )
+    if backend == "sqlite":
+        return SQLiteJobStore(
+            db_path=os.getenv("SESSION_DB_PATH", "data/sessions.db"),
+            ttl_seconds=ttl_seconds
+        )
+    raise ValueError(f"Unknown SESSION_STORE '{backend}'. Use 'memory' or 'sqlite'")
+
+
+# Job storage backend (created on first use)
+_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    """Get singleton job store instance"""
+    global _store
+    if _store is None:
+        _store = create_job_store_from_env()
+    return _store
+
+
+def set_job_store(store: JobStore):
+    """Replace the job store (e.g. for benchmarks)"""
+    global _store
+    _store = store
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    """Get job by ID"""
+    with JOB_STORE_SECONDS.time(operation="get"):
+        return get_job_store().get(job_id)
+
+
+def save_job(job: Job):
+    """Save a new job or a job's state change"""
+    job.updated_at = datetime.now()
+    with JOB_STORE_SECONDS.time(operation="save"):
+        get_job_store().save(job)
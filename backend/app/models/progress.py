@@ -0,0 +1,437 @@
+"""
+Learner progress - incremental aggregation of assessment and feedback results
+
+Flow 2 (assessment + plan) and Flow 4 (session feedback) grade a learner's
+writing: a score, the mistakes found, focus areas. ProgressTracker folds
+each result into per-learner aggregates as it arrives, so questions like
+"what mistakes keep coming back" and "is the score going up" never rescan
+the learner's history:
+
+- Results are stored column-wise in typed arrays (time, score, and the
+  mistakes of each result as offsets into one flat array of mistake codes).
+- Mistake counts are kept for three windows - all time, the last 5
+  exercises and the last 14 days - and updated by adding the new result
+  and subtracting the one leaving the window.
+- Each window ranks mistakes with a lazy max-heap: changed counts are
+  pushed, stale entries are dropped when they reach the top, so top-k is
+  O(k log n).
+- Score averages and the trend (least-squares slope of the scores in the
+  last 5 exercises) come from running sums; day streaks from the last
+  active day.
+
+A mistake counts once per result, so its count is the number of
+exercises it appeared in. Aggregates live in this process (like
+SESSION_STORE=memory), keyed by session ID.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.session_store import DEFAULT_MAX_ENTRIES
+
+RECENT_EXERCISES = 5
+RECENT_DAYS = 14
+TREND_THRESHOLD = 1.0   # Score points per exercise that count as improving/declining
+MAX_MISTAKE_TYPES = 10000
+OTHER_MISTAKE = "other"
+
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+_FRACTION = re.compile(r"\s*(-?\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)\s*")
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip("%"))
+        except ValueError:
+            return None
+    return None
+
+
+def _score(value: Any, max_score: Any) -> Optional[float]:
+    """
+    A score on the 0-100 scale
+
+    Rescaled only when the scale is explicit - a "max_score" or a score
+    like "8/10"; a bare number is taken as 0-100.
+    """
+    if isinstance(value, str):
+        fraction = _FRACTION.fullmatch(value)
+        if fraction:
+            value, max_score = fraction.groups()
+    score = _number(value)
+    if score is None:
+        return None
+    scale = _number(max_score)
+    if scale is None or scale <= 0:
+        scale = 100.0
+    return min(max(score * 100.0 / scale, 0.0), 100.0)
+
+
+def _labels(values: Any) -> List[str]:
+    """Strings from a list of strings or of {"type"|"name"|"category"|"area": ...} dicts"""
+    labels = []
+    for value in values if isinstance(values, list) else []:
+        if isinstance(value, dict):
+            value = value.get("type") or value.get("name") or value.get("category") or value.get("area")
+        if isinstance(value, str) and value.strip():
+            labels.append(" ".join(value.split()))
+    return labels
+
+
+def parse_feedback(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Structured result from a Flow 2 or Flow 4 reply
+
+    The flows are prompted to answer with a JSON object (bare or in a
+    ```json block) like {"score": 72, "mistakes": ["comma splice"],
+    "strengths": [...], "focus_areas": [...], "skill_level": "..."}.
+    Scores are 0-100 unless the reply gives the scale - a "max_score" or
+    a score like "8/10" - in which case they are scaled to 0-100.
+
+    Returns:
+        {"score", "mistakes", "strengths", "focus_areas", "skill_level",
+        "summary"} with missing fields as None/[], or None if the reply has
+        no JSON object
+    """
+    if not text:
+        return None
+    match = _JSON_BLOCK.search(text)
+    candidate = match.group(1) if match else text[text.find("{"):text.rfind("}") + 1]
+    try:
+        data = json.loads(candidate)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    score = _score(data.get("score"), data.get("max_score"))
+    skill_level = data.get("skill_level")
+    summary = data.get("summary") or data.get("feedback")
+    return {
+        "score": score,
+        "mistakes": _labels(data.get("mistakes")),
+        "strengths": _labels(data.get("strengths")),
+        "focus_areas": _labels(data.get("focus_areas")),
+        "skill_level": skill_level if isinstance(skill_level, str) else None,
+        "summary": summary if isinstance(summary, str) else None,
+    }
+
+
+class _RankedCounter:
+    """Counts with a lazy max-heap for top-k"""
+
+    __slots__ = ("counts", "_heap")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self._heap: List[Tuple[int, int]] = []  # (-count, code), possibly stale
+
+    def add(self, code: int, delta: int):
+        count = self.counts.get(code, 0) + delta
+        if count > 0:
+            self.counts[code] = count
+            heapq.heappush(self._heap, (-count, code))
+        else:
+            self.counts.pop(code, None)
+        if len(self._heap) > 2 * len(self.counts) + 32:
+            # Mostly stale entries - rebuild from the live counts
+            self._heap = [(-count, code) for code, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, k: int, min_count: int = 1) -> List[Tuple[int, int]]:
+        """Up to k (code, count) pairs with the highest counts"""
+        found: List[Tuple[int, int]] = []
+        kept = []
+        while self._heap and len(found) < k:
+            entry = heapq.heappop(self._heap)
+            count, code = -entry[0], entry[1]
+            if self.counts.get(code) != count or any(c == code for c, _ in found):
+                continue  # Stale or duplicate
+            kept.append(entry)
+            if count < min_count:
+                break
+            found.append((code, count))
+        for entry in kept:
+            heapq.heappush(self._heap, entry)
+        return found
+
+
+class _ScoreWindow:
+    """Running sums over scored results for the mean and least-squares slope"""
+
+    __slots__ = ("n", "sx", "sy", "sxx", "sxy")
+
+    def __init__(self):
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def add(self, x: float, y: float, sign: int = 1):
+        self.n += sign
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.sxy += sign * x * y
+
+    def mean(self) -> Optional[float]:
+        return self.sy / self.n if self.n else None
+
+    def slope(self) -> Optional[float]:
+        denominator = self.n * self.sxx - self.sx * self.sx
+        if self.n < 2 or abs(denominator) < 1e-9:
+            return None
+        return (self.n * self.sxy - self.sx * self.sy) / denominator
+
+
+class LearnerProgress:
+    """One learner's results (column arrays) and rolling aggregates"""
+
+    def __init__(self):
+        # Columns - one entry per result, in time order
+        self.times = array("d")
+        self.scores = array("d")            # NaN when the result had no score
+        self.scored_index = array("l")      # Position among scored results, -1 if unscored
+        self.mistake_offsets = array("L", [0])
+        self.mistake_codes = array("L")     # Mistakes of result i: [offsets[i], offsets[i + 1])
+
+        self.all_time = _RankedCounter()
+        self.recent = _RankedCounter()      # Last RECENT_EXERCISES results
+        self.fortnight = _RankedCounter()   # Results in the last RECENT_DAYS days
+        self._fortnight_start = 0
+
+        self.all_scores = _ScoreWindow()
+        self.recent_scores = _ScoreWindow()
+        self.fortnight_scores = _ScoreWindow()
+        self._scored = 0
+        self.last_score: Optional[float] = None
+
+        self.streak = 0
+        self.best_streak = 0
+        self.last_day: Optional[int] = None
+
+        self.skill_level: Optional[str] = None
+        self.focus_areas: List[str] = []
+        self.strengths: List[str] = []
+
+    def _mistakes(self, i: int):
+        return self.mistake_codes[self.mistake_offsets[i]:self.mistake_offsets[i + 1]]
+
+    def _window_remove(self, i: int, counter: _RankedCounter, scores: _ScoreWindow):
+        for code in self._mistakes(i):
+            counter.add(code, -1)
+        if self.scored_index[i] >= 0:
+            scores.add(self.scored_index[i], self.scores[i], -1)
+
+    def advance(self, now: float):
+        """Drop results older than RECENT_DAYS from the 14-day window"""
+        cutoff = now - RECENT_DAYS * 86400
+        while self._fortnight_start < len(self.times) and self.times[self._fortnight_start] <= cutoff:
+            self._window_remove(self._fortnight_start, self.fortnight, self.fortnight_scores)
+            self._fortnight_start += 1
+
+    def add(self, now: float, score: Optional[float], codes: List[int]):
+        """Append one result and update every aggregate"""
+        if self.times:
+            now = max(now, self.times[-1])  # Keep the columns in time order
+        i = len(self.times)
+        self.times.append(now)
+        self.scores.append(math.nan if score is None else score)
+        self.scored_index.append(-1 if score is None else self._scored)
+        self.mistake_codes.extend(codes)
+        self.mistake_offsets.append(len(self.mistake_codes))
+
+        for counter in (self.all_time, self.recent, self.fortnight):
+            for code in codes:
+                counter.add(code, 1)
+        if score is not None:
+            for window in (self.all_scores, self.recent_scores, self.fortnight_scores):
+                window.add(self._scored, score)
+            self._scored += 1
+            self.last_score = score
+
+        if i >= RECENT_EXERCISES:
+            self._window_remove(i - RECENT_EXERCISES, self.recent, self.recent_scores)
+        self.advance(now)
+
+        day = date.fromtimestamp(now).toordinal()
+        if self.last_day is None or day > self.last_day + 1:
+            self.streak = 1
+        elif day == self.last_day + 1:
+            self.streak += 1
+        self.last_day = day
+        self.best_streak = max(self.best_streak, self.streak)
+
+    def current_streak(self, now: float) -> int:
+        """Consecutive active days, still counting if the learner was active yesterday"""
+        if self.last_day is None or date.fromtimestamp(now).toordinal() - self.last_day > 1:
+            return 0
+        return self.streak
+
+
+def _trend(slope: Optional[float]) -> Optional[str]:
+    if slope is None:
+        return None
+    if slope >= TREND_THRESHOLD:
+        return "improving"
+    if slope <= -TREND_THRESHOLD:
+        return "declining"
+    return "steady"
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+class ProgressTracker:
+    """Per-learner progress aggregates with LRU eviction"""
+
+    WINDOWS = ("last_5", "last_14_days", "all_time")
+
+    def __init__(self, max_learners: int = DEFAULT_MAX_ENTRIES):
+        self.max_learners = max_learners
+        self._learners: "OrderedDict[str, LearnerProgress]" = OrderedDict()
+        # Mistake label <-> code, shared by all learners; past MAX_MISTAKE_TYPES
+        # labels, new ones are counted as OTHER_MISTAKE (code 0)
+        self._codes: Dict[str, int] = {OTHER_MISTAKE: 0}
+        self._names: List[str] = [OTHER_MISTAKE]
+        self._lock = threading.Lock()
+
+    def _code(self, mistake: str) -> int:
+        key = mistake.lower()[:80]
+        code = self._codes.get(key)
+        if code is None:
+            if len(self._names) >= MAX_MISTAKE_TYPES:
+                return 0
+            code = len(self._names)
+            self._codes[key] = code
+            self._names.append(key)
+        return code
+
+    def _learner(self, learner_id: str, create: bool = False) -> Optional[LearnerProgress]:
+        learner = self._learners.get(learner_id)
+        if learner is not None:
+            self._learners.move_to_end(learner_id)
+        elif create:
+            learner = self._learners[learner_id] = LearnerProgress()
+            while len(self._learners) > self.max_learners:
+                self._learners.popitem(last=False)
+        return learner
+
+    def record(self, learner_id: str, result: Dict[str, Any], now: Optional[float] = None):
+        """
+        Fold one parsed result (see parse_feedback) into the learner's aggregates
+
+        Args:
+            learner_id: Learner (session) ID
+            result: Parsed Flow 2 or Flow 4 result
+            now: Result time (default: now)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            learner = self._learner(learner_id, create=True)
+            codes = sorted({self._code(mistake) for mistake in result.get("mistakes") or []})
+            learner.add(now, result.get("score"), codes)
+            if result.get("skill_level"):
+                learner.skill_level = result["skill_level"]
+            if result.get("focus_areas"):
+                learner.focus_areas = list(result["focus_areas"])
+            if result.get("strengths"):
+                learner.strengths = list(result["strengths"])
+
+    def top_mistakes(
+        self,
+        learner_id: str,
+        k: int = 3,
+        window: str = "last_14_days",
+        min_count: int = 2,
+        now: Optional[float] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        The learner's most frequent mistakes in a window
+
+        Args:
+            window: "last_5", "last_14_days" or "all_time"
+            min_count: Exercises a mistake must appear in (2 = recurring)
+
+        Returns:
+            (mistake, count) pairs, most frequent first
+        """
+        if window not in self.WINDOWS:
+            raise ValueError(f"Unknown window '{window}'. Use one of {list(self.WINDOWS)}")
+        now = time.time() if now is None else now
+        with self._lock:
+            learner = self._learner(learner_id)
+            if learner is None:
+                return []
+            learner.advance(now)
+            counter = {"last_5": learner.recent, "last_14_days": learner.fortnight, "all_time": learner.all_time}[window]
+            return [(self._names[code], count) for code, count in counter.top(k, min_count)]
+
+    def summary(self, learner_id: str, k: int = 3, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Progress overview: scores, trend, streaks and recurring mistakes per window
+
+        Returns:
+            The summary, or None if nothing has been recorded for the learner
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            learner = self._learner(learner_id)
+            if learner is None:
+                return None
+            learner.advance(now)
+            slope = learner.recent_scores.slope()
+            counters = {"last_5": learner.recent, "last_14_days": learner.fortnight, "all_time": learner.all_time}
+            return {
+                "results": len(learner.times),
+                "results_last_14_days": len(learner.times) - learner._fortnight_start,
+                "scores": {
+                    "last": _rounded(learner.last_score),
+                    "last_5_average": _rounded(learner.recent_scores.mean()),
+                    "last_14_days_average": _rounded(learner.fortnight_scores.mean()),
+                    "all_time_average": _rounded(learner.all_scores.mean()),
+                },
+                "trend": _trend(slope),
+                "trend_slope": None if slope is None else round(slope, 2),
+                "streak_days": learner.current_streak(now),
+                "best_streak_days": learner.best_streak,
+                "recurring_mistakes": {
+                    window: [
+                        {"mistake": self._names[code], "count": count}
+                        for code, count in counter.top(k, min_count=2)
+                    ]
+                    for window, counter in counters.items()
+                },
+                "skill_level": learner.skill_level,
+                "focus_areas": learner.focus_areas,
+                "strengths": learner.strengths,
+            }
+
+
+# Progress tracker (created on first use)
+_tracker: Optional[ProgressTracker] = None
+
+
+def get_progress_tracker() -> ProgressTracker:
+    """
+    Get singleton progress tracker instance
+
+    Environment:
+        SESSION_MAX_ENTRIES: Learners kept (default: 10000)
+    """
+    global _tracker
+    if _tracker is None:
+        _tracker = ProgressTracker(max_learners=int(os.getenv("SESSION_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)))
+    return _tracker
@@ -1,11 +1,59 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+import sys
 import uuid
+from app.models.session_store import SessionStore, create_session_store_from_env
+from services import fastjson
+from services.metrics import Gauge, Histogram
+
+SESSION_STORE_SECONDS = Histogram(
+    "session_store_duration_seconds",
+    "Time spent in session store operations",
+    ["operation"]
+)
+SESSION_STORE_SIZE = Gauge(
+    "session_store_sessions",
+    "Sessions currently held by the session store"
+)
+SESSION_STORE_SIZE.set_function(lambda: len(get_session_store()))
+
+
+# Form fields with a small fixed set of values - interned so thousands of
+# sessions share one string object per value
+_INTERNED_FORM_FIELDS = ("age_group", "hardest", "audience")
+
+
+def _intern_form_data(form_data: Optional[Dict]) -> Optional[Dict]:
+    if form_data:
+        for field in _INTERNED_FORM_FIELDS:
+            value = form_data.get(field)
+            if isinstance(value, str):
+                form_data[field] = sys.intern(value)
+    return form_data
 
 
 class Session:
-    """Session data model for storing user onboarding data"""
-    
+    """
+    Session data model for storing user onboarding data
+
+    Uses __slots__ to avoid a per-instance __dict__, and caches its JSON
+    encoding until a field is reassigned. Change sessions through
+    update_session rather than mutating nested values (e.g. form_data
+    entries) in place, or the cached JSON goes stale.
+    """
+
+    __slots__ = (
+        "session_id",
+        "created_at",
+        "form_data",
+        "scenario",
+        "exercises",
+        "assessment",
+        "focus_areas",
+        "flow_session_id",
+        "_json",
+    )
+
     def __init__(self, session_id: Optional[str] = None):
         self.session_id = session_id or str(uuid.uuid4())
         self.created_at = datetime.now()
@@ -14,7 +62,18 @@ class Session:
         self.exercises: Optional[list] = None
         self.assessment: Optional[Dict] = None
         self.focus_areas: Optional[list] = None
-    
+        # LangFlow session the exercise chat continues in (None: session_id),
+        # set when the exercise was started speculatively
+        self.flow_session_id: Optional[str] = None
+
+    def __setattr__(self, name, value):
+        if name == "form_data":
+            value = _intern_form_data(value)
+        object.__setattr__(self, name, value)
+        if name != "_json":
+            # Any field change invalidates the cached encoding
+            object.__setattr__(self, "_json", None)
+
     def to_dict(self) -> Dict:
         """Convert session to dictionary"""
         return {
@@ -25,31 +84,107 @@ class Session:
             "exercises": self.exercises,
             "assessment": self.assessment,
             "focus_areas": self.focus_areas,
+            "flow_session_id": self.flow_session_id,
         }
 
+    def to_json(self) -> bytes:
+        """
+        JSON encoding of to_dict(), cached until the session changes
+
+        Compact UTF-8 JSON (orjson when installed, see services.fastjson),
+        so it can be returned as the response body directly.
+        """
+        if self._json is None:
+            self._json = fastjson.dumps(self.to_dict())
+        return self._json
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Session":
+        """Rebuild a session from to_dict() output"""
+        session = cls(data["session_id"])
+        session.created_at = datetime.fromisoformat(data["created_at"])
+        session.form_data = data.get("form_data")
+        session.scenario = data.get("scenario")
+        session.exercises = data.get("exercises")
+        session.assessment = data.get("assessment")
+        session.focus_areas = data.get("focus_areas")
+        session.flow_session_id = data.get("flow_session_id")
+        return session
 
-# In-memory session storage (for prototype)
-_sessions: Dict[str, Session] = {}
+    @classmethod
+    def from_json(cls, data: bytes) -> "Session":
+        """Rebuild a session from to_json() output, reusing it as the cached encoding"""
+        session = cls.from_dict(fastjson.loads(data))
+        session._json = data
+        return session
+
+
+# Session storage backend (selected by SESSION_STORE, created on first use)
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Get singleton session store instance"""
+    global _store
+    if _store is None:
+        _store = create_session_store_from_env()
+    return _store
+
+
+def set_session_store(store: SessionStore):
+    """Replace the session store (e.g. for benchmarks)"""
+    global _store
+    _store = store
 
 
 def get_session(session_id: str) -> Optional[Session]:
     """Get session by ID"""
-    return _sessions.get(session_id)
+    with SESSION_STORE_SECONDS.time(operation="get"):
+        return get_session_store().get(session_id)
 
 
 def create_session() -> Session:
     """Create a new session"""
     session = Session()
-    _sessions[session.session_id] = session
+    with SESSION_STORE_SECONDS.time(operation="save"):
+        get_session_store().save(session)
     return session
 
 
+def create_sessions(form_data: List[Dict]) -> List[Session]:
+    """
+    Create one session per intake form in a single store write
+
+    Args:
+        form_data: Intake form data for each new session
+
+    Returns:
+        The new sessions, in the same order
+    """
+    sessions = []
+    for data in form_data:
+        session = Session()
+        session.form_data = data
+        sessions.append(session)
+    with SESSION_STORE_SECONDS.time(operation="save_many"):
+        get_session_store().save_many(sessions)
+    return sessions
+
+
 def update_session(session_id: str, **kwargs) -> Optional[Session]:
-    """Update session data"""
-    session = _sessions.get(session_id)
+    """
+    Update session data
+
+    Always use this instead of setting attributes on a session directly -
+    durable stores only see changes saved through here.
+    """
+    store = get_session_store()
+    with SESSION_STORE_SECONDS.time(operation="get"):
+        session = store.get(session_id)
     if session:
         for key, value in kwargs.items():
             if hasattr(session, key):
                 setattr(session, key, value)
+        with SESSION_STORE_SECONDS.time(operation="save"):
+            store.save(session)
     return session
-
@@ -0,0 +1,229 @@
+"""
+Session stores - pluggable storage backends for onboarding sessions
+
+InMemorySessionStore keeps sessions in this process with TTL and LRU
+eviction. SQLiteSessionStore keeps them in a local SQLite database in WAL
+mode so several uvicorn workers can share them.
+"""
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.models.session import Session
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class SessionStore(ABC):
+    """Interface for session storage backends"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional["Session"]:
+        """Get a session by ID, or None if missing or expired"""
+
+    @abstractmethod
+    def save(self, session: "Session"):
+        """Insert or replace a session"""
+
+    def save_many(self, sessions: Iterable["Session"]):
+        """Insert or replace several sessions (stores may do this in one batch)"""
+        for session in sessions:
+            self.save(session)
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove a session"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored sessions"""
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    In-process session store with sliding TTL and LRU eviction
+
+    Sessions are kept in access order, so the least recently used (and
+    therefore first to expire) sessions are always at the front.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # session_id -> (expires_at, session), oldest access first
+        self._sessions: "OrderedDict[str, Tuple[float, Session]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id: str) -> Optional["Session"]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._sessions[session_id]
+                return None
+            # Refresh TTL and move to most recently used
+            self._sessions[session_id] = (now + self.ttl_seconds, entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def save(self, session: "Session"):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session.session_id] = (now + self.ttl_seconds, session)
+            self._sessions.move_to_end(session.session_id)
+            self._evict_expired(now)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+
+    def save_many(self, sessions: Iterable["Session"]):
+        now = time.monotonic()
+        with self._lock:
+            for session in sessions:
+                self._sessions[session.session_id] = (now + self.ttl_seconds, session)
+                self._sessions.move_to_end(session.session_id)
+            self._evict_expired(now)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Durable session store backed by a local SQLite database
+
+    Uses WAL mode so multiple worker processes can read while one writes.
+    Each thread gets its own connection. Expired rows are purged
+    periodically on write.
+    """
+
+    PURGE_EVERY = 100  # writes between expired-row purges
+
+    def __init__(self, db_path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.db_path = str(db_path)
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional["Session"]:
+        from app.models.session import Session
+
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT data, expires_at FROM sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, now)
+        ).fetchone()
+        if row is None:
+            return None
+
+        # Only refresh the TTL once half of it has passed, to keep reads cheap
+        if row[1] - now < self.ttl_seconds / 2:
+            conn.execute(
+                "UPDATE sessions SET expires_at = ? WHERE session_id = ?",
+                (now + self.ttl_seconds, session_id)
+            )
+            conn.commit()
+
+        return Session.from_json(row[0])
+
+    def save(self, session: "Session"):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+            (session.session_id, session.to_json(), now + self.ttl_seconds)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        conn.commit()
+
+    def save_many(self, sessions: Iterable["Session"]):
+        # One transaction instead of a commit (and fsync) per session
+        expires_at = time.time() + self.ttl_seconds
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+            [(session.session_id, session.to_json(), expires_at) for session in sessions]
+        )
+        conn.commit()
+
+    def delete(self, session_id: str):
+        conn = self._connection()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+    def __len__(self) -> int:
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+
+def create_session_store_from_env() -> SessionStore:
+    """
+    Create the session store selected by environment settings
+
+    Environment:
+        SESSION_STORE: 'memory' (default) or 'sqlite'
+        SESSION_TTL_SECONDS: Idle time before a session expires (default: 86400)
+        SESSION_MAX_ENTRIES: Max sessions kept by the memory store (default: 10000)
+        SESSION_DB_PATH: SQLite database file (default: data/sessions.db)
+    """
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+
+    if backend == "memory":
+        return InMemorySessionStore(
+            ttl_seconds=ttl_seconds,
+            max_entries=int(os.getenv("SESSION_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        )
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            db_path=os.getenv("SESSION_DB_PATH", "data/sessions.db"),
+            ttl_seconds=ttl_seconds
+        )
+    raise ValueError(f"Unknown SESSION_STORE '{backend}'. Use 'memory' or 'sqlite'")
@@ -1,13 +1,71 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import List, Optional, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator, ConfigDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import csv
+import io
 import json
+import logging
+import os
+import time
 from services.langflow_service import LangFlowService
-from app.models.session import create_session, get_session, update_session
-from app.utils.exercise_parser import parse_scenario_and_exercises
+from app.dependencies import get_langflow_service
+from app.models.chat_history import (
+    CHAT_HISTORY_SECONDS,
+    ROLE_ASSISTANT,
+    ROLE_USER,
+    context_prompt,
+    export_exercise_chat,
+    get_chat_history,
+)
+from app.models.jobs import Job
+from app.models.progress import get_progress_tracker, parse_feedback
+from app.models.session import Session, create_session, create_sessions, get_session, update_session
+from app.services.jobs import get_job_queue
+from app.services.speculation import get_speculative_starts
+from app.utils.exercise_parser import IncrementalExerciseParser, parse_scenario_and_exercises
+from app.utils.http_errors import langflow_http_exception
+from app.utils.langflow_response import extract_text, trim_envelope
+from app.utils.logging_setup import log_payload
+from services import fastjson
+from services.curriculum import format_snippets, get_curriculum_index
+from services.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+EXERCISE_PARSE_SECONDS = Histogram(
+    "exercise_parse_duration_seconds",
+    "Time spent parsing Flow 1 responses into a scenario and exercises"
+)
+RESPONSE_BUILD_SECONDS = Histogram(
+    "response_build_duration_seconds",
+    "Time spent validating and building route responses",
+    ["route"]
+)
 
 router = APIRouter(prefix="/api/onboarding", tags=["onboarding"])
 
+# How much of the LangFlow envelope /exercise/chat returns as raw_response:
+# "full" (default), "trim" (only outputs[0].outputs[0].results.message) or "none"
+CHAT_RAW_RESPONSE = os.getenv('CHAT_RAW_RESPONSE', 'full').lower()
+
+# Chat turns sent to Flow 3 with each message. 0 (default) relies on
+# LangFlow's own memory for the session; N > 0 sends the last N turns from
+# the chat history and runs each message in a fresh LangFlow session, so
+# the flow's context stays bounded however long the chat gets.
+CHAT_CONTEXT_TURNS = int(os.getenv('CHAT_CONTEXT_TURNS', 0))
+CHAT_TURNS_MAX_LIMIT = 200  # Turns returned per /chat/turns request
+
+# Curriculum snippets sent to Flow 3 when starting an exercise (only when a
+# curriculum component is configured - FLOW_3_CURRICULUM_COMPONENT)
+CURRICULUM_TOP_K = int(os.getenv('CURRICULUM_TOP_K', 3))
+CURRICULUM_MAX_CHARS = int(os.getenv('CURRICULUM_MAX_CHARS', 1500))
+
+# Exercise cards started in the background once a scenario is parsed, when
+# speculative starts are on (SPECULATIVE_START, see app.services.speculation)
+SPECULATIVE_START_CARDS = int(os.getenv('SPECULATIVE_START_CARDS', 1))
+
 
 class IntakeFormData(BaseModel):
     """Form data matching Langflow IntakeForm (Learner Profile) component"""
@@ -85,8 +143,39 @@ class ScenarioResponse(BaseModel):
     message: Optional[str] = None
 
 
+def _to_exercise_card(ex: Dict[str, Any]) -> Optional[ExerciseCard]:
+    """Validate a parsed exercise dict as an ExerciseCard (None if invalid)"""
+    try:
+        # Ensure all required fields are present
+        return ExerciseCard(
+            id=ex.get("id", 0),
+            title=ex.get("title", "Untitled Exercise"),
+            focus=ex.get("focus", ""),
+            description=ex.get("description", ""),
+            prompt=ex.get("prompt", ""),
+            guidelines=ex.get("guidelines", [])
+        )
+    except Exception as e:
+        # Log parsing error but continue with other exercises
+        logger.warning("Error parsing exercise %s: %s", ex.get("id"), e)
+        return None
+
+
+def _exercise_cards(exercises: Optional[List[Dict[str, Any]]]) -> List[ExerciseCard]:
+    """Valid ExerciseCards for a list of parsed exercise dicts"""
+    exercise_cards = []
+    for ex in exercises or []:
+        exercise_card = _to_exercise_card(ex)
+        if exercise_card:
+            exercise_cards.append(exercise_card)
+    return exercise_cards
+
+
 @router.post("/scenario", response_model=ScenarioResponse)
-async def generate_scenario(form_data: IntakeFormData):
+async def generate_scenario(
+    form_data: IntakeFormData,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
     """
     Generate personalized writing scenario using Langflow Flow 1
 
@@ -98,87 +187,45 @@ async def generate_scenario(form_data: IntakeFormData):
     try:
         # Create session
         session = create_session()
-        session.form_data = form_data.model_dump()
-
-        # Initialize LangFlow service
-        langflow_service = LangFlowService()
+        update_session(session.session_id, form_data=form_data.model_dump())
 
         # Call Flow 1: Scenario Generation
-        result = langflow_service.generate_scenario(student_data=form_data.model_dump())
+        result = await langflow_service.agenerate_scenario(student_data=form_data.model_dump())
         
-        # Debug: Log the raw Langflow response
-        print(f"DEBUG: Raw Langflow response: {result}")
-        print(f"DEBUG: Response type: {type(result)}")
-        if isinstance(result, dict):
-            print(f"DEBUG: Response keys: {result.keys()}")
+        # Debug: Log the raw Langflow response (sampled, student name redacted)
+        log_payload(logger, "Raw Langflow response", result, names=[form_data.full_name])
 
         # Parse scenario and exercises using dedicated parser
-        scenario, exercises = parse_scenario_and_exercises(result)
+        with EXERCISE_PARSE_SECONDS.time():
+            scenario, exercises = parse_scenario_and_exercises(result)
         
         # Debug: Log parsing results
-        print(f"DEBUG: Parsed scenario: {scenario[:100] if scenario else None}...")
-        print(f"DEBUG: Parsed exercises count: {len(exercises) if exercises else 0}")
-        if exercises:
-            print(f"DEBUG: First exercise: {exercises[0]}")
-
-        # Convert exercise dicts to ExerciseCard objects with validation
-        exercise_cards = []
-        if exercises:
-            for ex in exercises:
-                try:
-                    # Ensure all required fields are present
-                    exercise_card = ExerciseCard(
-                        id=ex.get("id", 0),
-                        title=ex.get("title", "Untitled Exercise"),
-                        focus=ex.get("focus", ""),
-                        description=ex.get("description", ""),
-                        prompt=ex.get("prompt", ""),
-                        guidelines=ex.get("guidelines", [])
-                    )
-                    exercise_cards.append(exercise_card)
-                except Exception as e:
-                    # Log parsing error but continue with other exercises
-                    print(f"Error parsing exercise: {e}, exercise data: {ex}")
-                    continue
-
-        # Update session
-        session.scenario = scenario
-        session.exercises = exercises  # Store raw exercises in session
+        logger.debug(
+            "Session %s: parsed scenario (%d chars) and %d exercises",
+            session.session_id, len(scenario or ""), len(exercises or [])
+        )
+
+        # Update session (store raw exercises in session)
         update_session(session.session_id, scenario=scenario, exercises=exercises)
+        _speculate_starts(langflow_service, session.session_id)
 
-        return ScenarioResponse(
-            session_id=session.session_id,
-            scenario=scenario,
-            exercises=exercise_cards if exercise_cards else None,
-            message="Scenario generated successfully"
-        )
+        with RESPONSE_BUILD_SECONDS.time(route="scenario"):
+            # Convert exercise dicts to ExerciseCard objects with validation
+            exercise_cards = _exercise_cards(exercises)
 
-    except ValueError as e:
-        # Flow not configured
-        raise HTTPException(
-            status_code=500,
-            detail=str(e)
-        )
-    except Exception as e:
-        # LangFlow API errors or other exceptions
-        error_msg = str(e)
-
-        # Provide helpful error messages
-        if "Connection refused" in error_msg:
-            raise HTTPException(
-                status_code=503,
-                detail="Cannot connect to Langflow. Make sure Langflow is running at http://localhost:7860"
-            )
-        elif "timed out" in error_msg:
-            raise HTTPException(
-                status_code=504,
-                detail="Langflow request timed out"
-            )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Internal server error: {error_msg}"
+            response = ScenarioResponse(
+                session_id=session.session_id,
+                scenario=scenario,
+                exercises=exercise_cards if exercise_cards else None,
+                message="Scenario generated successfully"
             )
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        # LangFlow API errors, flow not configured (ValueError) or other exceptions
+        raise langflow_http_exception(e)
 
 
 @router.get("/session/{session_id}")
@@ -187,7 +234,57 @@ async def get_session_data(session_id: str):
     session = get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session.to_dict()
+    # Cached encoding - repeated fetches skip rebuilding and re-encoding the dict
+    return Response(content=session.to_json(), media_type="application/json")
+
+
+@router.get("/session/{session_id}/chat")
+async def export_chat(session_id: str, exercise: Optional[str] = None):
+    """
+    Export one exercise's chat (see docs/example-chat-history-exercise-5.json)
+
+    Query:
+        exercise: Exercise title (default: the most recent exercise)
+    """
+    session = get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    with CHAT_HISTORY_SECONDS.time(operation="export"):
+        export = export_exercise_chat(get_chat_history(), session_id, session.exercises, exercise)
+    if export is None:
+        raise HTTPException(status_code=404, detail="No chat history for this exercise")
+    return export
+
+
+@router.get("/session/{session_id}/chat/turns")
+async def get_chat_turns(
+    session_id: str,
+    since: Optional[int] = Query(None, ge=0),
+    last: Optional[int] = Query(None, ge=1, le=CHAT_TURNS_MAX_LIMIT),
+    limit: int = Query(CHAT_TURNS_MAX_LIMIT, ge=1, le=CHAT_TURNS_MAX_LIMIT)
+):
+    """
+    A window of the session's chat turns, for replaying or resuming a chat
+
+    Query:
+        since: First offset to return (for polling: pass the previous next_offset)
+        last: Return the last N turns instead
+        limit: Max turns to return with since
+
+    Returns:
+        {"offset", "next_offset", "turns": [{"offset", "role", "content",
+        "exercise", "created_at"}]} - offset can be past since if older
+        turns were dropped
+    """
+    if not get_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    history = get_chat_history()
+    with CHAT_HISTORY_SECONDS.time(operation="read"):
+        if last is not None:
+            window = history.last(session_id, last)
+        else:
+            window = history.since(session_id, since or 0, limit)
+    return window.to_dict()
 
 
 class ExerciseStartRequest(BaseModel):
@@ -197,8 +294,110 @@ class ExerciseStartRequest(BaseModel):
     exercise_description: Optional[str] = None
 
 
+def _exercise_topic(request: ExerciseStartRequest) -> str:
+    """Flow 3 exercise topic: the title, plus the description if there is one"""
+    if request.exercise_description:
+        return f"{request.exercise_title}: {request.exercise_description}"
+    return request.exercise_title
+
+
+def _speculate_starts(langflow_service: LangFlowService, session_id: str):
+    """
+    Start the session's first exercise cards in the background
+
+    Each card runs in its own LangFlow session, the way the frontend
+    would start it (title and description). No-op unless speculative
+    starts are on.
+    """
+    speculative = get_speculative_starts()
+    if speculative is None:
+        return
+    session = get_session(session_id)
+    if not session or not session.form_data:
+        return
+
+    for n, exercise in enumerate(_exercise_cards((session.exercises or [])[:SPECULATIVE_START_CARDS])):
+        request = ExerciseStartRequest(
+            session_id=session_id,
+            exercise_title=exercise.title,
+            exercise_description=exercise.description or None
+        )
+        curriculum = _curriculum_for(langflow_service, session, request)
+        topic = _exercise_topic(request)
+
+        def run(flow_session_id: str, topic: str = topic, curriculum: Optional[str] = curriculum):
+            return langflow_service.astart_exercise(
+                student_data=session.form_data,
+                exercise_topic=topic,
+                session_id=flow_session_id,
+                curriculum=curriculum
+            )
+
+        if not speculative.launch(session_id, topic, f"{session_id}-spec{n}", run):
+            break
+
+
+async def _speculative_start(request: ExerciseStartRequest, session: Session) -> Optional[Dict[str, Any]]:
+    """
+    Flow 3 result for the exercise if it was started speculatively
+
+    On a hit the session continues in the speculative run's LangFlow
+    session; otherwise a previous hit's LangFlow session is dropped, since
+    the caller starts the exercise in the session's own.
+
+    Returns:
+        The run's result, or None if the caller has to start the exercise
+    """
+    speculative = get_speculative_starts()
+    taken = await speculative.take(request.session_id, _exercise_topic(request)) if speculative else None
+    if taken is None:
+        if session.flow_session_id is not None:
+            update_session(request.session_id, flow_session_id=None)
+        return None
+    result, flow_session_id = taken
+    update_session(request.session_id, flow_session_id=flow_session_id)
+    return result
+
+
+def _curriculum_for(
+    langflow_service: LangFlowService,
+    session: Session,
+    request: ExerciseStartRequest
+) -> Optional[str]:
+    """
+    Curriculum snippets for the exercise being started
+
+    Searches on the exercise's focus area (from the session's parsed
+    exercises, or the title), the student's recurring mistakes and their
+    interests.
+
+    Returns:
+        Snippets as Markdown, or None if no curriculum component is
+        configured or the index isn't available
+    """
+    if not langflow_service.config.components.get("exercise_curriculum"):
+        return None
+    index = get_curriculum_index()
+    if index is None:
+        return None
+
+    exercise = next((ex for ex in session.exercises or [] if ex.get("title") == request.exercise_title), {})
+    mistakes = [mistake for mistake, _ in get_progress_tracker().top_mistakes(session.session_id, k=2)]
+    focus = " ".join(filter(None, (
+        request.exercise_title,
+        exercise.get("focus") or request.exercise_description,
+        *mistakes
+    )))
+    form_data = session.form_data or {}
+    chunks = index.for_student(form_data.get("age_group"), focus, form_data.get("interests") or "", k=CURRICULUM_TOP_K)
+    return format_snippets(chunks, CURRICULUM_MAX_CHARS) or None
+
+
 @router.post("/exercise/start")
-async def start_exercise(request: ExerciseStartRequest):
+async def start_exercise(
+    request: ExerciseStartRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
     """
     Start an exercise session using Langflow Flow 3
 
@@ -216,29 +415,31 @@ async def start_exercise(request: ExerciseStartRequest):
         if not session.form_data:
             raise HTTPException(status_code=400, detail="No form data found in session")
 
-        # Initialize LangFlow service
-        langflow_service = LangFlowService()
-
         # Create exercise topic string (use title + description if available)
-        exercise_topic = request.exercise_title
-        if request.exercise_description:
-            exercise_topic = f"{request.exercise_title}: {request.exercise_description}"
+        exercise_topic = _exercise_topic(request)
 
-        # Debug logging
-        print(f"DEBUG: Starting exercise for session {request.session_id}")
-        print(f"DEBUG: Exercise topic: {exercise_topic}")
-        print(f"DEBUG: Student: {session.form_data.get('full_name', 'unknown')}")
+        logger.debug("Starting exercise for session %s: %r", request.session_id, exercise_topic)
 
-        # Call Flow 3: Exercise Generation
+        # Served from a speculative run if this card was started in the background,
+        # otherwise call Flow 3: Exercise Generation
         # Pass form data (for Intake Form component) + exercise topic (for Text Input component)
-        result = langflow_service.start_exercise(
-            student_data=session.form_data,
-            exercise_topic=exercise_topic,
-            session_id=request.session_id
-        )
+        result = await _speculative_start(request, session)
+        if result is None:
+            result = await langflow_service.astart_exercise(
+                student_data=session.form_data,
+                exercise_topic=exercise_topic,
+                session_id=request.session_id,
+                curriculum=_curriculum_for(langflow_service, session, request)
+            )
+
+        # Debug: Log the raw Langflow response (sampled, student name redacted)
+        log_payload(logger, "Raw exercise flow response", result, names=[session.form_data.get('full_name', '')])
 
-        # Debug: Log the raw Langflow response
-        print(f"DEBUG: Raw exercise flow response: {result}")
+        _record_turns(
+            request.session_id,
+            [(ROLE_ASSISTANT, extract_text(result, "exercise_generation"))],
+            exercise=request.exercise_title
+        )
 
         # Return the response (could parse it further if needed)
         return {
@@ -248,32 +449,11 @@ async def start_exercise(request: ExerciseStartRequest):
             "response": result
         }
 
-    except ValueError as e:
-        # Flow not configured
-        raise HTTPException(
-            status_code=500,
-            detail=str(e)
-        )
+    except HTTPException:
+        raise
     except Exception as e:
-        # LangFlow API errors or other exceptions
-        error_msg = str(e)
-
-        # Provide helpful error messages
-        if "Connection refused" in error_msg:
-            raise HTTPException(
-                status_code=503,
-                detail="Cannot connect to Langflow. Make sure Langflow is running at http://localhost:7860"
-            )
-        elif "timed out" in error_msg:
-            raise HTTPException(
-                status_code=504,
-                detail="Langflow request timed out"
-            )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Internal server error: {error_msg}"
-            )
+        # LangFlow API errors, flow not configured (ValueError) or other exceptions
+        raise langflow_http_exception(e)
 
 
 class ExerciseChatRequest(BaseModel):
@@ -283,7 +463,10 @@ class ExerciseChatRequest(BaseModel):
 
 
 @router.post("/exercise/chat")
-async def exercise_chat(request: ExerciseChatRequest):
+async def exercise_chat(
+    request: ExerciseChatRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
     """
     Send a chat message during an exercise session
 
@@ -301,72 +484,751 @@ async def exercise_chat(request: ExerciseChatRequest):
         if not session.form_data:
             raise HTTPException(status_code=400, detail="No form data found in session")
 
-        # Initialize LangFlow service
-        langflow_service = LangFlowService()
+        logger.debug("Chat message for session %s (%d chars)", request.session_id, len(request.message))
 
-        # Debug logging
-        print(f"DEBUG CHAT: Sending message for session {request.session_id}")
-        print(f"DEBUG CHAT: User message: {request.message}")
-        print(f"DEBUG CHAT: Student: {session.form_data.get('full_name', 'unknown')}")
-
-        # Call Flow 3 with the user's message
-        # Use the same session_id to maintain conversation context
-        result = langflow_service.continue_exercise(
+        # Call Flow 3 with the user's message - in the same LangFlow session
+        # to maintain conversation context, or with a window of recent turns
+        user_message, flow_session_id = _chat_input(request, session)
+        result = await langflow_service.acontinue_exercise(
             student_data=session.form_data,
-            user_message=request.message,
-            session_id=request.session_id
+            user_message=user_message,
+            session_id=flow_session_id
         )
 
-        # Debug: Log the raw Langflow response
-        print(f"DEBUG CHAT: Raw response: {result}")
+        # Debug: Log the raw Langflow response (sampled, student name redacted)
+        log_payload(logger, "Raw chat response", result, names=[session.form_data.get('full_name', '')])
 
         # Extract the AI response text from the Langflow response
-        ai_response = ""
-        if isinstance(result, dict):
-            outputs = result.get("outputs", [])
-            if outputs:
-                first_output = outputs[0] if outputs else {}
-                output_data = first_output.get("outputs", [{}])[0] if isinstance(first_output.get("outputs"), list) else {}
-                message = output_data.get("results", {}).get("message", {})
-                ai_response = message.get("text") or message.get("content") or str(message)
-            else:
-                ai_response = result.get("text") or result.get("content") or result.get("message", "")
-                if isinstance(ai_response, dict):
-                    ai_response = ai_response.get("text") or ai_response.get("content") or str(ai_response)
+        with RESPONSE_BUILD_SECONDS.time(route="exercise_chat"):
+            ai_response = extract_text(result, "exercise_generation")
 
-        print(f"DEBUG CHAT: Extracted AI response: {ai_response[:100]}...")
+        logger.debug("Session %s: AI response %d chars", request.session_id, len(ai_response))
+        _record_turns(request.session_id, [(ROLE_USER, request.message), (ROLE_ASSISTANT, ai_response)])
 
-        return {
+        response = {
             "success": True,
             "session_id": request.session_id,
-            "message": ai_response,
-            "raw_response": result
+            "message": ai_response
+        }
+        if CHAT_RAW_RESPONSE == "full":
+            response["raw_response"] = result
+        elif CHAT_RAW_RESPONSE == "trim":
+            response["raw_response"] = trim_envelope(result)
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        # LangFlow API errors, flow not configured (ValueError) or other exceptions
+        raise langflow_http_exception(e)
+
+
+def _record_turns(session_id: str, turns: List[Tuple[str, str]], exercise: Optional[str] = None):
+    """Append (role, content) turns to the session's chat history"""
+    with CHAT_HISTORY_SECONDS.time(operation="append"):
+        get_chat_history().append(session_id, turns, exercise=exercise)
+
+
+def _chat_input(request: ExerciseChatRequest, session: Session) -> Tuple[str, str]:
+    """
+    Flow 3 input and LangFlow session for a chat message
+
+    Returns:
+        (input_value, session_id) - the message and the session's LangFlow
+        session (its own ID, or the speculative run's the exercise started
+        in), or with CHAT_CONTEXT_TURNS set, the message after the last
+        turns and a LangFlow session used only for this run
+    """
+    if CHAT_CONTEXT_TURNS <= 0:
+        return request.message, session.flow_session_id or request.session_id
+    with CHAT_HISTORY_SECONDS.time(operation="last"):
+        window = get_chat_history().last(request.session_id, CHAT_CONTEXT_TURNS)
+    return context_prompt(window, request.message), f"{request.session_id}:{window.next_offset}"
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {fastjson.dumps(data).decode('utf-8')}\n\n"
+
+
+async def _relay_flow_events(
+    events: AsyncIterator[Dict[str, Any]],
+    session_id: str,
+    on_end: Optional[Callable[[str], None]] = None
+) -> AsyncIterator[str]:
+    """
+    Relay LangFlow stream events to the browser as Server-Sent Events
+
+    Emits `token` events ({"chunk": ...}) as tokens arrive, then one `end`
+    event with the complete message, or an `error` event if the flow fails
+    mid-stream. When the client disconnects, Starlette cancels this
+    generator, which closes the upstream LangFlow request.
+
+    Args:
+        events: LangFlow stream events
+        session_id: Session the stream belongs to
+        on_end: Called with the complete message before the `end` event
+    """
+    try:
+        async for event in events:
+            event_type = event.get("event")
+            data = event.get("data") or {}
+
+            if event_type == "token":
+                chunk = data.get("chunk", "")
+                if chunk:
+                    yield _sse("token", {"chunk": chunk})
+            elif event_type == "end":
+                message = extract_text(data.get("result"), "exercise_generation")
+                if on_end is not None:
+                    on_end(message)
+                yield _sse("end", {"session_id": session_id, "message": message})
+            elif event_type == "error":
+                yield _sse("error", {"detail": data.get("error") or data.get("text") or "Langflow flow failed"})
+
+    except Exception as e:
+        # Status code is already sent - report the error in-band
+        error = langflow_http_exception(e)
+        yield _sse("error", {"detail": error.detail, "status": error.status_code})
+    finally:
+        await events.aclose()
+
+
+async def _served_events(result: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """A finished flow result as LangFlow stream events (a single `end`)"""
+    yield {"event": "end", "data": {"result": result}}
+
+
+async def _resumed(first: Dict[str, Any], events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    try:
+        yield first
+        async for event in events:
+            yield event
+    finally:
+        await events.aclose()
+
+
+async def _no_events() -> AsyncIterator[Dict[str, Any]]:
+    return
+    yield
+
+
+async def _open_events(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Read a flow stream's first event before the response starts
+
+    Admission control, the circuit breaker and the LangFlow connection are
+    only checked once a stream is read. Reading it here, before the 200
+    and its headers go out, turns those failures into the same HTTP errors
+    the non-streaming routes return (429/503 with Retry-After, 502, 504).
+
+    Returns:
+        The same events, starting again from the first
+
+    Raises:
+        HTTPException: If the flow fails before its first event
+    """
+    try:
+        first = await events.__anext__()
+    except StopAsyncIteration:
+        return _no_events()
+    except Exception as e:
+        raise langflow_http_exception(e) from e
+    return _resumed(first, events)
+
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Stop reverse proxies from buffering the stream
         }
+    )
+
+
+@router.post("/exercise/start/stream")
+async def start_exercise_stream(
+    request: ExerciseStartRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Streaming version of /exercise/start
+
+    Proxies Langflow Flow 3 output as Server-Sent Events so the first
+    coach tokens show up while the rest is still being generated.
+    """
+    session = get_session(request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if not session.form_data:
+        raise HTTPException(status_code=400, detail="No form data found in session")
+
+    result = await _speculative_start(request, session)
+    if result is not None:
+        events = _served_events(result)
+    else:
+        events = await _open_events(langflow_service.astream_start_exercise(
+            student_data=session.form_data,
+            exercise_topic=_exercise_topic(request),
+            session_id=request.session_id,
+            curriculum=_curriculum_for(langflow_service, session, request)
+        ))
+
+    def record(message: str):
+        _record_turns(request.session_id, [(ROLE_ASSISTANT, message)], exercise=request.exercise_title)
+
+    return _event_stream(_relay_flow_events(events, request.session_id, on_end=record))
+
+
+@router.post("/exercise/chat/stream")
+async def exercise_chat_stream(
+    request: ExerciseChatRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Streaming version of /exercise/chat
+
+    Proxies the AI coach's reply as Server-Sent Events (`token`, then `end`
+    with the full message, or `error`).
+    """
+    session = get_session(request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if not session.form_data:
+        raise HTTPException(status_code=400, detail="No form data found in session")
+
+    user_message, flow_session_id = _chat_input(request, session)
+    events = await _open_events(langflow_service.astream_continue_exercise(
+        student_data=session.form_data,
+        user_message=user_message,
+        session_id=flow_session_id
+    ))
 
-    except ValueError as e:
-        # Flow not configured
+    def record(message: str):
+        _record_turns(request.session_id, [(ROLE_USER, request.message), (ROLE_ASSISTANT, message)])
+
+    return _event_stream(_relay_flow_events(events, request.session_id, on_end=record))
+
+
+async def _relay_scenario_events(
+    events: AsyncIterator[Dict[str, Any]],
+    session_id: str,
+    on_end: Optional[Callable[[], None]] = None
+) -> AsyncIterator[str]:
+    """
+    Parse Flow 1 output as it streams and relay it as Server-Sent Events
+
+    Emits `session` ({"session_id": ...}) first, `scenario` as soon as the
+    greeting is complete, one `exercise` (an ExerciseCard) per finished
+    exercise, then `end` once everything is stored in the session - or
+    `error` if the flow fails mid-stream.
+
+    Args:
+        events: LangFlow stream events
+        session_id: Session the stream belongs to
+        on_end: Called once the scenario and exercises are stored
+    """
+    parser = IncrementalExerciseParser()
+    received_tokens = False
+
+    def relay(parsed):
+        for kind, value in parsed:
+            if kind == "scenario":
+                yield _sse("scenario", {"scenario": value})
+            else:
+                exercise_card = _to_exercise_card(value)
+                if exercise_card:
+                    yield _sse("exercise", exercise_card.model_dump())
+
+    try:
+        yield _sse("session", {"session_id": session_id})
+
+        async for event in events:
+            event_type = event.get("event")
+            data = event.get("data") or {}
+
+            if event_type == "token":
+                chunk = data.get("chunk", "")
+                if chunk:
+                    received_tokens = True
+                    for message in relay(parser.feed(chunk)):
+                        yield message
+            elif event_type == "end":
+                # Cached responses arrive whole, without token events
+                if not received_tokens:
+                    for message in relay(parser.feed(extract_text(data.get("result"), "scenario_generation"))):
+                        yield message
+                for message in relay(parser.close()):
+                    yield message
+
+                update_session(session_id, scenario=parser.scenario, exercises=parser.exercises)
+                if on_end is not None:
+                    on_end()
+                yield _sse("end", {
+                    "session_id": session_id,
+                    "exercise_count": len(parser.exercises)
+                })
+            elif event_type == "error":
+                yield _sse("error", {"detail": data.get("error") or data.get("text") or "Langflow flow failed"})
+
+    except Exception as e:
+        # Status code is already sent - report the error in-band
+        error = langflow_http_exception(e)
+        yield _sse("error", {"detail": error.detail, "status": error.status_code})
+    finally:
+        await events.aclose()
+
+
+@router.post("/scenario/stream")
+async def generate_scenario_stream(
+    form_data: IntakeFormData,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Streaming version of /scenario
+
+    Parses Langflow Flow 1 output while it is generated, so the scenario
+    greeting and the first exercise cards can be shown before the last
+    exercise is written.
+    """
+    events = await _open_events(langflow_service.astream_generate_scenario(student_data=form_data.model_dump()))
+    session = create_session()
+    update_session(session.session_id, form_data=form_data.model_dump())
+
+    return _event_stream(_relay_scenario_events(
+        events,
+        session.session_id,
+        on_end=lambda: _speculate_starts(langflow_service, session.session_id)
+    ))
+
+
+# --- Batch onboarding (class rosters) -----------------------------------------
+
+# Max students per roster, and max Flow 1 runs in flight for one roster -
+# 0 (default) starts every unique profile at once, up to Flow 1's
+# max_concurrency, so a roster never queues past the flow's admission limit
+BATCH_MAX_STUDENTS = int(os.getenv('BATCH_MAX_STUDENTS', 100))
+BATCH_SCENARIO_CONCURRENCY = int(os.getenv('BATCH_SCENARIO_CONCURRENCY', 0))
+
+# Intake fields that reach Flow 1 - students matching on all of them share one run
+_PROFILE_FIELDS = ("full_name", "age_group", "interests", "cultural_refs", "hardest", "audience")
+
+
+def _profile_key(form_data: Dict[str, Any]) -> Tuple[str, ...]:
+    """Whitespace-normalized profile fields, for spotting duplicate students"""
+    return tuple(" ".join(str(form_data.get(field) or "").split()) for field in _PROFILE_FIELDS)
+
+
+def _csv_rows(text: str) -> List[Dict[str, str]]:
+    """Roster CSV (header row with IntakeFormData field names) as a list of dicts"""
+    return [
+        {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+async def _read_roster(request: Request) -> List[IntakeFormData]:
+    """
+    Read and validate a roster from a JSON list, a CSV body or a CSV upload
+
+    Raises:
+        HTTPException: 400 if the body can't be read, 422 if it's empty, too
+            long or any row fails validation (all row errors are reported)
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Upload the roster CSV in the 'file' field")
+            rows = _csv_rows((await upload.read()).decode("utf-8-sig"))
+        elif content_type.startswith("text/csv"):
+            rows = _csv_rows((await request.body()).decode("utf-8-sig"))
+        else:
+            rows = await request.json()
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read roster: {e}")
+
+    if not isinstance(rows, list) or not rows:
+        raise HTTPException(status_code=422, detail="Roster must be a non-empty list of intake forms")
+    if len(rows) > BATCH_MAX_STUDENTS:
         raise HTTPException(
-            status_code=500,
-            detail=str(e)
+            status_code=422,
+            detail=f"Roster has {len(rows)} students, the limit is {BATCH_MAX_STUDENTS}"
+        )
+
+    forms, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            forms.append(IntakeFormData.model_validate(row))
+        except ValidationError as e:
+            errors.append({"index": index, "errors": json.loads(e.json(include_url=False))})
+    if errors:
+        raise HTTPException(status_code=422, detail={"message": "Invalid roster rows", "rows": errors})
+    return forms
+
+
+def _ndjson(data: Dict[str, Any]) -> str:
+    return fastjson.dumps(data).decode("utf-8") + "\n"
+
+
+async def _roster_results(
+    langflow_service: LangFlowService,
+    session_ids: List[str],
+    groups: Dict[Tuple[str, ...], List[int]],
+    form_data: List[Dict[str, Any]]
+) -> AsyncIterator[str]:
+    """
+    Run Flow 1 once per unique profile and yield one NDJSON line per student
+
+    Lines come in completion order: {"type": "student", "index", "session_id",
+    "status": 200, "scenario", "exercises"} or, if the student's run failed,
+    {"type": "student", "index", "session_id", "status", "detail"}. A final
+    {"type": "summary", ...} line follows. Closing the stream cancels
+    the runs still in flight.
+    """
+    start = time.perf_counter()
+    limit = BATCH_SCENARIO_CONCURRENCY or langflow_service.config.max_concurrency["scenario_generation"]
+    semaphore = asyncio.Semaphore(max(1, min(limit, len(groups)) if limit > 0 else len(groups)))
+
+    async def run(indices: List[int]):
+        async with semaphore:
+            try:
+                return indices, await langflow_service.agenerate_scenario(student_data=form_data[indices[0]]), None
+            except Exception as e:
+                return indices, None, e
+
+    tasks = [asyncio.ensure_future(run(indices)) for indices in groups.values()]
+    succeeded = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indices, result, error = await next_done
+
+            if error is None:
+                with EXERCISE_PARSE_SECONDS.time():
+                    scenario, exercises = parse_scenario_and_exercises(result)
+                with RESPONSE_BUILD_SECONDS.time(route="scenario_batch"):
+                    cards = [card.model_dump() for card in _exercise_cards(exercises)]
+
+            for index in indices:
+                session_id = session_ids[index]
+                if error is None:
+                    update_session(session_id, scenario=scenario, exercises=exercises)
+                    succeeded += 1
+                    yield _ndjson({
+                        "type": "student",
+                        "index": index,
+                        "session_id": session_id,
+                        "status": 200,
+                        "scenario": scenario,
+                        "exercises": cards or None
+                    })
+                else:
+                    http_error = langflow_http_exception(error)
+                    failed += 1
+                    yield _ndjson({
+                        "type": "student",
+                        "index": index,
+                        "session_id": session_id,
+                        "status": http_error.status_code,
+                        "detail": http_error.detail
+                    })
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Roster of %d students (%d unique profiles): %d succeeded, %d failed in %.2fs",
+            len(session_ids), len(groups), succeeded, failed, elapsed
         )
+        yield _ndjson({
+            "type": "summary",
+            "students": len(session_ids),
+            "unique_profiles": len(groups),
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_seconds": round(elapsed, 3)
+        })
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/scenario/batch")
+async def generate_scenarios_batch(
+    request: Request,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Generate scenarios for a whole class roster concurrently
+
+    Accepts a JSON list of intake forms, or a CSV (header row with the
+    IntakeFormData field names) as a text/csv body or a multipart upload
+    in the `file` field. Creates every student's session up front, runs
+    Flow 1 once per unique profile and streams one NDJSON line per student
+    as their scenario is ready. All profiles start at once when they fit in
+    Flow 1's max_concurrency (or BATCH_SCENARIO_CONCURRENCY, if set), so
+    such a class takes about as long as its slowest run; larger rosters
+    run in waves of that size.
+    """
+    forms = await _read_roster(request)
+    form_data = [form.model_dump() for form in forms]
+    sessions = create_sessions(form_data)
+
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for index, data in enumerate(form_data):
+        groups.setdefault(_profile_key(data), []).append(index)
+
+    return StreamingResponse(
+        _roster_results(langflow_service, [session.session_id for session in sessions], groups, form_data),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+
+# --- Assessment, feedback and progress (Flows 2 and 4) -------------------------
+
+class AssessmentRequest(BaseModel):
+    """Student writing to assess with Flow 2"""
+    session_id: str
+    responses: Dict[str, str] = Field(..., min_length=1, description="Exercise title -> the student's writing")
+
+
+class ExerciseFeedbackRequest(BaseModel):
+    """Request feedback on a finished exercise chat from Flow 4"""
+    session_id: str
+    exercise_title: Optional[str] = None
+
+
+def _progress_summary(session_id: str) -> Optional[Dict[str, Any]]:
+    with RESPONSE_BUILD_SECONDS.time(route="progress"):
+        return get_progress_tracker().summary(session_id)
+
+
+async def _assess(
+    langflow_service: LangFlowService,
+    session: Session,
+    request: AssessmentRequest,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """Run Flow 2 on the responses and store the assessment (the /assessment response)"""
+    result = await langflow_service.aassess_and_plan(
+        {"student": session.form_data or {}, "responses": request.responses},
+        session_id=request.session_id,
+        timeout=timeout
+    )
+    text = extract_text(result, "assessment_plan")
+    assessment = parse_feedback(text)
+    if assessment is None:
+        logger.warning("Session %s: Flow 2 reply had no JSON assessment (%d chars)", request.session_id, len(text))
+    else:
+        get_progress_tracker().record(request.session_id, assessment)
+        update_session(request.session_id, assessment=assessment, focus_areas=assessment["focus_areas"] or None)
+
+    return {
+        "success": True,
+        "session_id": request.session_id,
+        "message": text,
+        "assessment": assessment,
+        "progress": _progress_summary(request.session_id)
+    }
+
+
+@router.post("/assessment")
+async def assess_writing(
+    request: AssessmentRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Assess the student's exercise responses and plan their focus areas (Flow 2)
+
+    Stores the parsed assessment and focus areas on the session and folds
+    the score and mistakes into the student's progress.
+    """
+    try:
+        session = get_session(request.session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        return await _assess(langflow_service, session, request)
+
+    except HTTPException:
+        raise
     except Exception as e:
-        # LangFlow API errors or other exceptions
-        error_msg = str(e)
-
-        # Provide helpful error messages
-        if "Connection refused" in error_msg:
-            raise HTTPException(
-                status_code=503,
-                detail="Cannot connect to Langflow. Make sure Langflow is running at http://localhost:7860"
-            )
-        elif "timed out" in error_msg:
-            raise HTTPException(
-                status_code=504,
-                detail="Langflow request timed out"
-            )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Internal server error: {error_msg}"
-            )
+        raise langflow_http_exception(e)
+
 
+def _exercise_chat_export(request: ExerciseFeedbackRequest) -> Dict[str, Any]:
+    """
+    The chat transcript /exercise/feedback sends to Flow 4
+
+    Raises:
+        HTTPException: 404 if the session or the exercise's chat doesn't exist
+    """
+    session = get_session(request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    with CHAT_HISTORY_SECONDS.time(operation="export"):
+        chat = export_exercise_chat(get_chat_history(), request.session_id, session.exercises, request.exercise_title)
+    if chat is None:
+        raise HTTPException(status_code=404, detail="No chat history for this exercise")
+    return chat
+
+
+async def _feedback(
+    langflow_service: LangFlowService,
+    request: ExerciseFeedbackRequest,
+    chat: Dict[str, Any],
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """Run Flow 4 on the exercise chat and record the feedback (the /exercise/feedback response)"""
+    result = await langflow_service.asession_feedback(
+        chat["chat_history"],
+        student_id=request.session_id,
+        timeout=timeout
+    )
+    text = extract_text(result, "session_feedback")
+    feedback = parse_feedback(text)
+    if feedback is None:
+        logger.warning("Session %s: Flow 4 reply had no JSON feedback (%d chars)", request.session_id, len(text))
+    else:
+        get_progress_tracker().record(request.session_id, feedback)
+
+    return {
+        "success": True,
+        "session_id": request.session_id,
+        "exercise_title": chat["exercise_title"],
+        "message": text,
+        "feedback": feedback,
+        "progress": _progress_summary(request.session_id)
+    }
+
+
+@router.post("/exercise/feedback")
+async def exercise_feedback(
+    request: ExerciseFeedbackRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Get feedback on an exercise chat (Flow 4) and update the student's progress
+
+    Sends the exercise's transcript from the chat history - the most
+    recent exercise unless exercise_title is given.
+    """
+    try:
+        chat = _exercise_chat_export(request)
+        return await _feedback(langflow_service, request, chat)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise langflow_http_exception(e)
+
+
+@router.get("/session/{session_id}/progress")
+async def get_progress(session_id: str):
+    """
+    The student's progress: score averages and trend, streaks, and recurring
+    mistakes over the last 5 exercises, the last 14 days and all time
+    """
+    if not get_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    summary = _progress_summary(session_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No assessments or feedback recorded yet")
+    return {"session_id": session_id, **summary}
+
+
+# --- Background jobs (Flows 2 and 4) ------------------------------------------
+
+# Request timeout for flow calls made by jobs - no client is held waiting on them
+JOB_FLOW_TIMEOUT = float(os.getenv('JOB_FLOW_TIMEOUT', 120))
+# Longest GET /jobs/{job_id}?wait= holds a request open
+JOB_MAX_WAIT_SECONDS = float(os.getenv('JOB_MAX_WAIT_SECONDS', 30))
+
+
+def _job_response(job: Job, status_code: int = 200) -> Response:
+    """A job's state as the response body, pointing at its polling URL"""
+    return Response(
+        content=fastjson.dumps(job.to_dict()),
+        status_code=status_code,
+        media_type="application/json",
+        headers={"Location": f"{router.prefix}/jobs/{job.job_id}"}
+    )
+
+
+@router.post("/assessment/jobs", status_code=202)
+async def submit_assessment_job(
+    request: AssessmentRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Background version of /assessment
+
+    Returns 202 with the queued job at once; its result, once it
+    succeeds, is the /assessment response. Poll GET /jobs/{job_id}.
+    """
+    session = get_session(request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    try:
+        job = get_job_queue().submit(
+            "assessment",
+            request.session_id,
+            "assessment_plan",
+            lambda: _assess(langflow_service, session, request, timeout=JOB_FLOW_TIMEOUT)
+        )
+    except Exception as e:
+        raise langflow_http_exception(e)
+    return _job_response(job, status_code=202)
+
+
+@router.post("/exercise/feedback/jobs", status_code=202)
+async def submit_exercise_feedback_job(
+    request: ExerciseFeedbackRequest,
+    langflow_service: LangFlowService = Depends(get_langflow_service)
+):
+    """
+    Background version of /exercise/feedback
+
+    The transcript is taken when the job is submitted. Returns 202 with the
+    queued job; its result is the /exercise/feedback response.
+    """
+    chat = _exercise_chat_export(request)
+    try:
+        job = get_job_queue().submit(
+            "exercise_feedback",
+            request.session_id,
+            "session_feedback",
+            lambda: _feedback(langflow_service, request, chat, timeout=JOB_FLOW_TIMEOUT)
+        )
+    except Exception as e:
+        raise langflow_http_exception(e)
+    return _job_response(job, status_code=202)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish (long poll)")
+):
+    """
+    A background job's state
+
+    Returns:
+        {"job_id", "kind", "session_id", "status" (queued, running,
+        succeeded or failed), "created_at", "updated_at", "result", "error"}
+        - result is the synchronous route's response; error is
+        {"status", "detail"}, as the synchronous route would have returned.
+        With wait, returns as soon as the job finishes, or after wait
+        seconds (at most JOB_MAX_WAIT_SECONDS) with it still pending.
+    """
+    job = await get_job_queue().wait(job_id, min(wait, JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
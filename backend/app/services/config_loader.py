@@ -1,63 +1,180 @@
+"""
+Config loader - Langflow settings from config/langflow_config.json, reloaded on change
+
+The loader is the single source of LangFlowService settings: flow IDs,
+component IDs, timeouts, concurrency limits and pool sizes. Anything the
+file leaves out falls back to the environment (FLOW_<n>_ID, ...), so the
+file is optional.
+
+watch() notices edits through watchfiles (inotify) when it is installed,
+or by polling the file's mtime otherwise. A changed file is parsed and
+validated into a new LangFlowConfig snapshot, then swapped in with one
+assignment and handed to subscribers; an invalid file is logged and the
+current snapshot kept.
+"""
+import asyncio
 import json
-from pathlib import Path
-from typing import Dict, Optional
+import logging
 import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.langflow_config import LangFlowConfig
+from services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CONFIG_RELOADS = Counter(
+    "config_reloads_total",
+    "Config file reloads by result (applied, invalid)",
+    ["result"]
+)
+
+try:
+    from watchfiles import awatch
+except ImportError:
+    awatch = None
 
 
 class LangflowConfigLoader:
     """Load and manage Langflow configuration from JSON file"""
-    
-    def __init__(self, config_path: Optional[str] = None):
+
+    def __init__(self, config_path: Optional[str] = None, required: bool = False):
+        """
+        Args:
+            config_path: Config file (default: config/langflow_config.json)
+            required: Raise if the file doesn't exist (otherwise use the environment only)
+
+        Raises:
+            FileNotFoundError: If required and the file is missing
+            ValueError: If the file is invalid
+        """
         if config_path is None:
             # Default to config/langflow_config.json relative to backend directory
             backend_dir = Path(__file__).parent.parent.parent
             config_path = backend_dir / "config" / "langflow_config.json"
-        
+
         self.config_path = Path(config_path)
-        self.config: Dict = {}
+        self.required = required
+        self.snapshot: LangFlowConfig = LangFlowConfig.from_env()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._subscribers: List[Callable[[LangFlowConfig], None]] = []
         self.load_config()
-    
-    def load_config(self):
-        """Load configuration from JSON file at startup"""
+
+    @property
+    def config(self) -> Dict:
+        """Raw contents of the config file ({} when running from the environment)"""
+        return self.snapshot.raw
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.config_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> LangFlowConfig:
+        """Build and validate a snapshot from the file (or the environment alone)"""
+        defaults = LangFlowConfig.from_env()
         if not self.config_path.exists():
-            raise FileNotFoundError(
-                f"Langflow config file not found: {self.config_path}\n"
-                f"Please create it from the template: {self.config_path.parent / 'langflow_config.json.template'}"
-            )
-        
+            if self.required:
+                raise FileNotFoundError(
+                    f"Langflow config file not found: {self.config_path}\n"
+                    f"Please create it from the template: {self.config_path.parent / 'langflow_config.json.template'}"
+                )
+            return defaults.validate()
+
         try:
             with open(self.config_path, 'r') as f:
-                self.config = json.load(f)
+                data = json.load(f)
         except json.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON in config file: {e}")
+        return LangFlowConfig.from_dict(data, defaults, source=str(self.config_path)).validate()
+
+    def load_config(self):
+        """
+        Load configuration from the JSON file and swap it in
+
+        Raises:
+            FileNotFoundError: If the file is required and missing
+            ValueError: If the file is invalid (the current config is kept)
+        """
+        signature = self._file_signature()
+        self.snapshot = self._read()
+        self._signature = signature
+
+    def subscribe(self, callback: Callable[[LangFlowConfig], None]):
+        """Call callback with each new snapshot after a reload"""
+        self._subscribers.append(callback)
+
+    def reload(self) -> bool:
+        """
+        Reload the file if it changed since the last load
+
+        Returns:
+            True if a new config was swapped in
+        """
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature  # Don't retry an invalid file until it changes again
+
+        try:
+            snapshot = self._read()
+            for callback in self._subscribers:
+                callback(snapshot)
         except Exception as e:
-            raise RuntimeError(f"Error loading config file: {e}")
-    
+            CONFIG_RELOADS.inc(result="invalid")
+            logger.error("Ignoring config change in %s, keeping the current config: %s", self.config_path, e)
+            return False
+
+        self.snapshot = snapshot
+        CONFIG_RELOADS.inc(result="applied")
+        logger.info("Reloaded Langflow config from %s", snapshot.source)
+        return True
+
+    async def watch(self, poll_interval: float = 2.0):
+        """
+        Reload whenever the file changes - run as a background task
+
+        Args:
+            poll_interval: Seconds between mtime checks when watchfiles isn't installed
+        """
+        if awatch is not None:
+            # Watch the directory - editors often replace the file instead of writing it
+            self.config_path.parent.mkdir(parents=True, exist_ok=True)
+            async for _ in awatch(self.config_path.parent):
+                self.reload()
+        else:
+            while True:
+                await asyncio.sleep(poll_interval)
+                self.reload()
+
     def get_flow_config(self, flow_name: str) -> Dict:
         """Get configuration for a specific flow (flow_1 or flow_2)"""
         flow_key = f"flow_{flow_name}" if not flow_name.startswith("flow_") else flow_name
         return self.config.get(flow_key, {})
-    
+
     def get_openai_api_key(self, flow_name: str) -> Optional[str]:
         """Get OpenAI API key for a specific flow"""
         flow_config = self.get_flow_config(flow_name)
         return flow_config.get("openai_api_key")
-    
+
     def get_flow_endpoint(self, flow_name: str) -> Optional[str]:
         """Get endpoint URL for a specific flow"""
         flow_config = self.get_flow_config(flow_name)
         endpoint = flow_config.get("endpoint", "")
         flow_id = flow_config.get("flow_id", "")
-        
+
         # Replace {flow_id} placeholder if present
         if "{flow_id}" in endpoint and flow_id:
             endpoint = endpoint.replace("{flow_id}", flow_id)
-        
+
         return endpoint
-    
+
     def get_langflow_base_url(self) -> Optional[str]:
         """Get base URL for Langflow instance"""
-        return self.config.get("langflow_base_url")
+        return self.snapshot.base_url
 
 
 # Singleton instance
@@ -65,10 +182,15 @@ _config_loader: Optional[LangflowConfigLoader] = None
 
 
 def get_config_loader() -> LangflowConfigLoader:
-    """Get singleton config loader instance"""
+    """
+    Get singleton config loader instance
+
+    Environment:
+        CONFIG_PATH: Config file (default: config/langflow_config.json; when
+            set, the file must exist)
+    """
     global _config_loader
     if _config_loader is None:
         config_path = os.getenv("CONFIG_PATH")
-        _config_loader = LangflowConfigLoader(config_path)
+        _config_loader = LangflowConfigLoader(config_path, required=config_path is not None)
     return _config_loader
-
@@ -0,0 +1,245 @@
+"""
+Job queue - run slow flows in the background, off the request path
+
+Flows 2 and 4 can take longer than a client (or a reverse proxy) will
+hold a request open. Routes submit them here instead: the client gets a
+job ID at once and polls, or long-polls, GET /jobs/{job_id} for the
+result, while one of a fixed pool of worker tasks runs the flow.
+
+Jobs run on the queue's own tasks, so a client that goes away doesn't
+cancel its job. Job state lives in the job store (app.models.jobs), next
+to the sessions. With JOB_WEBHOOK_URL set, each finished job is also
+POSTed there.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from app.models.jobs import JOB_FAILED, JOB_RUNNING, JOB_SUCCEEDED, Job, get_job, save_job
+from app.utils.http_errors import langflow_http_exception
+from services.admission import AdmissionRejected
+from services.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+JOBS = Counter(
+    "jobs_total",
+    "Background jobs by kind and outcome (submitted, rejected, succeeded, failed)",
+    ["kind", "outcome"]
+)
+JOB_RUN_SECONDS = Histogram(
+    "job_run_duration_seconds",
+    "Time from a worker picking up a job to its result",
+    ["kind"]
+)
+JOBS_QUEUED = Gauge(
+    "jobs_queued",
+    "Jobs waiting for a worker"
+)
+JOB_WEBHOOKS = Counter(
+    "job_webhooks_total",
+    "Job completion webhook deliveries by result (sent, failed)",
+    ["result"]
+)
+
+# Seconds a client is told to wait when the queue is full
+QUEUE_FULL_RETRY_AFTER = 5.0
+WEBHOOK_TIMEOUT = 5.0
+# Long polls for jobs run by another worker process re-read the store this often
+POLL_INTERVAL = 0.5
+
+
+class JobQueue:
+    """Bounded queue of background flow runs, worked by a fixed pool of tasks"""
+
+    def __init__(self, workers: int = 4, max_queued: int = 100, webhook_url: Optional[str] = None):
+        """
+        Args:
+            workers: Jobs run at once
+            max_queued: Jobs waiting for a worker before submit() rejects
+            webhook_url: URL each finished job is POSTed to (optional)
+        """
+        self.workers = workers
+        self.max_queued = max_queued
+        self.webhook_url = webhook_url
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        # job_id -> set when the job finishes (jobs run by this process)
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _start(self):
+        # Created on first submit, inside the running event loop
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        if self.webhook_url:
+            self._webhook_client = httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT)
+
+    def submit(
+        self,
+        kind: str,
+        session_id: str,
+        flow_name: str,
+        run: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Job:
+        """
+        Queue a flow run as a job
+
+        Args:
+            kind: Job kind (e.g. "assessment")
+            session_id: Session the job belongs to
+            flow_name: Flow the job runs, for errors
+            run: Makes the flow call and returns the job's result
+
+        Returns:
+            The queued job (already saved)
+
+        Raises:
+            AdmissionRejected: If max_queued jobs are already waiting
+        """
+        if self._queue is None:
+            self._start()
+        if self._queue.full():
+            JOBS.inc(kind=kind, outcome="rejected")
+            raise AdmissionRejected(
+                f"Job queue is full ({self.max_queued} waiting)", flow_name, "queue_full", QUEUE_FULL_RETRY_AFTER
+            )
+
+        job = Job(kind, session_id)
+        save_job(job)
+        self._finished[job.job_id] = asyncio.Event()
+        self._queue.put_nowait((job, run))
+        JOBS.inc(kind=kind, outcome="submitted")
+        return job
+
+    async def _work(self):
+        while True:
+            job, run = await self._queue.get()
+            try:
+                await self._run(job, run)
+            except Exception:
+                # Keep the worker alive - e.g. the job store or webhook failed
+                logger.exception("Job %s (%s): error outside the flow run", job.job_id, job.kind)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job, run: Callable[[], Awaitable[Dict[str, Any]]]):
+        try:
+            job.status = JOB_RUNNING
+            save_job(job)
+            with JOB_RUN_SECONDS.time(kind=job.kind):
+                job.result = await run()
+            job.status = JOB_SUCCEEDED
+        except asyncio.CancelledError:
+            job.error = {"status": 503, "detail": "Server shut down before the job finished"}
+            job.status = JOB_FAILED
+            raise
+        except Exception as e:
+            error = langflow_http_exception(e)
+            job.error = {"status": error.status_code, "detail": error.detail}
+            job.status = JOB_FAILED
+            logger.warning("Job %s (%s) failed: %s", job.job_id, job.kind, e)
+        finally:
+            JOBS.inc(kind=job.kind, outcome=job.status)
+            event = self._finished.pop(job.job_id, None)
+            try:
+                save_job(job)
+            finally:
+                # Wake long polls even if the save failed
+                if event is not None:
+                    event.set()
+        await self._notify(job)
+
+    async def _notify(self, job: Job):
+        """POST the finished job to the webhook, if one is configured (best effort)"""
+        if self._webhook_client is None:
+            return
+        try:
+            response = await self._webhook_client.post(self.webhook_url, json=job.to_dict())
+            response.raise_for_status()
+        except Exception as e:
+            # Any failure, including a malformed JOB_WEBHOOK_URL (httpx.InvalidURL)
+            JOB_WEBHOOKS.inc(result="failed")
+            logger.warning("Job %s: webhook delivery failed: %s", job.job_id, e)
+        else:
+            JOB_WEBHOOKS.inc(result="sent")
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """
+        Get a job, waiting up to timeout seconds for it to finish
+
+        Returns:
+            The job (finished, or as it is when the timeout passes), or None
+            if there is no such job
+        """
+        job = get_job(job_id)
+        if job is None or job.done or timeout <= 0:
+            return job
+
+        event = self._finished.get(job_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return get_job(job_id)
+
+        # Run by another worker process - re-read the shared store
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while job is not None and not job.done:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+            job = get_job(job_id)
+        return job
+
+    async def aclose(self):
+        """Stop the workers; queued and running jobs are saved as failed"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            job, _ = self._queue.get_nowait()
+            job.error = {"status": 503, "detail": "Server shut down before the job started"}
+            job.status = JOB_FAILED
+            save_job(job)
+            JOBS.inc(kind=job.kind, outcome=job.status)
+        self._finished.clear()
+        self._queue = None
+        if self._webhook_client is not None:
+            await self._webhook_client.aclose()
+            self._webhook_client = None
+
+
+# Background job queue (created on first use)
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Get singleton job queue instance
+
+    Environment:
+        JOB_WORKERS: Jobs run at once (default: 4)
+        JOB_MAX_QUEUED: Jobs waiting for a worker before submits get 429
+            (default: 100)
+        JOB_WEBHOOK_URL: URL each finished job is POSTed to (optional)
+    """
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(
+            workers=int(os.getenv('JOB_WORKERS', 4)),
+            max_queued=int(os.getenv('JOB_MAX_QUEUED', 100)),
+            webhook_url=os.getenv('JOB_WEBHOOK_URL') or None
+        )
+        JOBS_QUEUED.set_function(lambda: len(_queue))
+    return _queue
@@ -0,0 +1,196 @@
+"""
+Speculative runs - start likely flow calls before the client asks for them
+
+After a scenario is generated the student nearly always opens one of its
+first exercise cards, and /exercise/start then waits for a whole Flow 3
+run. With speculation on, those starts are launched in the background as
+soon as the cards exist; when the student picks a card that was started,
+the route serves (or waits for) that run instead of making a new call.
+
+Each speculative run uses its own LangFlow session, so unused runs never
+end up in the memory of the chat the student continues; the route
+switches the session to the chosen run's LangFlow session on a hit.
+Runs not picked when the student picks another card, or within the TTL,
+are cancelled and counted as wasted. A global budget caps speculative
+runs in flight, so speculation never takes more than its share of the
+flow's concurrency limit.
+
+Outcomes are counted in speculative_runs_total{kind, outcome}:
+launched, skipped (over budget), hit, miss (the session had runs, but
+not for what was asked), wasted, failed. Hit rate is hit / (hit + miss);
+wasted + failed is LLM spend with no result served.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_RUNS = Counter(
+    "speculative_runs_total",
+    "Speculative flow runs by outcome (launched, skipped, hit, miss, wasted, failed)",
+    ["kind", "outcome"]
+)
+
+
+class _Run:
+    __slots__ = ("task", "flow_session_id")
+
+    def __init__(self, task: "asyncio.Task", flow_session_id: str):
+        self.task = task
+        self.flow_session_id = flow_session_id
+
+
+class SpeculativeRuns:
+    """Background runs keyed by (session, key), served at most once"""
+
+    def __init__(self, kind: str, budget: int = 4, ttl_seconds: float = 600.0):
+        """
+        Args:
+            kind: Metrics label (e.g. "exercise_start")
+            budget: Max speculative runs in flight across all sessions
+            ttl_seconds: How long an unused run is kept
+        """
+        self.kind = kind
+        self.budget = budget
+        self.ttl_seconds = ttl_seconds
+        self.in_flight = 0
+        # session_id -> (launched_at, {key: run}), oldest first
+        self._sessions: "OrderedDict[str, Tuple[float, Dict[str, _Run]]]" = OrderedDict()
+
+    def _count(self, outcome: str):
+        SPECULATIVE_RUNS.inc(kind=self.kind, outcome=outcome)
+
+    def _finished(self, task: "asyncio.Task"):
+        self.in_flight -= 1
+        if not task.cancelled() and task.exception() is not None:
+            self._count("failed")
+            logger.debug("Speculative %s run failed: %s", self.kind, task.exception())
+
+    def _discard(self, run: _Run):
+        if run.task.done() and (run.task.cancelled() or run.task.exception() is not None):
+            return  # Already counted as failed
+        run.task.cancel()
+        self._count("wasted")
+
+    def _expire(self, now: float):
+        while self._sessions:
+            session_id, (launched_at, runs) = next(iter(self._sessions.items()))
+            if launched_at > now - self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            for run in runs.values():
+                self._discard(run)
+
+    def launch(
+        self,
+        session_id: str,
+        key: str,
+        flow_session_id: str,
+        run: Callable[[str], Awaitable[Any]]
+    ) -> bool:
+        """
+        Start run(flow_session_id) in the background, budget permitting
+
+        Args:
+            session_id: Session the run belongs to
+            key: What the client will ask for (e.g. the exercise topic)
+            flow_session_id: LangFlow session for the run
+            run: Makes the flow call for a LangFlow session ID
+
+        Returns:
+            True if the run was started
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if self.in_flight >= self.budget:
+            self._count("skipped")
+            return False
+
+        task = asyncio.create_task(run(flow_session_id))
+        self.in_flight += 1
+        task.add_done_callback(self._finished)
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = (now, {})
+        previous = entry[1].get(key)
+        if previous is not None:
+            self._discard(previous)
+        entry[1][key] = _Run(task, flow_session_id)
+        self._count("launched")
+        return True
+
+    async def take(self, session_id: str, key: str) -> Optional[Tuple[Any, str]]:
+        """
+        Claim the session's run for key, waiting for it if still in flight
+
+        The session's other runs are discarded - the student chose.
+
+        Returns:
+            (result, flow_session_id), or None if there is no usable run
+            (the caller makes the call itself)
+        """
+        self._expire(time.monotonic())
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return None  # Nothing was launched for the session (or it expired)
+        runs = entry[1]
+        run = runs.pop(key, None)
+        for other in runs.values():
+            self._discard(other)
+        if run is None:
+            self._count("miss")
+            return None
+
+        try:
+            # Shielded: a client disconnect here shouldn't cancel the run itself
+            result = await asyncio.shield(run.task)
+        except asyncio.CancelledError:
+            if run.task.cancelled():
+                self._count("miss")
+                return None
+            raise
+        except Exception:
+            self._count("miss")  # Counted as failed when it finished
+            return None
+        self._count("hit")
+        return result, run.flow_session_id
+
+    async def aclose(self):
+        """Cancel every pending run (at shutdown)"""
+        sessions, self._sessions = self._sessions, OrderedDict()
+        tasks = []
+        for _, runs in sessions.values():
+            for run in runs.values():
+                self._discard(run)
+                tasks.append(run.task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Speculative exercise starts (None when disabled)
+_exercise_starts: Optional[SpeculativeRuns] = None
+
+
+def get_speculative_starts() -> Optional[SpeculativeRuns]:
+    """
+    Get the speculative exercise start runner, or None if disabled
+
+    Environment:
+        SPECULATIVE_START: Pre-generate exercise starts (default: false)
+        SPECULATIVE_START_BUDGET: Max speculative runs in flight (default: 4)
+        SPECULATIVE_START_TTL: Seconds an unused run is kept (default: 600)
+    """
+    global _exercise_starts
+    if _exercise_starts is None and os.getenv('SPECULATIVE_START', 'false').lower() == 'true':
+        _exercise_starts = SpeculativeRuns(
+            "exercise_start",
+            budget=int(os.getenv('SPECULATIVE_START_BUDGET', 4)),
+            ttl_seconds=float(os.getenv('SPECULATIVE_START_TTL', 600))
+        )
+    return _exercise_starts
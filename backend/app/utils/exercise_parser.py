@@ -1,8 +1,273 @@
 """
 Exercise Parser - Extracts structured exercise data from LangFlow responses
+
+All patterns are compiled once at import time. Exercise markers are found
+with a single scan for "Exercise <n>" and classified by the text in front
+of them. Each exercise's section headers are located in one pass over its
+colons, and the full patterns are then only matched at those positions.
 """
+import logging
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+from app.utils.langflow_response import extract_text
+
+logger = logging.getLogger(__name__)
+
+# --- Exercise markers --------------------------------------------------------
+# Supported formats (in priority order):
+# 1. ### Exercise 1: **Title**
+# 2. **Exercise 1: Title**
+# 3. Exercise 1: Title (without markdown, at the start of a line)
+#
+# Every format contains "Exercise <n>", so one scan finds all candidates.
+# The patterns below match from "Exercise" onwards; what has to come
+# before it (### / ** / start of line) is checked in _marker_start.
+_EXERCISE_WORD = re.compile(r'Exercise\s+\d+(:?)')
+# "Exercise" at the end of the text, before its number has arrived
+_OPEN_WORD = re.compile(r'Exercise\s*\Z')
+_NON_SPACE = re.compile(r'\S')
+
+FORMAT_HEADING = 0  # ### Exercise 1: **Title**
+FORMAT_BOLD = 1     # **Exercise 1: Title**
+FORMAT_PLAIN = 2    # Exercise 1: Title
+
+_MARKER_TAILS = (
+    re.compile(r'Exercise\s+(\d+):\s*\*\*([^*]+)\*\*'),
+    re.compile(r'Exercise\s+(\d+):\s*([^*]+)\*\*'),
+    re.compile(r'Exercise\s+(\d+):\s*([^\n*]+)'),
+)
+
+# --- Exercise sections -------------------------------------------------------
+_PROMPTS_HEADER = re.compile(r'\*\*Prompts?:\*\*', re.IGNORECASE)
+
+_FOCUS = re.compile(r'\*\*Focus:\*\*\s*([^\n]+)')
+_TYPE_BOLD = re.compile(r'\*\*Type:\*\*\s*([^\n]+)')
+_TYPE_PLAIN = re.compile(r'Type:\s*([^\n]+)')
+_PROMPTS_SECTION = re.compile(r'\*\*Prompts?:\*\*\s*\n((?:[-•*]\s*[^\n]+\n?)+)', re.IGNORECASE)
+_SINGLE_PROMPT = re.compile(r'\*\*(?:Your )?Prompt:\*\*\s*([^\n]+(?:\n(?!\*\*)[^\n]+)*)')
+_GUIDELINES = re.compile(r'\*\*What to include:\*\*\s*\n((?:[-•]\s*[^\n]+\n?)+)')
+
+_PROMPT_BULLET = re.compile(r'[-•*]\s*([^\n]+)')
+_GUIDELINE_BULLET = re.compile(r'[-•]\s*([^\n]+)')
+_BOLD_BULLET = re.compile(r'[-•]\s*\*\*')
+
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+_LEADING_RULE = re.compile(r'^---+\s*')
+_LINE_BULLET = re.compile(r'^\*\s+', re.MULTILINE)
+
+
+def _whitespace_start(text: str, pos: int, lower: int) -> int:
+    """Start of the run of whitespace ending at pos (not before lower)"""
+    while pos > lower and text[pos - 1].isspace():
+        pos -= 1
+    return pos
+
+
+def _marker_start(text: str, pos: int, fmt: int, lower: int, text_start: int = 0) -> Optional[int]:
+    """
+    Where a marker of the given format would start, for "Exercise" at pos
+
+    Args:
+        text: Text being parsed
+        pos: Position of the word "Exercise"
+        fmt: FORMAT_HEADING, FORMAT_BOLD or FORMAT_PLAIN
+        lower: Lowest allowed start (start of text or end of the previous marker)
+        text_start: Where the parsed part of text begins (counts as a line start)
+
+    Returns:
+        Start position of the marker, or None if the prefix doesn't fit the format
+    """
+    if fmt == FORMAT_BOLD:
+        start = pos - 2
+        return start if start >= lower and text.startswith("**", start) else None
+
+    ws_start = _whitespace_start(text, pos, lower)
+
+    if fmt == FORMAT_HEADING:
+        start = ws_start - 3
+        return start if start >= lower and text.startswith("###", start) else None
+
+    # FORMAT_PLAIN: a line start or newline, then only whitespace
+    if ws_start == text_start or text[ws_start - 1] == "\n":
+        return ws_start
+    newline = text.find("\n", ws_start, pos)
+    if newline != -1:
+        return newline
+    return None
+
+
+def _find_markers(
+    text: str,
+    words: List[re.Match],
+    fmt: int,
+    start: int,
+    end: int
+) -> List[Tuple[int, re.Match]]:
+    """
+    Non-overlapping markers of one format, as re.finditer would find them
+
+    Returns:
+        List of (marker start, tail match) pairs in text order
+    """
+    tail = _MARKER_TAILS[fmt]
+    markers = []
+    lower = start
+    for word in words:
+        if not word.group(1) or word.start() < lower:
+            continue  # Every format needs the colon; skip words inside the previous marker
+        marker_start = _marker_start(text, word.start(), fmt, lower, start)
+        if marker_start is None:
+            continue
+        match = tail.match(text, word.start(), end)
+        if match:
+            markers.append((marker_start, match))
+            lower = match.end()
+    return markers
+
+
+def _first_at(pattern: re.Pattern, content: str, starts: List[int]) -> Optional[re.Match]:
+    """Equivalent of pattern.search(content) when it can only match at starts"""
+    for start in starts:
+        match = pattern.match(content, start)
+        if match:
+            return match
+    return None
+
+
+def _parse_exercise(exercise_id: int, title: str, content: str) -> Dict:
+    """Extract focus, description, prompt and guidelines from one exercise's content"""
+    # Locate section headers in one pass: every header ends in a colon,
+    # so walk the colons and look at the text around each one
+    focus_starts, type_bold_starts, type_starts = [], [], []
+    prompts_starts, prompt_starts, guidelines_starts = [], [], []
+    pos = content.find(":")
+    while pos != -1:
+        bold_after = content.startswith("**", pos + 1)
+        if content.startswith("Type", pos - 4) and pos >= 4:
+            type_starts.append(pos - 4)
+            if bold_after and pos >= 6 and content.startswith("**", pos - 6):
+                type_bold_starts.append(pos - 6)
+        elif bold_after:
+            if pos >= 7 and content.startswith("**Focus", pos - 7):
+                focus_starts.append(pos - 7)
+            elif pos >= 17 and content.startswith("**What to include", pos - 17):
+                guidelines_starts.append(pos - 17)
+            else:
+                for start in (pos - 9, pos - 8):
+                    header = _PROMPTS_HEADER.match(content, start) if start >= 0 else None
+                    if header and header.end() == pos + 3:
+                        prompts_starts.append(start)
+                if pos >= 6 and content.startswith("Prompt", pos - 6):
+                    if pos >= 8 and content.startswith("**", pos - 8):
+                        prompt_starts.append(pos - 8)
+                    elif pos >= 13 and content.startswith("**Your ", pos - 13):
+                        prompt_starts.append(pos - 13)
+        pos = content.find(":", pos + 1)
+
+    # Extract focus/type area (multiple formats)
+    focus_match = (
+        _first_at(_FOCUS, content, focus_starts)
+        or _first_at(_TYPE_BOLD, content, type_bold_starts)
+        or _first_at(_TYPE_PLAIN, content, type_starts)
+    )
+    focus = focus_match.group(1).strip() if focus_match else ""
+
+    # Try to extract prompt (multiple possible formats)
+    prompt = ""
+    prompt_match = None
+    # Format 1: **Prompts:** followed by bullet points
+    prompts_section_match = _first_at(_PROMPTS_SECTION, content, prompts_starts)
+    if prompts_section_match:
+        prompt_items = _PROMPT_BULLET.findall(prompts_section_match.group(1))
+        if prompt_items:
+            prompt = '\n'.join([f"• {item.strip()}" for item in prompt_items])
+
+    # Format 2: **Your Prompt:** or **Prompt:** (single prompt)
+    if not prompt:
+        prompt_match = _first_at(_SINGLE_PROMPT, content, prompt_starts)
+        if prompt_match:
+            prompt = prompt_match.group(1).strip()
+
+    # Format 3: bullet points after Type/Focus (if no Prompts: header)
+    if not prompt and focus_match:
+        prompt_items = _PROMPT_BULLET.findall(content, focus_match.end())
+        if prompt_items:
+            prompt = '\n'.join([f"• {item.strip()}" for item in prompt_items[:5]])  # Limit to first 5
+
+    # Format 4: last paragraph is likely the prompt
+    if not prompt:
+        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
+        if len(paragraphs) >= 2:
+            prompt = paragraphs[-1]
+
+    # Extract description (text after title/focus, before prompts or guidelines)
+    description = ""
+    desc_start = focus_match.end() if focus_match else 0
+    desc_end = len(content)
+    prompts_header = prompts_starts[0] if prompts_starts else None
+    if prompts_header is not None:
+        desc_end = prompts_header
+    if guidelines_starts and guidelines_starts[0] < desc_end:
+        desc_end = guidelines_starts[0]
+    if prompt_match and prompt_match.start() < desc_end:
+        desc_end = prompt_match.start()
+
+    if desc_start < desc_end:
+        description = content[desc_start:desc_end].strip()
+        # Clean up extra newlines, separators and bullet points
+        # (each substitution only runs if its pattern can match)
+        if "\n" in description:
+            description = _BLANK_LINES.sub(' ', description)
+        if description.startswith("---"):
+            description = _LEADING_RULE.sub('', description)
+        if "*" in description:
+            description = _LINE_BULLET.sub('', description)
+        description = description.strip()
+
+    # If no description found, use the content up to the first bullet or prompts
+    if not description and content:
+        first_bullet = _BOLD_BULLET.search(content)
+        if first_bullet:
+            description = content[:first_bullet.start()].strip()
+        elif prompts_header is not None:
+            description = content[:prompts_header].strip()
+
+    # Extract guidelines (What to include)
+    guidelines = []
+    guidelines_match = _first_at(_GUIDELINES, content, guidelines_starts)
+    if guidelines_match:
+        guideline_items = _GUIDELINE_BULLET.findall(guidelines_match.group(1))
+        guidelines = [g.strip() for g in guideline_items if g.strip()]
+
+    return {
+        "id": exercise_id,
+        "title": title,
+        "focus": focus,
+        "description": description,
+        "prompt": prompt,
+        "guidelines": guidelines
+    }
+
+
+def _parse_exercises(text: str, words: List[re.Match], start: int, end: int) -> List[Dict]:
+    """Parse exercises from text[start:end] given its "Exercise <n>" matches"""
+    # Use the first format that has any marker
+    markers = []
+    for fmt in (FORMAT_HEADING, FORMAT_BOLD, FORMAT_PLAIN):
+        markers = _find_markers(text, words, fmt, start, end)
+        if markers:
+            break
+
+    exercises = []
+    for i, (_, match) in enumerate(markers):
+        content_end = markers[i + 1][0] if i + 1 < len(markers) else end
+        exercises.append(_parse_exercise(
+            exercise_id=int(match.group(1)),
+            title=match.group(2).strip(),
+            content=text[match.end():content_end].strip()
+        ))
+    return exercises
 
 
 def parse_exercises_from_text(text: str) -> List[Dict[str, str]]:
@@ -28,146 +293,25 @@ def parse_exercises_from_text(text: str) -> List[Dict[str, str]]:
             "guidelines": ["guideline 1", "guideline 2", ...]
         }
     """
-    exercises = []
+    return _parse_exercises(text, list(_EXERCISE_WORD.finditer(text)), 0, len(text))
 
-    # Try multiple exercise marker patterns
-    # Pattern 1: ### Exercise 1: **Title**
-    pattern1 = r'###\s*Exercise\s+(\d+):\s*\*\*([^*]+)\*\*'
-    # Pattern 2: **Exercise 1: Title**
-    pattern2 = r'\*\*Exercise\s+(\d+):\s*([^*]+)\*\*'
-    # Pattern 3: Exercise 1: Title (without markdown)
-    pattern3 = r'(?:^|\n)\s*Exercise\s+(\d+):\s*([^\n*]+)'
-    
-    exercise_pattern = pattern1
-    exercise_splits = re.split(exercise_pattern, text)
-    
-    # If pattern 1 didn't match, try pattern 2
-    if len(exercise_splits) == 1:
-        exercise_pattern = pattern2
-        exercise_splits = re.split(exercise_pattern, text)
-    
-    # If pattern 2 didn't match, try pattern 3
-    if len(exercise_splits) == 1:
-        exercise_pattern = pattern3
-        exercise_splits = re.split(exercise_pattern, text, flags=re.MULTILINE)
-
-    # Process matches: [before_match, id1, title1, content1, id2, title2, content2, ...]
-    for i in range(1, len(exercise_splits), 3):
-        if i + 2 > len(exercise_splits):
-            break
 
-        exercise_id = int(exercise_splits[i])
-        title = exercise_splits[i + 1].strip()
-        content = exercise_splits[i + 2].strip() if i + 2 < len(exercise_splits) else ""
-
-        # Extract focus/type area (multiple formats)
-        focus_match = re.search(r'\*\*Focus:\*\*\s*([^\n]+)', content)
-        if not focus_match:
-            focus_match = re.search(r'\*\*Type:\*\*\s*([^\n]+)', content)
-        if not focus_match:
-            focus_match = re.search(r'Type:\s*([^\n]+)', content)
-        focus = focus_match.group(1).strip() if focus_match else ""
-
-        # Try to extract prompt (multiple possible formats)
-        prompt = ""
-        # Format 1: **Prompts:** followed by bullet points
-        prompts_section_match = re.search(r'\*\*Prompts?:\*\*\s*\n((?:[-•*]\s*[^\n]+\n?)+)', content, re.MULTILINE | re.IGNORECASE)
-        if prompts_section_match:
-            prompts_text = prompts_section_match.group(1)
-            # Extract all bullet points
-            prompt_items = re.findall(r'[-•*]\s*([^\n]+)', prompts_text)
-            if prompt_items:
-                # Combine all prompt items
-                prompt = '\n'.join([f"• {item.strip()}" for item in prompt_items])
-        
-        # Format 2: **Your Prompt:** or **Prompt:** (single prompt)
-        if not prompt:
-            prompt_match = re.search(r'\*\*(?:Your )?Prompt:\*\*\s*([^\n]+(?:\n(?!\*\*)[^\n]+)*)', content, re.MULTILINE)
-            if prompt_match:
-                prompt = prompt_match.group(1).strip()
-        
-        # Format 3: Look for bullet points in content (if no Prompts: header)
-        if not prompt:
-            # Find bullet points that come after Type/Focus
-            if focus_match:
-                content_after_focus = content[focus_match.end():]
-                prompt_items = re.findall(r'[-•*]\s*([^\n]+)', content_after_focus)
-                if prompt_items:
-                    prompt = '\n'.join([f"• {item.strip()}" for item in prompt_items[:5]])  # Limit to first 5
-        
-        # Format 4: Look for last paragraph after description
-        if not prompt:
-            paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-            if len(paragraphs) >= 2:
-                # Last paragraph is likely the prompt
-                prompt = paragraphs[-1]
-
-        # Extract description (text between title and prompts/guidelines)
-        description = ""
-        # Find where description starts (after title, focus/type)
-        desc_start = 0
-        if focus_match:
-            desc_start = focus_match.end()
-        
-        # Find where description ends (before prompts or guidelines)
-        desc_end = len(content)
-        
-        # Check for prompts section first
-        prompts_section = re.search(r'\*\*Prompts?:\*\*', content, re.IGNORECASE)
-        if prompts_section and prompts_section.start() < desc_end:
-            desc_end = prompts_section.start()
-        
-        # Check for guidelines section
-        guidelines_match = re.search(r'\*\*What to include:\*\*', content)
-        if guidelines_match and guidelines_match.start() < desc_end:
-            desc_end = guidelines_match.start()
-        
-        if prompt_match and prompt_match.start() < desc_end:
-            desc_end = prompt_match.start()
-
-        if desc_start < desc_end:
-            description = content[desc_start:desc_end].strip()
-            # Clean up extra newlines and separators
-            description = re.sub(r'\n\s*\n+', ' ', description)
-            description = re.sub(r'^---+\s*', '', description)
-            description = re.sub(r'^\*\s+', '', description, flags=re.MULTILINE)  # Remove bullet points
-            description = description.strip()
-        
-        # If no description found, use the content up to prompts
-        if not description and content:
-            # Try to get text before first bullet point or prompt marker
-            first_bullet = re.search(r'[-•]\s*\*\*', content)
-            if first_bullet:
-                description = content[:first_bullet.start()].strip()
-            elif prompts_section:
-                description = content[:prompts_section.start()].strip()
-
-        # Extract guidelines (What to include)
-        guidelines = []
-        guidelines_match = re.search(
-            r'\*\*What to include:\*\*\s*\n((?:[-•]\s*[^\n]+\n?)+)',
-            content,
-            re.MULTILINE
-        )
-        if guidelines_match:
-            guidelines_text = guidelines_match.group(1)
-            # Extract bullet points
-            guideline_items = re.findall(r'[-•]\s*([^\n]+)', guidelines_text)
-            guidelines = [g.strip() for g in guideline_items if g.strip()]
-
-        # Build exercise object
-        exercise = {
-            "id": exercise_id,
-            "title": title,
-            "focus": focus,
-            "description": description,
-            "prompt": prompt,
-            "guidelines": guidelines
-        }
-
-        exercises.append(exercise)
+def _exercises_start(text: str, words: List[re.Match]) -> Optional[int]:
+    """
+    Position where the exercises begin (after the scenario greeting)
 
-    return exercises
+    Looks for, in priority order: "### Exercise <n>", "**Exercise <n>:",
+    and "Exercise <n>:" at the start of a line.
+    """
+    for fmt in (FORMAT_HEADING, FORMAT_BOLD, FORMAT_PLAIN):
+        for word in words:
+            # "### Exercise 1" doesn't need the colon to mark the start
+            if fmt != FORMAT_HEADING and not word.group(1):
+                continue
+            marker_start = _marker_start(text, word.start(), fmt, 0)
+            if marker_start is not None:
+                return marker_start
+    return None
 
 
 def parse_scenario_and_exercises(langflow_response: Dict) -> tuple[Optional[str], List[Dict[str, str]]]:
@@ -178,73 +322,211 @@ def parse_scenario_and_exercises(langflow_response: Dict) -> tuple[Optional[str]
         langflow_response: Raw response from LangFlow API
 
     Returns:
-        Tuple of (scenario_text, exercises_list)
+        Tuple of (scenario_text, exercises_list) - (None, []) if the response
+        has no recognizable text
     """
     scenario = None
     exercises = []
 
     # Debug: Log the response structure
-    print(f"DEBUG PARSER: Response type: {type(langflow_response)}")
-    if isinstance(langflow_response, dict):
-        print(f"DEBUG PARSER: Top-level keys: {list(langflow_response.keys())}")
-
-    # Navigate LangFlow response structure - try multiple possible formats
-    if isinstance(langflow_response, dict):
-        # Try format 1: outputs array structure
-        outputs = langflow_response.get("outputs", [])
-        if outputs:
-            first_output = outputs[0] if outputs else {}
-            output_data = first_output.get("outputs", [{}])[0] if isinstance(first_output.get("outputs"), list) else {}
-            message = output_data.get("results", {}).get("message", {})
-            text = message.get("text") or message.get("content") or str(message)
-        else:
-            # Try format 2: Direct text/content field
-            text = langflow_response.get("text") or langflow_response.get("content") or langflow_response.get("message", "")
-            if isinstance(text, dict):
-                text = text.get("text") or text.get("content") or str(text)
-        
-        # If still no text, try to stringify the whole response
-        if not text or text == "{}":
-            text = str(langflow_response)
-
-        if text and text != "{}":
-            print(f"DEBUG PARSER: Extracted text length: {len(text)}")
-            print(f"DEBUG PARSER: Text preview: {text[:200]}...")
-            
+    logger.debug(
+        "Parsing response of type %s, keys: %s",
+        type(langflow_response).__name__,
+        langflow_response.keys() if isinstance(langflow_response, dict) else None
+    )
+
+    text = extract_text(langflow_response, "scenario_generation")
+    if text:
+        logger.debug("Extracted text length: %d", len(text))
+
+        # Find all exercise markers in one scan
+        words = list(_EXERCISE_WORD.finditer(text))
+        exercise_start = _exercises_start(text, words)
+
+        if exercise_start is not None:
             # Split scenario greeting from exercises
-            # Try multiple exercise marker patterns
-            exercise_start = None
-            patterns_to_try = [
-                r'###\s*Exercise\s+\d+',  # ### Exercise 1
-                r'\*\*Exercise\s+\d+:',   # **Exercise 1:**
-                r'(?:^|\n)\s*Exercise\s+\d+:',  # Exercise 1: (start of line)
-            ]
-            
-            for pattern in patterns_to_try:
-                exercise_start = re.search(pattern, text, re.MULTILINE)
-                if exercise_start:
-                    break
-            
-            if exercise_start:
-                scenario = text[:exercise_start.start()].strip()
-                exercises_text = text[exercise_start.start():].strip()
-                print(f"DEBUG PARSER: Found exercise marker at position {exercise_start.start()}, parsing exercises...")
-                exercises = parse_exercises_from_text(exercises_text)
-                print(f"DEBUG PARSER: Parsed {len(exercises)} exercises")
-                if exercises:
-                    print(f"DEBUG PARSER: Exercise titles: {[ex.get('title', 'N/A') for ex in exercises]}")
-            else:
-                # No exercises found, entire text is scenario
-                print(f"DEBUG PARSER: No exercise markers found, treating entire text as scenario")
-                # Try to extract exercises from within the scenario text anyway
-                # Sometimes exercises are embedded in the scenario
-                exercises = parse_exercises_from_text(text)
-                if exercises:
-                    print(f"DEBUG PARSER: Found {len(exercises)} exercises embedded in scenario")
-                    # Keep scenario as is, exercises are already extracted
-                scenario = text
+            scenario = text[:exercise_start].strip()
+            logger.debug("Found exercise marker at position %d, parsing exercises", exercise_start)
+
+            # Parse the exercises part (whitespace-trimmed) using the same marker scan
+            start = exercise_start
+            while text[start].isspace():
+                start += 1
+            end = len(text.rstrip())
+            exercises = _parse_exercises(
+                text,
+                [word for word in words if word.start() >= start],
+                start,
+                end
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Parsed %d exercises: %s", len(exercises), [ex.get('title', 'N/A') for ex in exercises])
         else:
-            print(f"DEBUG PARSER: No text found in response")
-            scenario = str(langflow_response)
+            # No exercise markers found - entire text is scenario
+            # (every exercise format has a marker, so there are no embedded exercises either)
+            logger.debug("No exercise markers found, treating entire text as scenario")
+            scenario = text
+    else:
+        logger.debug("No text found in response")
 
     return scenario, exercises
+
+
+class IncrementalExerciseParser:
+    """
+    Parses a Flow 1 response while it is still being generated
+
+    Feed text chunks as they arrive. Each call returns the events that
+    became final:
+        ("scenario", text) - once, as soon as the first exercise marker appears
+        ("exercise", dict) - each exercise, once the next marker (or close()) ends it
+
+    Uses the same marker formats and exercise extraction as
+    parse_scenario_and_exercises. Two differences follow from not seeing
+    the whole text up front: the first marker found fixes where the
+    scenario ends and which marker format is used (the batch parser prefers
+    ### markers anywhere in the text), and a marker is only evaluated once
+    the line after it has started, so titles must not span lines.
+
+    Chunks are only joined into the text when they could finish a marker
+    (a new "Exercise", or the line after a pending marker), so feeding a
+    long reply token by token stays linear in its length.
+    """
+
+    TAIL = 16  # characters kept from the end of the text to spot "Exercise" across chunks
+
+    def __init__(self):
+        self._text = ""
+        self._pending: List[str] = []  # chunks not yet joined into _text
+        self._tail = ""           # last TAIL characters fed
+        self._waiting = False     # a marker was found but needs more text
+        self._open_word = False   # the text ends with "Exercise" and maybe spaces
+        self._scan_pos = 0        # where to look for the next "Exercise <n>"
+        self._start: Optional[int] = None  # where the exercises part begins
+        self._lower = 0           # end of the last marker (markers don't overlap)
+        self._format: Optional[int] = None
+        self._current: Optional[Tuple[int, str]] = None  # (id, title) of the open exercise
+        self._content_start = 0
+        self.scenario: Optional[str] = None
+        self.exercises: List[Dict] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        """
+        Add the next chunk of text
+
+        Returns:
+            List of ("scenario", str) / ("exercise", dict) events, possibly empty
+        """
+        if not chunk:
+            return []
+        self._pending.append(chunk)
+        window = self._tail + chunk
+        # A new "Exercise" that ends in this chunk, or a marker already in progress
+        ready = (
+            self._waiting
+            or self._open_word
+            or window.find("Exercise", max(len(self._tail) - 7, 0)) != -1
+        )
+        if not chunk.isspace():
+            self._open_word = _OPEN_WORD.search(window) is not None
+        self._tail = window[-self.TAIL:]
+        if not ready:
+            return []
+        self._join()
+        return self._advance(final=False)
+
+    def _join(self):
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+
+    def close(self) -> List[Tuple[str, object]]:
+        """
+        Mark the end of the stream and return the remaining events
+
+        If no exercise marker was ever found, the whole text is the scenario.
+        """
+        self._join()
+        events = self._advance(final=True)
+        if self._current is not None:
+            events.append(("exercise", self._finish_exercise(len(self._text.rstrip()))))
+        elif self.scenario is None:
+            self.scenario = self._text
+            events.append(("scenario", self.scenario))
+        return events
+
+    def _marker_ready(self, word: re.Match) -> bool:
+        """A marker can be evaluated once text has started on a following line"""
+        newline = self._text.find("\n", word.end())
+        return newline != -1 and _NON_SPACE.search(self._text, newline) is not None
+
+    def _find_exercises_start(self, word: re.Match) -> Optional[int]:
+        """Marker prefix at word that ends the scenario (see _exercises_start)"""
+        for fmt in (FORMAT_HEADING, FORMAT_BOLD, FORMAT_PLAIN):
+            if fmt != FORMAT_HEADING and not word.group(1):
+                continue
+            marker_start = _marker_start(self._text, word.start(), fmt, 0)
+            if marker_start is not None:
+                return marker_start
+        return None
+
+    def _match_marker(self, word: re.Match) -> Optional[Tuple[int, int, re.Match]]:
+        """Match an exercise marker at word in the current (or first matching) format"""
+        if not word.group(1) or word.start() < self._lower:
+            return None
+        formats = (self._format,) if self._format is not None else (FORMAT_HEADING, FORMAT_BOLD, FORMAT_PLAIN)
+        for fmt in formats:
+            marker_start = _marker_start(self._text, word.start(), fmt, self._lower, self._start)
+            if marker_start is None:
+                continue
+            match = _MARKER_TAILS[fmt].match(self._text, word.start())
+            if match:
+                return fmt, marker_start, match
+        return None
+
+    def _finish_exercise(self, content_end: int) -> Dict:
+        exercise_id, title = self._current
+        exercise = _parse_exercise(
+            exercise_id=exercise_id,
+            title=title,
+            content=self._text[self._content_start:content_end].strip()
+        )
+        self.exercises.append(exercise)
+        return exercise
+
+    def _advance(self, final: bool) -> List[Tuple[str, object]]:
+        events = []
+        self._waiting = False
+        for word in _EXERCISE_WORD.finditer(self._text, self._scan_pos):
+            if not final and not self._marker_ready(word):
+                self._waiting = True
+                break  # Wait for more text
+
+            if self._start is None:
+                exercises_start = self._find_exercises_start(word)
+                if exercises_start is None:
+                    self._scan_pos = word.end()
+                    continue
+                self.scenario = self._text[:exercises_start].strip()
+                events.append(("scenario", self.scenario))
+                self._start = exercises_start
+                while self._text[self._start].isspace():
+                    self._start += 1
+                self._lower = self._start
+
+            marker = self._match_marker(word)
+            if marker is not None:
+                fmt, marker_start, match = marker
+                if not final and fmt == FORMAT_PLAIN and match.end() == len(self._text):
+                    self._waiting = True
+                    break  # Title may still be growing
+
+                if self._current is not None:
+                    events.append(("exercise", self._finish_exercise(marker_start)))
+                self._format = fmt
+                self._current = (int(match.group(1)), match.group(2).strip())
+                self._content_start = match.end()
+                self._lower = match.end()
+
+            self._scan_pos = word.end()
+        return events
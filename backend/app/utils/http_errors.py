@@ -0,0 +1,56 @@
+"""
+HTTP error mapping for LangFlow failures
+
+Every onboarding route turns LangFlow errors into responses the same way:
+unreachable or circuit open -> 503, timeout -> 504, error status from
+LangFlow -> 502, anything else -> 500. Admission control rejections are
+429 (queue full) or 503 (queue wait deadline passed), with Retry-After.
+"""
+import math
+
+from fastapi import HTTPException
+
+from services.admission import AdmissionRejected
+from services.resilience import (
+    CircuitOpenError,
+    LangFlowConnectionError,
+    LangFlowError,
+    LangFlowTimeoutError,
+)
+
+
+def langflow_http_exception(error: Exception) -> HTTPException:
+    """
+    HTTPException to return for an exception raised while calling LangFlow
+
+    Args:
+        error: Exception from LangFlowService (or any other failure in the route)
+
+    Returns:
+        HTTPException with a status code and a message safe to show the user
+    """
+    if isinstance(error, AdmissionRejected):
+        return HTTPException(
+            status_code=429 if error.reason == "queue_full" else 503,
+            detail="Too many requests right now, please try again shortly",
+            headers={"Retry-After": str(math.ceil(error.retry_after))}
+        )
+    if isinstance(error, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail="Langflow is temporarily unavailable, please try again shortly",
+            headers={"Retry-After": str(math.ceil(error.retry_after))}
+        )
+    if isinstance(error, LangFlowConnectionError):
+        return HTTPException(
+            status_code=503,
+            detail="Cannot connect to Langflow. Make sure Langflow is running at http://localhost:7860"
+        )
+    if isinstance(error, LangFlowTimeoutError):
+        return HTTPException(status_code=504, detail="Langflow request timed out")
+    if isinstance(error, LangFlowError):
+        return HTTPException(status_code=502, detail=f"Langflow error: {error}")
+    if isinstance(error, ValueError):
+        # Flow not configured
+        return HTTPException(status_code=500, detail=str(error))
+    return HTTPException(status_code=500, detail=f"Internal server error: {error}")
@@ -0,0 +1,129 @@
+"""
+LangFlow response extraction - the reply text from a run response
+
+Run responses put the reply at outputs[0].outputs[0].results.message.text;
+older flows and some components answer with a top-level text/content/
+message field instead. extract_text() tries the shape last seen for the
+flow first, with plain indexing and no intermediate copies, and only
+probes the other shapes when that fails. Shape changes and unrecognized
+responses are counted in langflow_response_shape_mismatches_total and
+return "" - the payload is never stringified.
+"""
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_SHAPE_MISMATCHES = Counter(
+    "langflow_response_shape_mismatches_total",
+    "Run responses that didn't have the shape last seen for the flow, by the shape found instead",
+    ["flow", "expected", "shape"]
+)
+
+SHAPE_OUTPUTS = "outputs"      # outputs[0].outputs[0].results.message.{text,content}
+SHAPE_TOP_LEVEL = "top_level"  # {"text"|"content"|"message": ...}
+SHAPE_UNKNOWN = "unknown"
+
+
+def _message_text(message: Any) -> Optional[str]:
+    """Text of a message dict (or plain string), None if it has none"""
+    if isinstance(message, str):
+        return message
+    if not isinstance(message, dict):
+        return None
+    text = message.get("text") or message.get("content")
+    if isinstance(text, str):
+        return text
+    # An empty reply is still the expected shape
+    return "" if isinstance(message.get("text"), str) else None
+
+
+def reply_message(response: Dict[str, Any]) -> Any:
+    """
+    The outputs[0].outputs[0].results.message value of a run response
+
+    Raises:
+        LookupError, TypeError: If the response doesn't have that shape
+    """
+    return response["outputs"][0]["outputs"][0]["results"]["message"]
+
+
+def _outputs_text(response: Dict[str, Any]) -> Optional[str]:
+    try:
+        message = reply_message(response)
+    except (LookupError, TypeError):
+        return None
+    return _message_text(message)
+
+
+def _top_level_text(response: Dict[str, Any]) -> Optional[str]:
+    if "outputs" in response:
+        return None
+    return _message_text(response.get("text") or response.get("content") or response.get("message"))
+
+
+_EXTRACTORS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    SHAPE_OUTPUTS: _outputs_text,
+    SHAPE_TOP_LEVEL: _top_level_text,
+}
+
+# Flow name -> shape of its last recognized response
+_flow_shapes: Dict[str, str] = {}
+
+
+def extract_text(response: Any, flow_name: str = "unknown") -> str:
+    """
+    Reply text of a LangFlow run response
+
+    Args:
+        response: Run response (or the result of a stream's end event)
+        flow_name: Flow that produced it - shapes are tracked per flow
+
+    Returns:
+        The reply text, or "" if the response has no recognizable text
+    """
+    expected = _flow_shapes.get(flow_name, SHAPE_OUTPUTS)
+    if isinstance(response, dict):
+        text = _EXTRACTORS[expected](response)
+        if text is not None:
+            return text
+
+        for shape, extractor in _EXTRACTORS.items():
+            if shape != expected:
+                text = extractor(response)
+                if text is not None:
+                    RESPONSE_SHAPE_MISMATCHES.inc(flow=flow_name, expected=expected, shape=shape)
+                    logger.info("LangFlow flow %s changed response shape: %s -> %s", flow_name, expected, shape)
+                    _flow_shapes[flow_name] = shape
+                    return text
+
+    RESPONSE_SHAPE_MISMATCHES.inc(flow=flow_name, expected=expected, shape=SHAPE_UNKNOWN)
+    logger.warning(
+        "Unrecognized LangFlow response from flow %s: %s with keys %s",
+        flow_name,
+        type(response).__name__,
+        list(response)[:10] if isinstance(response, dict) else None
+    )
+    return ""
+
+
+def trim_envelope(response: Any) -> Any:
+    """
+    The run response reduced to its reply message
+
+    Keeps the outputs[0].outputs[0].results.message path (so clients reading
+    it still work) and session_id, and drops logs, artifacts and the
+    per-component outputs. Other shapes are returned unchanged.
+    """
+    if not isinstance(response, dict):
+        return response
+    try:
+        message = reply_message(response)
+    except (LookupError, TypeError):
+        return response
+    return {
+        "session_id": response.get("session_id"),
+        "outputs": [{"outputs": [{"results": {"message": message}}]}]
+    }
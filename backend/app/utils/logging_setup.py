@@ -0,0 +1,166 @@
+"""
+Logging setup - leveled, structured logging off the request path
+
+Log calls only enqueue the record; a background QueueListener thread
+formats it and writes to stdout, so request handlers never wait on
+string rendering or stdout writes. Use %-style arguments
+(logger.debug("x=%s", x)) so records below LOG_LEVEL are never formatted,
+and log_payload() for LangFlow responses and other large values.
+
+Environment:
+    LOG_LEVEL: Minimum level (default: INFO)
+    LOG_FORMAT: "text" or "json" (default: text)
+    LOG_PAYLOAD_SAMPLE_RATE: Fraction of payloads logged at DEBUG (default: 0.1)
+    LOG_PAYLOAD_MAX_CHARS: Payloads are truncated to this length (default: 2000)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Any, Iterable, Optional
+
+# Attributes every LogRecord has - anything else came in through extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+REDACTED = "[redacted]"
+
+# Intake form fields that identify a student
+PII_FIELDS = frozenset({"full_name", "name", "email"})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_payload_sample_rate = 0.1
+_payload_max_chars = 2000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra={...} fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread
+
+    The stock prepare() formats the message in the calling thread so the
+    record can be pickled; this queue never leaves the process.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging():
+    """
+    Configure the root logger from the environment (safe to call twice)
+
+    Installs a queue handler on the root logger and starts the listener
+    thread that writes to stdout. The listener is stopped (and the queue
+    flushed) by shutdown_logging() or at interpreter exit.
+    """
+    global _listener, _payload_sample_rate, _payload_max_chars
+    if _listener is not None:
+        return
+
+    _payload_sample_rate = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 0.1))
+    _payload_max_chars = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', 2000))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [_DeferredQueueHandler(log_queue)]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    # The HTTP client logs every LangFlow request at INFO
+    for name in ("httpx", "httpcore"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def redact(data: Any, names: Iterable[str] = ()) -> Any:
+    """
+    Copy of data with student PII removed
+
+    Args:
+        data: Dict, list or string to clean
+        names: Student names to blank out of free text
+
+    Returns:
+        data with PII_FIELDS values and the given names replaced by [redacted]
+    """
+    if isinstance(data, dict):
+        return {
+            key: REDACTED if key in PII_FIELDS and value else redact(value, names)
+            for key, value in data.items()
+        }
+    if isinstance(data, list):
+        return [redact(item, names) for item in data]
+    if isinstance(data, str):
+        for name in names:
+            if name:
+                data = data.replace(name, REDACTED)
+    return data
+
+
+def log_payload(
+    logger: logging.Logger,
+    message: str,
+    payload: Any,
+    names: Iterable[str] = ()
+):
+    """
+    Log a large payload at DEBUG - sampled, redacted and truncated
+
+    Costs one level check when DEBUG is off; otherwise only a
+    LOG_PAYLOAD_SAMPLE_RATE fraction of payloads are serialized.
+
+    Args:
+        logger: Logger to write to
+        message: Description, e.g. "Flow 1 response"
+        payload: JSON-serializable value
+        names: Student full names to redact from free text (first names too)
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if _payload_sample_rate < 1 and random.random() >= _payload_sample_rate:
+        return
+
+    # Full names first, so "Ana Lee" isn't left as "[redacted] Lee"
+    full_names = [" ".join(name.split()) for name in names if name and name.strip()]
+    first_names = [name.split(" ")[0] for name in full_names]
+    text = json.dumps(redact(payload, full_names + first_names), default=str, ensure_ascii=False)
+    size = len(text)
+    if size > _payload_max_chars:
+        text = text[:_payload_max_chars] + "..."
+    logger.debug("%s (%d chars): %s", message, size, text)
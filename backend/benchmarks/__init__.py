@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the onboarding hot paths
+
+Run from the backend directory:
+    python -m benchmarks.run
+"""
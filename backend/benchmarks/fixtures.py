@@ -0,0 +1,139 @@
+"""
+Benchmark fixtures - recorded and synthetic LangFlow payloads
+
+The recorded payloads come from docs/example-chat-history-exercise-5.json
+(a real Flow 3 conversation). Synthetic Flow 1 responses are generated in
+all three exercise marker formats the parser supports.
+"""
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+DOCS_DIR = Path(__file__).resolve().parents[2] / "docs"
+CHAT_HISTORY_PATH = DOCS_DIR / "example-chat-history-exercise-5.json"
+
+# Marker formats, keyed by name (see app/utils/exercise_parser.py)
+FORMATS = {
+    "heading": "### Exercise {n}: **{title}**",
+    "bold": "**Exercise {n}: {title}**",
+    "plain": "Exercise {n}: {title}",
+}
+
+_TITLES = [
+    "Story Hook", "Transition Word Bridge", "Meme Caption Challenge",
+    "Persuasive Pitch", "Descriptive Snapshot", "Dialogue Remix",
+]
+_FOCUS = [
+    "Writing engaging openings", "Using transitions to connect ideas smoothly",
+    "Concise, punchy wording", "Supporting claims with evidence",
+]
+_INTERESTS = ["football", "cricket", "anime", "music", "gaming", "cooking"]
+
+FORM_DATA = {
+    "full_name": "Ana Lee",
+    "age_group": "14-16",
+    "interests": "football, music",
+    "cultural_refs": "IPL, Diwali",
+    "hardest": "Producing",
+    "audience": "peers",
+}
+
+
+def run_envelope(text: str, session_id: str = "benchmark") -> Dict[str, Any]:
+    """Wrap text in the LangFlow run response envelope"""
+    return {
+        "session_id": session_id,
+        "outputs": [{
+            "inputs": {"input_value": "lets start"},
+            "outputs": [{
+                "results": {"message": {"text": text, "sender": "Machine"}},
+                "artifacts": {},
+                "messages": [],
+            }],
+        }],
+    }
+
+
+def full_run_envelope(text: str, session_id: str = "benchmark") -> Dict[str, Any]:
+    """
+    run_envelope with the duplicated fields a real LangFlow response carries
+
+    LangFlow repeats the reply in artifacts, messages and the component
+    outputs, and adds per-component logs.
+    """
+    envelope = run_envelope(text, session_id)
+    message = envelope["outputs"][0]["outputs"][0]["results"]["message"]
+    message.update({
+        "sender_name": "AI",
+        "session_id": session_id,
+        "timestamp": "2025-01-01T00:00:00+00:00",
+        "files": [],
+        "properties": {"text_color": "", "background_color": "", "edited": False, "source": {}},
+    })
+    envelope["outputs"][0]["outputs"][0].update({
+        "artifacts": {"message": text, "sender": "Machine", "sender_name": "AI", "files": [], "type": "object"},
+        "outputs": {"message": {"message": text, "type": "text"}},
+        "logs": {"ChatOutput-1": [], "OpenAIModel-1": [{"message": text, "type": "text"}]},
+        "messages": [{"message": text, "sender": "Machine", "sender_name": "AI", "session_id": session_id}],
+        "timedelta": None,
+        "duration": None,
+        "component_display_name": "Chat Output",
+        "component_id": "ChatOutput-1",
+        "used_frozen_result": False,
+    })
+    return envelope
+
+
+def load_chat_history() -> Dict[str, Any]:
+    """The recorded Flow 3 conversation"""
+    with open(CHAT_HISTORY_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def chat_replies() -> List[str]:
+    """Recorded AI coach replies, in conversation order"""
+    history = load_chat_history()
+    return [turn["content"] for turn in history["chat_history"] if turn["role"] == "assistant"]
+
+
+def synthetic_scenario_text(fmt: str, exercises: int, seed: int = 0) -> str:
+    """
+    Generate a Flow 1 response with the given number of exercises
+
+    Args:
+        fmt: Marker format name ("heading", "bold" or "plain")
+        exercises: Number of exercises to include
+        seed: Random seed, so the same arguments always give the same text
+
+    Returns:
+        Scenario greeting followed by the exercises
+    """
+    rng = random.Random(seed)
+    marker = FORMATS[fmt]
+    parts = [
+        f"Hi {FORM_DATA['full_name']}! Welcome to your writing adventure. "
+        "Today we'll practice writing about the things you love."
+    ]
+    for n in range(1, exercises + 1):
+        interest = rng.choice(_INTERESTS)
+        parts.append("\n".join([
+            marker.format(n=n, title=rng.choice(_TITLES)),
+            f"**Focus:** {rng.choice(_FOCUS)}",
+            f"Write a short piece about {interest} that grabs the reader's attention. " * rng.randint(1, 3),
+            f"**Your Prompt:** Describe your favourite {interest} moment in three sentences.",
+            "**What to include:**",
+            "- A question that makes the reader curious",
+            "- One vivid detail",
+            "- A surprising ending",
+        ]))
+    return "\n\n".join(parts)
+
+
+def scenario_payloads() -> Dict[str, Dict[str, Any]]:
+    """Flow 1 run responses by name: typical (5 exercises) and large (50) in each format"""
+    payloads = {}
+    for fmt in FORMATS:
+        payloads[f"{fmt}_5"] = run_envelope(synthetic_scenario_text(fmt, 5))
+        payloads[f"{fmt}_50"] = run_envelope(synthetic_scenario_text(fmt, 50))
+    return payloads
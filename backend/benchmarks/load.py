@@ -0,0 +1,247 @@
+"""
+Load driver - replays onboarding sessions against a running backend
+
+Each virtual user loops through a realistic session: POST /scenario,
+POST /exercise/start for the first exercise, then a few /exercise/chat
+turns taken from the recorded conversation. Reports throughput and
+per-route latency percentiles.
+
+Typical setup (three terminals, from the backend directory):
+    python -m benchmarks.stub_langflow --chat-latency lognormal:1200,0.5 --scenario-latency lognormal:4000,0.4
+    FLOW_1_ID=flow-1 FLOW_3_ID=flow-3 LANGFLOW_BASE_URL=http://localhost:7860 uvicorn app.main:app --port 8000
+    python -m benchmarks.load --concurrency 50 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks import fixtures
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _user_messages() -> List[str]:
+    """Student turns from the recorded conversation"""
+    history = fixtures.load_chat_history()
+    return [turn["content"] for turn in history["chat_history"] if turn["role"] == "user"]
+
+
+class LoadStats:
+    """Latency samples and error counts per route"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_event: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.sessions = 0
+
+    def record(self, route: str, seconds: float):
+        self.latencies[route].append(seconds * 1000)
+
+    def record_error(self, route: str, reason: str):
+        self.errors[route][reason] += 1
+
+    def report(self, elapsed: float) -> Dict:
+        """Summary as a JSON-serializable dict"""
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            samples = self.latencies.get(route, [])
+            summary = {"requests": len(samples), "errors": dict(self.errors.get(route, {}))}
+            if samples:
+                summary.update({
+                    "rps": len(samples) / elapsed,
+                    "mean_ms": statistics.fmean(samples),
+                    "p50_ms": _percentile(samples, 50),
+                    "p95_ms": _percentile(samples, 95),
+                    "p99_ms": _percentile(samples, 99),
+                    "max_ms": max(samples),
+                })
+            if self.first_event.get(route):
+                summary["first_event_p50_ms"] = _percentile(self.first_event[route], 50)
+                summary["first_event_p99_ms"] = _percentile(self.first_event[route], 99)
+            routes[route] = summary
+
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "elapsed_s": elapsed,
+            "sessions": self.sessions,
+            "sessions_per_s": self.sessions / elapsed,
+            "requests": total,
+            "requests_per_s": total / elapsed,
+            "errors": sum(sum(reasons.values()) for reasons in self.errors.values()),
+            "routes": routes,
+        }
+
+
+class LoadDriver:
+    """Runs virtual users against the backend"""
+
+    def __init__(self, client: httpx.AsyncClient, chats: int, stream: bool):
+        self.client = client
+        self.chats = chats
+        self.stream = stream
+        self.stats = LoadStats()
+        self.messages = _user_messages()
+
+    async def _post(self, route: str, body: Dict) -> Optional[Dict]:
+        """POST a JSON route and record its latency; None on failure"""
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(route, json=body)
+        except httpx.HTTPError as e:
+            self.stats.record_error(route, type(e).__name__)
+            return None
+        self.stats.record(route, time.perf_counter() - start)
+        if response.status_code != 200:
+            self.stats.record_error(route, str(response.status_code))
+            return None
+        return response.json()
+
+    async def _post_stream(self, route: str, body: Dict) -> Optional[Dict[str, List[Dict]]]:
+        """POST an SSE route; returns the parsed events by type, or None on failure"""
+        events = defaultdict(list)
+        start = time.perf_counter()
+        try:
+            async with self.client.stream("POST", route, json=body) as response:
+                if response.status_code != 200:
+                    self.stats.record_error(route, str(response.status_code))
+                    return None
+                event_type = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        if not events:
+                            self.stats.first_event[route].append((time.perf_counter() - start) * 1000)
+                        event_type = line[len("event: "):]
+                    elif line.startswith("data: ") and event_type:
+                        events[event_type].append(json.loads(line[len("data: "):]))
+        except httpx.HTTPError as e:
+            self.stats.record_error(route, type(e).__name__)
+            return None
+        self.stats.record(route, time.perf_counter() - start)
+        if events.get("error"):
+            self.stats.record_error(route, "stream error")
+            return None
+        return events
+
+    async def _session(self):
+        """One onboarding -> start -> chat session"""
+        form = dict(fixtures.FORM_DATA, full_name=f"Load Student {self.stats.sessions}")
+        stream = "/stream" if self.stream else ""
+
+        if self.stream:
+            events = await self._post_stream("/api/onboarding/scenario/stream", form)
+            if events is None:
+                return
+            session_id = events["session"][0]["session_id"]
+            exercises = events.get("exercise", [])
+        else:
+            result = await self._post("/api/onboarding/scenario", form)
+            if result is None:
+                return
+            session_id = result["session_id"]
+            exercises = result.get("exercises") or []
+
+        title = exercises[0]["title"] if exercises else "Story Hook"
+        start_body = {"session_id": session_id, "exercise_title": title}
+        if self.stream:
+            started = await self._post_stream(f"/api/onboarding/exercise/start{stream}", start_body)
+        else:
+            started = await self._post("/api/onboarding/exercise/start", start_body)
+        if started is None:
+            return
+
+        for turn in range(self.chats):
+            chat_body = {"session_id": session_id, "message": self.messages[turn % len(self.messages)]}
+            if self.stream:
+                reply = await self._post_stream(f"/api/onboarding/exercise/chat{stream}", chat_body)
+            else:
+                reply = await self._post("/api/onboarding/exercise/chat", chat_body)
+            if reply is None:
+                return
+        self.stats.sessions += 1
+
+    async def _user(self, deadline: float, sessions_left: List[int]):
+        while time.perf_counter() < deadline and sessions_left[0] > 0:
+            sessions_left[0] -= 1
+            await self._session()
+
+    async def run(self, concurrency: int, duration: float, sessions: Optional[int]) -> Dict:
+        """
+        Run virtual users until the duration is over or the sessions are used up
+
+        Args:
+            concurrency: Number of virtual users
+            duration: Maximum run time in seconds
+            sessions: Maximum number of sessions to start (None: no limit)
+
+        Returns:
+            LoadStats report
+        """
+        sessions_left = [sessions if sessions is not None else sys.maxsize]
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(self._user(deadline, sessions_left) for _ in range(concurrency)))
+        return self.stats.report(time.perf_counter() - start)
+
+
+def _print_report(report: Dict):
+    print(
+        f"{report['sessions']} sessions in {report['elapsed_s']:.1f}s "
+        f"({report['sessions_per_s']:.2f}/s), {report['requests']} requests "
+        f"({report['requests_per_s']:.1f}/s), {report['errors']} errors\n"
+    )
+    print(f"{'route':42} {'req':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for route, summary in report["routes"].items():
+        errors = sum(summary["errors"].values())
+        if summary["requests"]:
+            print(
+                f"{route:42} {summary['requests']:6} {errors:5} {summary['p50_ms']:9.1f} "
+                f"{summary['p95_ms']:9.1f} {summary['p99_ms']:9.1f} {summary['max_ms']:9.1f}"
+            )
+        else:
+            print(f"{route:42} {0:6} {errors:5}")
+        if "first_event_p50_ms" in summary:
+            print(f"{'  first event':42} {'':6} {'':5} {summary['first_event_p50_ms']:9.1f} {'':9} {summary['first_event_p99_ms']:9.1f}")
+
+
+async def _main(args) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        driver = LoadDriver(client, chats=args.chats, stream=args.stream)
+        return await driver.run(args.concurrency, args.duration, args.sessions)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000", help="backend URL")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="maximum run time in seconds")
+    parser.add_argument("--sessions", type=int, help="stop after this many sessions")
+    parser.add_argument("--chats", type=int, default=3, help="chat turns per session")
+    parser.add_argument("--stream", action="store_true", help="use the /stream (SSE) routes")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", type=Path, help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_main(args))
+    _print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+"""
+Benchmark runner - parser throughput, route latency, chat history, curriculum
+search, progress aggregation and session memory
+
+Usage (from the backend directory):
+    python -m benchmarks.run                      # full run, results in benchmarks/results/
+    python -m benchmarks.run --quick              # fewer iterations
+    python -m benchmarks.run --compare benchmarks/results/<commit>.json
+
+Everything runs offline: routes call a stub LangFlow app in-process through
+httpx.ASGITransport, so the numbers measure this backend only. Results are
+written as JSON tagged with the git commit; --compare reports every
+lower-is-better metric that got slower than the baseline by more than
+--threshold and exits non-zero if there are any.
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+# Flow ids for the stub - set before the service reads them
+os.environ.setdefault("FLOW_1_ID", "benchmark-flow-1")
+os.environ.setdefault("FLOW_3_ID", "benchmark-flow-3")
+os.environ.setdefault("LANGFLOW_BASE_URL", "http://langflow.benchmark")
+os.environ["SCENARIO_CACHE_ENABLED"] = "false"
+
+import httpx
+
+from app.main import app
+from app.models.chat_history import InMemoryChatHistory, SQLiteChatHistory
+from app.models.progress import ProgressTracker
+from app.models.session import create_session, set_session_store, update_session
+from app.models.session_store import InMemorySessionStore
+from app.utils.exercise_parser import IncrementalExerciseParser, parse_scenario_and_exercises
+from app.utils.langflow_response import extract_text, trim_envelope
+from benchmarks import fixtures
+from benchmarks.stub_langflow import create_app as create_stub_app
+from services import curriculum, fastjson
+from services.langflow_service import LangFlowService
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Metrics where a bigger number is a regression
+LOWER_IS_BETTER = ("us_per_call", "p50_ms", "p99_ms", "mean_ms", "bytes_per_session")
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Mute logging below WARNING while measuring, so LOG_LEVEL=DEBUG doesn't skew timings"""
+    previous = logging.root.manager.disable
+    logging.disable(logging.INFO)
+    try:
+        yield
+    finally:
+        logging.disable(previous)
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _time_calls(func: Callable[[], Any], min_seconds: float) -> Dict[str, float]:
+    """Call func repeatedly for at least min_seconds; best-of-5 batches"""
+    func()  # Warm up
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds / 5:
+            break
+        calls *= 2
+
+    best = elapsed
+    for _ in range(4):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return {"calls": calls, "us_per_call": best / calls * 1e6}
+
+
+def bench_parser(min_seconds: float) -> Dict[str, Dict[str, float]]:
+    """Parse throughput for each synthetic payload, batch and incremental"""
+    results = {}
+    with _quiet():
+        for name, payload in fixtures.scenario_payloads().items():
+            text = payload["outputs"][0]["outputs"][0]["results"]["message"]["text"]
+            size = len(text.encode("utf-8"))
+
+            timing = _time_calls(lambda: parse_scenario_and_exercises(payload), min_seconds)
+            timing["mb_per_s"] = size / timing["us_per_call"]
+            timing["bytes"] = size
+            results[f"parse.batch.{name}"] = timing
+
+            chunks = [text[i:i + 20] for i in range(0, len(text), 20)]
+
+            def incremental():
+                parser = IncrementalExerciseParser()
+                for chunk in chunks:
+                    parser.feed(chunk)
+                parser.close()
+
+            timing = _time_calls(incremental, min_seconds)
+            timing["mb_per_s"] = size / timing["us_per_call"]
+            timing["bytes"] = size
+            results[f"parse.incremental.{name}"] = timing
+
+    replies = [fixtures.run_envelope(reply) for reply in fixtures.chat_replies()]
+
+    def extract_all():
+        for reply in replies:
+            extract_text(reply, "exercise_generation")
+
+    timing = _time_calls(extract_all, min_seconds)
+    timing["us_per_call"] /= len(replies)
+    results["extract.chat_reply"] = timing
+
+    # /exercise/chat response body for each CHAT_RAW_RESPONSE mode
+    envelopes = [fixtures.full_run_envelope(reply) for reply in fixtures.chat_replies()]
+    raw_responses = {
+        "full": lambda envelope: {"raw_response": envelope},
+        "trim": lambda envelope: {"raw_response": trim_envelope(envelope)},
+        "none": lambda envelope: {},
+    }
+    for mode, raw_response in raw_responses.items():
+        bodies = [
+            {"success": True, "session_id": "benchmark", "message": extract_text(envelope, "exercise_generation"), **raw_response(envelope)}
+            for envelope in envelopes
+        ]
+
+        def encode_all():
+            for body in bodies:
+                fastjson.dumps(body)
+
+        timing = _time_calls(encode_all, min_seconds)
+        timing["us_per_call"] /= len(bodies)
+        timing["bytes"] = sum(len(fastjson.dumps(body)) for body in bodies) / len(bodies)
+        results[f"encode.chat_response.{mode}"] = timing
+    return results
+
+
+async def _measure(request: Callable[[], Awaitable[httpx.Response]], iterations: int) -> Dict[str, float]:
+    """Latency distribution of a request, in milliseconds"""
+    await request()  # Warm up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = await request()
+        samples.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": _percentile(samples, 50),
+        "p99_ms": _percentile(samples, 99),
+    }
+
+
+async def _bench_routes(iterations: int) -> Dict[str, Dict[str, float]]:
+    stub = create_stub_app(scenario_flow_ids=[os.environ["FLOW_1_ID"]])
+    service = LangFlowService(transport=httpx.ASGITransport(app=stub))
+    app.state.langflow_service = service
+    app.state.langflow_error = None
+
+    form = fixtures.FORM_DATA
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://backend") as client:
+        response = await client.post("/api/onboarding/scenario", json=form)
+        session_id = response.json()["session_id"]
+        start_body = {"session_id": session_id, "exercise_title": "Story Hook"}
+        chat_body = {"session_id": session_id, "message": "However, I am not very good at it."}
+
+        routes = {
+            "POST /scenario": lambda: client.post("/api/onboarding/scenario", json=form),
+            "POST /scenario/stream": lambda: client.post("/api/onboarding/scenario/stream", json=form),
+            "GET /session/{id}": lambda: client.get(f"/api/onboarding/session/{session_id}"),
+            "POST /exercise/start": lambda: client.post("/api/onboarding/exercise/start", json=start_body),
+            "POST /exercise/start/stream": lambda: client.post("/api/onboarding/exercise/start/stream", json=start_body),
+            "POST /exercise/chat": lambda: client.post("/api/onboarding/exercise/chat", json=chat_body),
+            "POST /exercise/chat/stream": lambda: client.post("/api/onboarding/exercise/chat/stream", json=chat_body),
+        }
+        for name, request in routes.items():
+            results[f"route.{name}"] = await _measure(request, iterations)
+
+    await service.aclose()
+    return results
+
+
+def bench_routes(iterations: int) -> Dict[str, Dict[str, float]]:
+    """p50/p99 latency of each /api/onboarding route against the stub"""
+    set_session_store(InMemorySessionStore(max_entries=iterations * 10 + 100))
+    with _quiet():
+        return asyncio.run(_bench_routes(iterations))
+
+
+def bench_chat_history(min_seconds: float, turns: int = 2000) -> Dict[str, Dict[str, float]]:
+    """Window reads from a long chat log - cost should track the window, not the log"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": InMemoryChatHistory(max_turns=turns),
+            "sqlite": SQLiteChatHistory(os.path.join(tmp, "chat.db"), max_turns=turns),
+        }
+        for name, history in backends.items():
+            for i in range(0, turns, 2):
+                history.append("bench", [("user", f"Message {i}"), ("assistant", f"Reply {i}")], exercise="Story Hook")
+            results[f"chat_history.{name}.last_20"] = _time_calls(lambda: history.last("bench", 20), min_seconds)
+            results[f"chat_history.{name}.since_mid_20"] = _time_calls(
+                lambda: history.since("bench", turns // 2, 20), min_seconds
+            )
+    return results
+
+
+def bench_curriculum(min_seconds: float) -> Dict[str, Dict[str, float]]:
+    """Curriculum retrieval for an exercise start, uncached, and index startup"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = Path(tmp)
+        corpus = curriculum.DEFAULT_CORPUS_PATH
+        chunks = curriculum.parse_chunks(corpus.read_text())
+        results["curriculum.build"] = _time_calls(lambda: curriculum.CurriculumIndex.build(chunks), min_seconds)
+        curriculum.load_or_build(corpus, index_dir)
+        results["curriculum.load"] = _time_calls(lambda: curriculum.load_or_build(corpus, index_dir), min_seconds)
+        index = curriculum.load_or_build(corpus, index_dir)
+        results["curriculum.search"] = _time_calls(
+            lambda: index.search("Transition Bridge Transitions football", k=3), min_seconds
+        )
+    return results
+
+
+def bench_progress(min_seconds: float, results_per_learner: int = 1000) -> Dict[str, Dict[str, float]]:
+    """Recording a feedback result and reading progress for a learner with a long history"""
+    tracker = ProgressTracker()
+    mistakes = [f"mistake {i}" for i in range(40)]
+    start = time.time() - results_per_learner * 3600
+    for i in range(results_per_learner):
+        tracker.record("bench", {"score": 50 + i % 40, "mistakes": mistakes[i % 37:i % 37 + 3]}, now=start + i * 3600)
+
+    clock = [time.time()]
+
+    def record():
+        clock[0] += 60
+        tracker.record("bench", {"score": 75, "mistakes": mistakes[:2]}, now=clock[0])
+
+    return {
+        "progress.record": _time_calls(record, min_seconds),
+        "progress.summary": _time_calls(lambda: tracker.summary("bench", now=clock[0]), min_seconds),
+        "progress.top_mistakes": _time_calls(lambda: tracker.top_mistakes("bench", now=clock[0]), min_seconds),
+    }
+
+
+def bench_session_memory(sessions: int) -> Dict[str, Dict[str, float]]:
+    """Memory held per stored session with a typical scenario and exercises"""
+    with _quiet():
+        scenario, exercises = parse_scenario_and_exercises(fixtures.scenario_payloads()["heading_5"])
+
+    store = InMemorySessionStore(max_entries=sessions)
+    set_session_store(store)
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(sessions):
+        session = create_session()
+        # Copies, so each session owns its data like a real request would
+        update_session(
+            session.session_id,
+            form_data=dict(fixtures.FORM_DATA, full_name=f"Student {i}"),
+            scenario=scenario.replace(fixtures.FORM_DATA["full_name"], f"Student {i}"),
+            exercises=[dict(exercise) for exercise in exercises],
+        )
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    json_size = len(store.get(session.session_id).to_json())
+    return {
+        "session.memory": {
+            "sessions": sessions,
+            "bytes_per_session": (after - before) / sessions,
+            "json_bytes": json_size,
+        }
+    }
+
+
+def _git_commit() -> Dict[str, Any]:
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain"))}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Find metrics that regressed against a baseline run
+
+    Args:
+        results: Current results file contents
+        baseline: Baseline results file contents
+        threshold: Allowed relative slowdown (0.15 = 15%)
+
+    Returns:
+        One line per regressed metric
+    """
+    regressions = []
+    for name, metrics in results["results"].items():
+        base_metrics = baseline["results"].get(name, {})
+        for metric in LOWER_IS_BETTER:
+            if metric not in metrics or not base_metrics.get(metric):
+                continue
+            change = metrics[metric] / base_metrics[metric] - 1
+            if change > threshold:
+                regressions.append(
+                    f"{name} {metric}: {base_metrics[metric]:.2f} -> {metrics[metric]:.2f} (+{change:.0%})"
+                )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a fast sanity check")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before flagging (default: 0.15)")
+    args = parser.parse_args(argv)
+
+    min_seconds = 0.2 if args.quick else 1.0
+    iterations = 30 if args.quick else 300
+    sessions = 500 if args.quick else 5000
+
+    results = {}
+    results.update(bench_parser(min_seconds))
+    results.update(bench_routes(iterations))
+    results.update(bench_chat_history(min_seconds))
+    results.update(bench_curriculum(min_seconds))
+    results.update(bench_progress(min_seconds))
+    results.update(bench_session_memory(sessions))
+
+    git = _git_commit()
+    report = {
+        "commit": git["commit"],
+        "dirty": git["dirty"],
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }
+
+    for name, metrics in results.items():
+        summary = ", ".join(
+            f"{metric}={value:.2f}" if isinstance(value, float) else f"{metric}={value}"
+            for metric, value in metrics.items()
+        )
+        print(f"{name:45} {summary}")
+
+    output = args.output or RESULTS_DIR / f"{git['commit']}{'-dirty' if git['dirty'] else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(report, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit')}):")
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+        if not regressions:
+            print("  no regressions")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Stub LangFlow server for benchmarks and load tests
+
+Serves POST /api/v1/run/{flow_id} with the same response envelope as
+LangFlow (outputs[0].outputs[0].results.message.text), including
+stream=true token events. Flow 1 ids return a synthetic scenario; every
+other flow cycles through the recorded coach replies.
+
+Latency and failures are configurable so the backend can be load-tested
+without a live LangFlow:
+    python -m benchmarks.stub_langflow --port 7860 \\
+        --scenario-latency lognormal:4000,0.4 --chat-latency lognormal:1200,0.5 \\
+        --error-rate 0.01 --token-delay 15
+then start the backend with LANGFLOW_BASE_URL=http://localhost:7860.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.fixtures import chat_replies, run_envelope, synthetic_scenario_text
+
+STREAM_CHUNK_SIZE = 20
+
+# Draws a delay in seconds
+Latency = Callable[[random.Random], float]
+
+
+def parse_latency(spec: str) -> Latency:
+    """
+    Parse a latency distribution spec (all values in milliseconds)
+
+    Supported specs:
+        fixed:MS
+        uniform:MIN,MAX
+        normal:MEAN,STDDEV          (clipped at 0)
+        lognormal:MEDIAN,SIGMA      (long right tail, like LLM calls)
+        exponential:MEAN
+
+    Args:
+        spec: Distribution spec, e.g. "lognormal:1200,0.5"
+
+    Returns:
+        Function drawing a delay in seconds from a random.Random
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    name, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"Invalid latency spec '{spec}'")
+
+    distributions = {
+        "fixed": (1, lambda rng, ms: ms),
+        "uniform": (2, lambda rng, low, high: rng.uniform(low, high)),
+        "normal": (2, lambda rng, mean, stddev: max(0.0, rng.gauss(mean, stddev))),
+        "lognormal": (2, lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma)),
+        "exponential": (1, lambda rng, mean: rng.expovariate(1 / mean)),
+    }
+    if name not in distributions or len(values) != distributions[name][0]:
+        raise ValueError(
+            f"Invalid latency spec '{spec}'. Use fixed:MS, uniform:MIN,MAX, normal:MEAN,STDDEV, "
+            f"lognormal:MEDIAN,SIGMA or exponential:MEAN"
+        )
+    draw = distributions[name][1]
+    return lambda rng: draw(rng, *values) / 1000
+
+
+def _no_latency(rng: random.Random) -> float:
+    return 0.0
+
+
+async def _stream_events(
+    text: str,
+    session_id: str,
+    token_delay: float,
+    streaming: bool
+) -> AsyncIterator[str]:
+    """LangFlow stream=true output: token events, then the end event"""
+    if streaming:
+        for i in range(0, len(text), STREAM_CHUNK_SIZE):
+            if token_delay:
+                await asyncio.sleep(token_delay)
+            yield json.dumps({"event": "token", "data": {"chunk": text[i:i + STREAM_CHUNK_SIZE], "id": "stub"}}) + "\n\n"
+    yield json.dumps({"event": "end", "data": {"result": run_envelope(text, session_id)}}) + "\n\n"
+
+
+def create_app(
+    scenario_text: Optional[str] = None,
+    replies: Optional[List[str]] = None,
+    scenario_flow_ids: Optional[Iterable[str]] = None,
+    scenario_latency: Latency = _no_latency,
+    chat_latency: Latency = _no_latency,
+    error_rate: float = 0.0,
+    token_delay: float = 0.0,
+    streaming: bool = True,
+    seed: Optional[int] = None
+) -> FastAPI:
+    """
+    Build the stub LangFlow app
+
+    Args:
+        scenario_text: Flow 1 response text (default: 5 heading-format exercises)
+        replies: Flow 3 replies to cycle through (default: the recorded conversation)
+        scenario_flow_ids: Flow ids answered with the scenario (default: FLOW_1_ID)
+        scenario_latency: Delay before Flow 1 responds (see parse_latency)
+        chat_latency: Delay before any other flow responds
+        error_rate: Fraction of runs that fail with a 500
+        token_delay: Seconds between streamed token events
+        streaming: Send token events for stream=true (False: only the end event,
+            like a flow whose model has streaming turned off)
+        seed: Random seed for reproducible latencies and errors
+
+    Returns:
+        ASGI app - serve it with uvicorn or pass it to httpx.ASGITransport
+    """
+    scenario_text = scenario_text or synthetic_scenario_text("heading", 5)
+    reply_cycle = itertools.cycle(replies or chat_replies())
+    scenario_flow_ids = set(scenario_flow_ids or [os.getenv("FLOW_1_ID", "flow-1")])
+    rng = random.Random(seed)
+
+    app = FastAPI(title="Stub LangFlow")
+    app.state.runs = 0
+    app.state.errors = 0
+
+    @app.post("/api/v1/run/{flow_id}")
+    async def run(flow_id: str, request: Request):
+        body = await request.json()
+        session_id = body.get("session_id") or "stub-session"
+        is_scenario = flow_id in scenario_flow_ids
+        app.state.runs += 1
+
+        delay = (scenario_latency if is_scenario else chat_latency)(rng)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if error_rate and rng.random() < error_rate:
+            app.state.errors += 1
+            return JSONResponse(status_code=500, content={"detail": "Stub LangFlow: injected error"})
+
+        text = scenario_text if is_scenario else next(reply_cycle)
+        if request.query_params.get("stream") == "true":
+            return StreamingResponse(
+                _stream_events(text, session_id, token_delay, streaming),
+                media_type="application/x-ndjson"
+            )
+        return run_envelope(text, session_id)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    async def stats():
+        """Runs served and errors injected since startup"""
+        return {"runs": app.state.runs, "errors": app.state.errors}
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stub LangFlow server",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--scenario-latency", type=parse_latency, default=_no_latency,
+                        help="Flow 1 delay distribution, e.g. lognormal:4000,0.4 (default: none)")
+    parser.add_argument("--chat-latency", type=parse_latency, default=_no_latency,
+                        help="delay distribution for other flows, e.g. lognormal:1200,0.5 (default: none)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of runs answered with a 500")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="milliseconds between streamed tokens")
+    parser.add_argument("--no-stream", action="store_true", help="send only the end event for stream=true")
+    parser.add_argument("--scenario-flow-id", action="append",
+                        help="flow id answered with the scenario (repeatable, default: FLOW_1_ID)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    app = create_app(
+        scenario_flow_ids=args.scenario_flow_id,
+        scenario_latency=args.scenario_latency,
+        chat_latency=args.chat_latency,
+        error_rate=args.error_rate,
+        token_delay=args.token_delay / 1000,
+        streaming=not args.no_stream,
+        seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
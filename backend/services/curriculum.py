@@ -0,0 +1,502 @@
+"""
+Curriculum retrieval - in-process search over the writing practice guide
+
+Flow 3 can be given curriculum snippets (exercise templates, techniques,
+writing principles) relevant to the exercise being started. Retrieval runs
+in this process with no external services:
+
+- The guide (docs/writing-communication-practice-guide.md) is split into
+  one chunk per section.
+- Each chunk gets a hashing-trick embedding: TF-IDF weighted unigrams and
+  bigrams hashed into a fixed number of dimensions, L2-normalized. Vector
+  search is brute force, or IVF (k-means lists, probing the nearest few)
+  once the corpus is large enough for it to pay off and numpy is installed.
+- A BM25 index over the same chunks catches exact terms.
+- The two rankings are merged with reciprocal rank fusion.
+
+The index is written to disk (vectors as raw float32, the rest as JSON)
+and memory-mapped at startup; it is only rebuilt when the guide changes.
+numpy is optional - without it vectors are read straight from the mmap.
+"""
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import threading
+import zlib
+from array import array
+from collections import Counter as TermCounter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from services.metrics import Histogram
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+CURRICULUM_SEARCH_SECONDS = Histogram(
+    "curriculum_search_duration_seconds",
+    "Time spent retrieving curriculum snippets (cache misses only)"
+)
+
+INDEX_VERSION = 1
+DEFAULT_DIM = 1024
+TITLE_WEIGHT = 3
+IVF_MIN_CHUNKS = 4096   # Below this, brute force is faster than probing lists
+IVF_NPROBE = 4
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60              # Reciprocal rank fusion constant
+
+_BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CORPUS_PATH = _BACKEND_DIR.parent / "docs" / "writing-communication-practice-guide.md"
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in into is it its "
+    "me my of on or our so that the their them then there these they this to too was we "
+    "what when which who why will with you your".split()
+)
+_HEADING = re.compile(r"^(#{1,3}) +(.+?)\s*$")
+_FIELD = re.compile(r"^\*\*(Skill|Ages):\*\*\s*(.+?)\s*$")
+_BLANK_LINE = re.compile(r"^[\s\d.()]*_{5,}.*$")  # Fill-in lines: "1. _______"
+
+
+def _stem(token: str) -> str:
+    """Fold plurals ("transitions" -> "transition", "stories" -> "story")"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, plural-folded word tokens without stopwords"""
+    return [_stem(token) for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def _features(tokens: Sequence[str]) -> List[str]:
+    """Unigrams and bigrams"""
+    return list(tokens) + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class Chunk(NamedTuple):
+    """One section of the curriculum"""
+    title: str
+    kind: str                   # "exercise", "assessment", "principle" or "guide"
+    skill: str                  # The section's **Skill:** line, if any
+    ages: Tuple[str, ...]       # Age groups from an **Ages:** line (empty = all)
+    text: str
+
+
+def _kind(part: str) -> str:
+    part = part.lower()
+    if "exercise" in part:
+        return "exercise"
+    if "assessment" in part:
+        return "assessment"
+    if "principle" in part:
+        return "principle"
+    return "guide"
+
+
+def parse_chunks(markdown: str) -> List[Chunk]:
+    """
+    Split the guide into one chunk per ## or ### section
+
+    Top-level # headings ("PART 1: PRACTICE EXERCISES", "Key Principles ...")
+    set the kind of the sections under them. Fill-in lines and rules are
+    dropped; sections with no text of their own are skipped.
+    """
+    chunks = []
+    part, title, lines = "", None, []
+
+    def flush():
+        text = "\n".join(line for line in lines if line.strip()).strip()
+        if title and len(text) >= 40:
+            skill, ages = "", ()
+            for line in lines:
+                field = _FIELD.match(line)
+                if field and field.group(1) == "Skill":
+                    skill = field.group(2)
+                elif field:
+                    ages = tuple(age.strip() for age in field.group(2).split(","))
+            chunks.append(Chunk(title, _kind(part or title), skill, ages, text))
+
+    for line in markdown.splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            flush()
+            lines = []
+            if len(heading.group(1)) == 1:
+                part, title = heading.group(2), None
+            else:
+                title = heading.group(2)
+            continue
+        if line.strip() == "---" or _BLANK_LINE.match(line):
+            continue
+        lines.append(line)
+    flush()
+    return chunks
+
+
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    """Hashed dimension and sign of a feature (crc32 - stable across processes)"""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, (1.0 if h & 0x80000000 else -1.0)
+
+
+class CurriculumIndex:
+    """Hybrid vector + BM25 index over curriculum chunks"""
+
+    def __init__(
+        self,
+        chunks: List[Chunk],
+        dim: int,
+        df: Dict[str, int],
+        postings: Dict[str, List[List[int]]],
+        doc_lengths: List[int],
+        vectors,
+        ivf: Optional[Dict] = None,
+        centroids=None,
+        max_cached: int = 1024
+    ):
+        """
+        Use build() or load() rather than calling this directly
+
+        Args:
+            vectors: n x dim float32 matrix - a numpy array/memmap, or a flat
+                memoryview over the mmap without numpy
+            ivf: {"lists": [[start, end], ...]} with vectors grouped by list,
+                or None for brute force
+            centroids: IVF list centroids (numpy array)
+        """
+        self.chunks = chunks
+        self.dim = dim
+        self.df = df
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        self.vectors = vectors
+        self.ivf = ivf
+        self.centroids = centroids
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[tuple, List[Chunk]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Building and loading -------------------------------------------------
+
+    @staticmethod
+    def _idf(df: int, n: int) -> float:
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _embed(self, tokens: Sequence[str]) -> Dict[int, float]:
+        """Sparse hashed TF-IDF embedding, L2-normalized"""
+        n = len(self.chunks)
+        vector: Dict[int, float] = {}
+        for feature, count in TermCounter(_features(tokens)).items():
+            df = self.df.get(feature)
+            if not df:
+                continue  # Not in the corpus - it would only add hash collisions
+            index, sign = _bucket(feature, self.dim)
+            weight = (1 + math.log(count)) * self._idf(df, n)
+            vector[index] = vector.get(index, 0.0) + sign * weight
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if norm:
+            for index in vector:
+                vector[index] /= norm
+        return vector
+
+    @classmethod
+    def build(cls, chunks: List[Chunk], dim: int = DEFAULT_DIM, ivf_min_chunks: int = IVF_MIN_CHUNKS) -> "CurriculumIndex":
+        """Build an in-memory index (vectors as an array, or numpy if installed)"""
+        # A section's title and skill say what it teaches - weight them like repeated text
+        tokens = [
+            tokenize(f"{chunk.title} {chunk.skill} " * TITLE_WEIGHT) + tokenize(chunk.text)
+            for chunk in chunks
+        ]
+        df: Dict[str, int] = {}
+        postings: Dict[str, List[List[int]]] = {}
+        for doc, doc_tokens in enumerate(tokens):
+            for feature in set(_features(doc_tokens)):
+                df[feature] = df.get(feature, 0) + 1
+            for term, count in TermCounter(doc_tokens).items():
+                postings.setdefault(term, []).append([doc, count])
+
+        index = cls(chunks, dim, df, postings, [len(t) for t in tokens], vectors=None)
+        flat = array("f", bytes(4 * dim * len(chunks)))
+        for doc, doc_tokens in enumerate(tokens):
+            for dimension, value in index._embed(doc_tokens).items():
+                flat[doc * dim + dimension] = value
+
+        if np is None:
+            index.vectors = memoryview(flat)
+            return index
+
+        index.vectors = np.frombuffer(flat, dtype=np.float32).reshape(len(chunks), dim)
+        if len(chunks) >= ivf_min_chunks:
+            index._build_ivf()
+        return index
+
+    def _build_ivf(self, iterations: int = 10):
+        """Group vectors into sqrt(n) k-means lists, stored contiguously"""
+        vectors = self.vectors
+        n_lists = max(1, int(math.sqrt(len(vectors))))
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for list_id in range(n_lists):
+                members = vectors[assignment == list_id]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[list_id] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self.chunks = [self.chunks[i] for i in order]
+        self.doc_lengths = [self.doc_lengths[i] for i in order]
+        position = {int(old): new for new, old in enumerate(order)}
+        self.postings = {
+            term: sorted([position[doc], count] for doc, count in entries)
+            for term, entries in self.postings.items()
+        }
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.centroids = centroids.astype(np.float32)
+        self.ivf = {"lists": [[int(bounds[i]), int(bounds[i + 1])] for i in range(n_lists)]}
+
+    def save(self, index_dir: Path, corpus_sha256: str):
+        """Write the index files; meta.json goes last, so a partial write is never loaded"""
+        index_dir.mkdir(parents=True, exist_ok=True)
+
+        def write(name: str, data: bytes):
+            tmp = index_dir / f".{name}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, index_dir / name)
+
+        write("vectors.f32", bytes(self.vectors) if np is None else np.asarray(self.vectors, dtype="<f4").tobytes())
+        if self.centroids is not None:
+            write("centroids.f32", np.asarray(self.centroids, dtype="<f4").tobytes())
+        meta = {
+            "version": INDEX_VERSION,
+            "corpus_sha256": corpus_sha256,
+            "dim": self.dim,
+            "count": len(self.chunks),
+            "chunks": [list(chunk) for chunk in self.chunks],
+            "df": self.df,
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+            "ivf": self.ivf,
+        }
+        write("meta.json", json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def load(cls, index_dir: Path, corpus_sha256: Optional[str] = None) -> Optional["CurriculumIndex"]:
+        """
+        Memory-map a saved index
+
+        Returns:
+            The index, or None if it is missing, from another version, or
+            built from a different corpus
+        """
+        try:
+            meta = json.loads((index_dir / "meta.json").read_bytes())
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != INDEX_VERSION:
+            return None
+        if corpus_sha256 is not None and meta.get("corpus_sha256") != corpus_sha256:
+            return None
+
+        count, dim = meta["count"], meta["dim"]
+        vectors_path = index_dir / "vectors.f32"
+        if not vectors_path.exists() or vectors_path.stat().st_size != 4 * count * dim:
+            return None
+        if np is not None:
+            vectors = np.memmap(vectors_path, dtype="<f4", mode="r", shape=(count, dim))
+        else:
+            with open(vectors_path, "rb") as f:
+                vectors = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast("f")
+
+        ivf, centroids = meta.get("ivf"), None
+        if ivf and np is not None:
+            n_lists = len(ivf["lists"])
+            centroids = np.memmap(index_dir / "centroids.f32", dtype="<f4", mode="r", shape=(n_lists, dim))
+        else:
+            ivf = None  # Lists are still contiguous, so brute force over all vectors works
+
+        return cls(
+            chunks=[Chunk(c[0], c[1], c[2], tuple(c[3]), c[4]) for c in meta["chunks"]],
+            dim=dim,
+            df=meta["df"],
+            postings=meta["postings"],
+            doc_lengths=meta["doc_lengths"],
+            vectors=vectors,
+            ivf=ivf,
+            centroids=centroids
+        )
+
+    # --- Search ---------------------------------------------------------------
+
+    def _vector_ranking(self, tokens: Sequence[str], limit: int) -> List[int]:
+        query = self._embed(tokens)
+        if not query:
+            return []
+        dims = list(query)
+        weights = [query[d] for d in dims]
+
+        if np is None:
+            flat, dim = self.vectors, self.dim
+            scores = [
+                sum(flat[base + d] * w for d, w in zip(dims, weights))
+                for base in range(0, len(self.chunks) * dim, dim)
+            ]
+            return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:limit]
+
+        q = np.asarray(weights, dtype=np.float32)
+        if self.ivf is None:
+            candidates = np.arange(len(self.chunks))
+        else:
+            dense = np.zeros(self.dim, dtype=np.float32)
+            dense[dims] = q
+            probe = np.argsort(self.centroids @ dense)[::-1][:IVF_NPROBE]
+            candidates = np.concatenate([np.arange(*self.ivf["lists"][i]) for i in probe])
+        scores = self.vectors[np.ix_(candidates, dims)] @ q
+        top = np.argsort(scores)[::-1][:limit]
+        return [int(candidates[i]) for i in top]
+
+    def _bm25_ranking(self, tokens: Sequence[str], limit: int) -> List[int]:
+        n = len(self.chunks)
+        scores: Dict[int, float] = {}
+        for term in set(tokens):
+            entries = self.postings.get(term)
+            if not entries:
+                continue
+            idf = self._idf(len(entries), n)
+            for doc, tf in entries:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / self.avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+
+    def search(self, query: str, k: int = 3, age_group: Optional[str] = None) -> List[Chunk]:
+        """
+        Top k chunks for a free-text query (vector and BM25 rankings fused)
+
+        Args:
+            query: Search text
+            k: Chunks to return
+            age_group: Skip chunks marked for other age groups
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        depth = max(4 * k, 20)
+        fused: Dict[int, float] = {}
+        for ranking in (self._vector_ranking(tokens, depth), self._bm25_ranking(tokens, depth)):
+            for rank, doc in enumerate(ranking):
+                fused[doc] = fused.get(doc, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        results = []
+        for doc in sorted(fused, key=fused.__getitem__, reverse=True):
+            chunk = self.chunks[doc]
+            if age_group and chunk.ages and age_group not in chunk.ages:
+                continue
+            results.append(chunk)
+            if len(results) == k:
+                break
+        return results
+
+    def for_student(self, age_group: Optional[str], focus: str, interests: str = "", k: int = 3) -> List[Chunk]:
+        """
+        Top k chunks for an exercise's focus area and the student's interests
+
+        Focus terms are weighted twice as heavily as interests. Results are
+        cached per (age_group, focus, interests, k).
+        """
+        key = (age_group, focus, interests, k)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        with CURRICULUM_SEARCH_SECONDS.time():
+            results = self.search(f"{focus} {focus} {interests}", k=k, age_group=age_group)
+        with self._lock:
+            self._cache[key] = results
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return results
+
+
+def format_snippets(chunks: Sequence[Chunk], max_chars: int = 1500) -> str:
+    """Chunks as Markdown sections, each cut to an equal share of max_chars"""
+    if not chunks:
+        return ""
+    share = max_chars // len(chunks)
+    sections = []
+    for chunk in chunks:
+        text = chunk.text if len(chunk.text) <= share else chunk.text[:share].rsplit(" ", 1)[0] + " ..."
+        sections.append(f"## {chunk.title}\n{text}")
+    return "\n\n".join(sections)
+
+
+def load_or_build(corpus_path: Path, index_dir: Path) -> CurriculumIndex:
+    """
+    Load the saved index for corpus_path, rebuilding and saving it if stale
+
+    Raises:
+        OSError: If the corpus can't be read
+    """
+    corpus = corpus_path.read_bytes()
+    sha256 = hashlib.sha256(corpus).hexdigest()
+    index = CurriculumIndex.load(index_dir, sha256)
+    if index is not None:
+        return index
+
+    index = CurriculumIndex.build(parse_chunks(corpus.decode("utf-8")))
+    try:
+        index.save(index_dir, sha256)
+        logger.info("Built curriculum index: %d chunks from %s", len(index.chunks), corpus_path)
+        # Serve from the mmap like every later startup
+        return CurriculumIndex.load(index_dir, sha256) or index
+    except OSError as e:
+        logger.warning("Could not save curriculum index to %s: %s", index_dir, e)
+        return index
+
+
+# Singleton instance (None until first use, or if the corpus is missing)
+_index: Optional[CurriculumIndex] = None
+_index_error: Optional[str] = None
+
+
+def get_curriculum_index() -> Optional[CurriculumIndex]:
+    """
+    Get the shared curriculum index, loading it on first use
+
+    Environment:
+        CURRICULUM_PATH: Guide to index (default: docs/writing-communication-practice-guide.md)
+        CURRICULUM_INDEX_DIR: Where the index files live (default: data/curriculum_index)
+
+    Returns:
+        The index, or None if the corpus can't be read (logged once)
+    """
+    global _index, _index_error
+    if _index is None and _index_error is None:
+        corpus_path = Path(os.getenv("CURRICULUM_PATH", DEFAULT_CORPUS_PATH))
+        index_dir = Path(os.getenv("CURRICULUM_INDEX_DIR", "data/curriculum_index"))
+        try:
+            _index = load_or_build(corpus_path, index_dir)
+        except OSError as e:
+            _index_error = str(e)
+            logger.warning("Curriculum retrieval disabled: %s", e)
+    return _index
@@ -0,0 +1,42 @@
+"""
+Fast JSON - orjson when it is installed, the standard library otherwise
+
+Used for LangFlow request and response bodies, stream events, cached
+session encodings and (through app.main) route responses. Both paths
+produce compact UTF-8 JSON, so switching between them changes speed, not
+output. Install orjson (pip install orjson) to turn the fast path on.
+
+Environment:
+    FAST_JSON: Use orjson when it is installed (default: true)
+"""
+import json
+import os
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENABLED = orjson is not None and os.getenv('FAST_JSON', 'true').lower() == 'true'
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON encoding of value"""
+    if ENABLED:
+        return orjson.dumps(value)
+    return _ENCODER.encode(value).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decode JSON text
+
+    Raises:
+        ValueError: If data isn't valid JSON (json.JSONDecodeError on both paths)
+    """
+    if ENABLED:
+        return orjson.loads(data)
+    return json.loads(data)
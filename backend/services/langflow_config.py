@@ -0,0 +1,253 @@
+"""
+LangFlow config - an immutable snapshot of connection and flow settings
+
+LangFlowService reads flow IDs, component IDs, timeouts, concurrency
+limits and pool sizes from a LangFlowConfig. Snapshots are never changed
+after creation: a reload (see app/services/config_loader.py) builds and
+validates a new one and swaps it in, so a request that started on the old
+snapshot finishes on it.
+
+Values come from the environment (FLOW_<n>_ID, LANGFLOW_TIMEOUT, ...),
+overridden by whatever the config file sets.
+"""
+import os
+from typing import Any, Dict, Optional
+
+from services.tweaks import COMPONENT_ENV_VARS, DEFAULT_COMPONENTS
+
+# Flow name -> number used in the FLOW_<n>_ID / FLOW_<n>_TIMEOUT env vars
+# and the flow_<n> sections of the config file
+FLOW_NUMBERS = {
+    'scenario_generation': 1,
+    'assessment_plan': 2,
+    'exercise_generation': 3,
+    'session_feedback': 4
+}
+
+DEFAULT_TIMEOUT = 30.0  # seconds
+DEFAULT_POOL_SIZE = 20
+
+# Config file location of each tweak component: role -> (flow section, key in "components")
+_COMPONENT_KEYS = {
+    "scenario_intake": ("flow_1", "intake"),
+    "exercise_intake": ("flow_3", "intake"),
+    "exercise_topic": ("flow_3", "topic"),
+    "exercise_curriculum": ("flow_3", "curriculum"),
+}
+
+
+class LangFlowConfig:
+    """Settings for LangFlowService - treat as read-only"""
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:7860",
+        api_key: Optional[str] = None,
+        flows: Optional[Dict[str, Optional[str]]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_concurrency: Optional[Dict[str, int]] = None,
+        max_queue: int = 50,
+        queue_timeout: float = 10.0,
+        components: Optional[Dict[str, str]] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pool_keepalive: Optional[int] = None,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        source: str = "defaults",
+        raw: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            base_url: LangFlow server URL
+            api_key: Sent as x-api-key when set
+            flows: Flow name -> flow ID (None if not configured)
+            timeouts: Flow name -> request timeout in seconds
+            max_concurrency: Flow name -> concurrent requests allowed (0 = unlimited)
+            max_queue: Requests allowed to wait for a concurrency slot, per flow
+            queue_timeout: Max seconds a request waits for a slot
+            components: Tweak component IDs by role (see services.tweaks)
+            pool_size: Max connections to LangFlow
+            pool_keepalive: Max idle keep-alive connections (default: pool_size)
+            keepalive_expiry: Seconds an idle connection is kept
+            http2: Use HTTP/2 when the 'h2' package is installed
+            source: Where the settings came from, for logs
+            raw: The config file contents, if any
+        """
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.flows = {name: None for name in FLOW_NUMBERS}
+        self.flows.update(flows or {})
+        self.timeouts = {name: DEFAULT_TIMEOUT for name in FLOW_NUMBERS}
+        self.timeouts.update(timeouts or {})
+        self.max_concurrency = {name: pool_size for name in FLOW_NUMBERS}
+        self.max_concurrency.update(max_concurrency or {})
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.components = {**DEFAULT_COMPONENTS, **(components or {})}
+        self.pool_size = pool_size
+        self.pool_keepalive = pool_size if pool_keepalive is None else pool_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.source = source
+        self.raw = raw or {}
+
+    @classmethod
+    def from_env(cls) -> "LangFlowConfig":
+        """
+        Create the config from environment settings
+
+        Environment:
+            LANGFLOW_BASE_URL, LANGFLOW_API_KEY: Server and credentials
+            FLOW_<n>_ID: Flow IDs (FLOW_1_ID is required)
+            LANGFLOW_TIMEOUT, FLOW_<n>_TIMEOUT: Request timeouts (default: 30)
+            LANGFLOW_MAX_CONCURRENCY, FLOW_<n>_MAX_CONCURRENCY: Concurrency
+                limits (default: pool size)
+            LANGFLOW_MAX_QUEUE, LANGFLOW_QUEUE_TIMEOUT: Wait queue (default: 50, 10s)
+            FLOW_1_INTAKE_COMPONENT, FLOW_3_INTAKE_COMPONENT,
+                FLOW_3_TOPIC_COMPONENT, FLOW_3_CURRICULUM_COMPONENT: Tweak
+                component IDs
+            LANGFLOW_POOL_SIZE, LANGFLOW_POOL_KEEPALIVE,
+                LANGFLOW_KEEPALIVE_EXPIRY, LANGFLOW_HTTP2: Connection pool
+        """
+        pool_size = int(os.getenv('LANGFLOW_POOL_SIZE', DEFAULT_POOL_SIZE))
+        default_timeout = float(os.getenv('LANGFLOW_TIMEOUT', DEFAULT_TIMEOUT))
+        # The default limit matches the pool size - more would only queue inside httpx
+        default_concurrency = int(os.getenv('LANGFLOW_MAX_CONCURRENCY', pool_size))
+        return cls(
+            base_url=os.getenv('LANGFLOW_BASE_URL', 'http://localhost:7860'),
+            api_key=os.getenv('LANGFLOW_API_KEY'),
+            flows={name: os.getenv(f'FLOW_{number}_ID') for name, number in FLOW_NUMBERS.items()},
+            timeouts={
+                name: float(os.getenv(f'FLOW_{number}_TIMEOUT', default_timeout))
+                for name, number in FLOW_NUMBERS.items()
+            },
+            max_concurrency={
+                name: int(os.getenv(f'FLOW_{number}_MAX_CONCURRENCY', default_concurrency))
+                for name, number in FLOW_NUMBERS.items()
+            },
+            max_queue=int(os.getenv('LANGFLOW_MAX_QUEUE', 50)),
+            queue_timeout=float(os.getenv('LANGFLOW_QUEUE_TIMEOUT', 10)),
+            components={
+                role: os.getenv(env_var, DEFAULT_COMPONENTS[role])
+                for role, env_var in COMPONENT_ENV_VARS.items()
+            },
+            pool_size=pool_size,
+            pool_keepalive=int(os.getenv('LANGFLOW_POOL_KEEPALIVE', pool_size)),
+            keepalive_expiry=float(os.getenv('LANGFLOW_KEEPALIVE_EXPIRY', 30)),
+            http2=os.getenv('LANGFLOW_HTTP2', 'true').lower() == 'true',
+            source="environment"
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], defaults: "LangFlowConfig", source: str = "config file") -> "LangFlowConfig":
+        """
+        Overlay config file contents on defaults (usually from_env())
+
+        File layout - every key is optional:
+            {
+              "langflow_base_url": "http://localhost:7860",
+              "langflow_api_key": "...",
+              "timeout": 30, "max_concurrency": 20, "max_queue": 50, "queue_timeout": 10,
+              "pool": {"size": 20, "keepalive": 20, "keepalive_expiry": 30, "http2": true},
+              "flow_1": {"flow_id": "...", "timeout": 60, "max_concurrency": 10,
+                         "components": {"intake": "IntakeFormLearnerProfile-lSOHp"}},
+              "flow_3": {"flow_id": "...", "components": {"intake": "...", "topic": "...", "curriculum": "..."}}
+            }
+
+        Raises:
+            ValueError: If a section or value has the wrong type
+        """
+        if not isinstance(data, dict):
+            raise ValueError("Config file must contain a JSON object")
+
+        def section(name: str) -> Dict[str, Any]:
+            value = data.get(name) or {}
+            if not isinstance(value, dict):
+                raise ValueError(f"'{name}' must be an object")
+            return value
+
+        def number(value: Any, name: str, cast=float):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"'{name}' must be a number, got {value!r}")
+            return cast(value)
+
+        def boolean(value: Any, name: str) -> bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"'{name}' must be true or false, got {value!r}")
+            return value
+
+        pool = section("pool")
+        pool_size = number(pool.get("size", defaults.pool_size), "pool.size", int)
+        timeout = data.get("timeout")
+        concurrency = data.get("max_concurrency")
+
+        flows, timeouts, max_concurrency = dict(defaults.flows), dict(defaults.timeouts), dict(defaults.max_concurrency)
+        for name, flow_number in FLOW_NUMBERS.items():
+            key = f"flow_{flow_number}"
+            flow = section(key)
+            if flow.get("flow_id"):
+                flows[name] = str(flow["flow_id"])
+            if "timeout" in flow or timeout is not None:
+                timeouts[name] = number(flow.get("timeout", timeout), f"{key}.timeout")
+            if "max_concurrency" in flow or concurrency is not None:
+                max_concurrency[name] = number(flow.get("max_concurrency", concurrency), f"{key}.max_concurrency", int)
+
+        components = dict(defaults.components)
+        for role, (key, component) in _COMPONENT_KEYS.items():
+            section_components = section(key).get("components") or {}
+            if not isinstance(section_components, dict):
+                raise ValueError(f"'{key}.components' must be an object")
+            value = section_components.get(component)
+            if value:
+                components[role] = str(value)
+
+        return cls(
+            base_url=str(data.get("langflow_base_url") or defaults.base_url),
+            api_key=data.get("langflow_api_key") or defaults.api_key,
+            flows=flows,
+            timeouts=timeouts,
+            max_concurrency=max_concurrency,
+            max_queue=number(data.get("max_queue", defaults.max_queue), "max_queue", int),
+            queue_timeout=number(data.get("queue_timeout", defaults.queue_timeout), "queue_timeout"),
+            components=components,
+            pool_size=pool_size,
+            pool_keepalive=number(pool.get("keepalive", defaults.pool_keepalive), "pool.keepalive", int),
+            keepalive_expiry=number(pool.get("keepalive_expiry", defaults.keepalive_expiry), "pool.keepalive_expiry"),
+            http2=boolean(pool.get("http2", defaults.http2), "pool.http2"),
+            source=source,
+            raw=data
+        )
+
+    def validate(self) -> "LangFlowConfig":
+        """
+        Check the settings are usable
+
+        Returns:
+            self, for chaining
+
+        Raises:
+            ValueError: Describing the first problem found
+        """
+        if not self.flows['scenario_generation']:
+            raise ValueError("FLOW_1_ID is required in .env file (or flow_1.flow_id in the config file)")
+        if not self.base_url.startswith(("http://", "https://")):
+            raise ValueError(f"LangFlow base URL must start with http:// or https://, got {self.base_url!r}")
+        for name, timeout in self.timeouts.items():
+            if timeout <= 0:
+                raise ValueError(f"Timeout for flow '{name}' must be positive, got {timeout}")
+        for name, limit in self.max_concurrency.items():
+            if limit < 0:
+                raise ValueError(f"Concurrency limit for flow '{name}' can't be negative, got {limit}")
+        if self.pool_size < 1 or self.pool_keepalive < 0 or self.keepalive_expiry < 0:
+            raise ValueError("Pool size must be at least 1 and keep-alive settings non-negative")
+        if self.max_queue < 0 or self.queue_timeout < 0:
+            raise ValueError("Queue size and queue timeout can't be negative")
+        return self
+
+    def pool_settings(self) -> tuple:
+        """Settings that need a new connection pool when they change"""
+        return (self.pool_size, self.pool_keepalive, self.keepalive_expiry, self.http2)
+
+    def limit_settings(self) -> tuple:
+        """Settings that need new admission limiters when they change"""
+        return (tuple(sorted(self.max_concurrency.items())), self.max_queue, self.queue_timeout)
@@ -1,86 +1,354 @@
 """
 LangFlow Service - Handles all interactions with LangFlow API
 """
+import asyncio
+import httpx
+import json
+import logging
 import requests
 import os
+import time
 import uuid
-from typing import Dict, Any, Optional
+from contextlib import contextmanager
+from typing import Dict, Any, AsyncIterator, Iterator, NamedTuple, Optional, Set
 from dotenv import load_dotenv
+from services import fastjson
+from services.admission import FlowLimiter
+from services.langflow_config import DEFAULT_TIMEOUT, FLOW_NUMBERS, LangFlowConfig
+from services.metrics import LANGFLOW_ERRORS, LANGFLOW_REQUEST_SECONDS
+from services.resilience import (
+    LANGFLOW_RETRIES,
+    CircuitBreaker,
+    LangFlowConnectionError,
+    LangFlowError,
+    LangFlowHTTPError,
+    LangFlowResponseError,
+    LangFlowTimeoutError,
+    LatencyTracker,
+    RetryPolicy,
+    hedged,
+)
+from services.scenario_cache import ScenarioCache
+from services.single_flight import SingleFlight, flight_key
+from services.tweaks import TweakTemplates, intake_form_fields
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5.0  # seconds
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional 'h2' package (pip install httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_async_client(
+    config: LangFlowConfig,
+    transport: Optional[httpx.AsyncBaseTransport] = None
+) -> httpx.AsyncClient:
+    """
+    Build the keep-alive connection pool used for all async LangFlow calls
+
+    Pool size, keep-alive and HTTP/2 settings come from the config
+    (LANGFLOW_POOL_SIZE, LANGFLOW_POOL_KEEPALIVE, LANGFLOW_KEEPALIVE_EXPIRY,
+    LANGFLOW_HTTP2 or the config file's "pool" section).
+    """
+    limits = httpx.Limits(
+        max_connections=config.pool_size,
+        max_keepalive_connections=config.pool_keepalive,
+        keepalive_expiry=config.keepalive_expiry
+    )
+    http2 = config.http2 and _http2_available()
+
+    return httpx.AsyncClient(
+        limits=limits,
+        http2=http2,
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=DEFAULT_CONNECT_TIMEOUT),
+        transport=transport
+    )
+
+
+class _RunRequest(NamedTuple):
+    """A flow run request, fixed to the config snapshot and pool it was built from"""
+    url: str
+    body: bytes
+    timeout: float
+    headers: Dict[str, str]
+    client: httpx.AsyncClient  # retries and hedges stay on this pool
+
+
+def _langflow_error(error: Exception, flow_name: str) -> LangFlowError:
+    """
+    Convert an httpx/requests/JSON error into a typed LangFlowError
+
+    Also counts it in langflow_errors_total by type.
+    """
+    if isinstance(error, ValueError):
+        # Checked first - requests' JSONDecodeError is also a RequestException
+        error_type = "parse_error"
+        result = LangFlowResponseError(f"Error parsing LangFlow response for flow '{flow_name}': {error}", flow_name)
+    elif isinstance(error, (httpx.TimeoutException, requests.exceptions.Timeout)):
+        error_type = "timeout"
+        result = LangFlowTimeoutError(f"LangFlow request timed out for flow '{flow_name}'", flow_name)
+    elif isinstance(error, (httpx.ConnectError, requests.exceptions.ConnectionError)):
+        error_type = "connection_refused"
+        result = LangFlowConnectionError(f"Connection refused calling LangFlow flow '{flow_name}': {error}", flow_name)
+    else:
+        response = getattr(error, "response", None)
+        status_code = response.status_code if response is not None else None
+        error_type = f"http_{status_code}" if status_code else "http_error"
+        result = LangFlowHTTPError(f"Error calling LangFlow flow '{flow_name}': {error}", flow_name, status_code)
+
+    LANGFLOW_ERRORS.inc(flow=flow_name, type=error_type)
+    return result
+
+
 class LangFlowService:
-    """Service class for interacting with LangFlow flows"""
-
-    def __init__(self):
-        self.base_url = os.getenv('LANGFLOW_BASE_URL', 'http://localhost:7860')
-        self.api_key = os.getenv('LANGFLOW_API_KEY')
-
-        # Flow IDs from environment
-        self.flows = {
-            'scenario_generation': os.getenv('FLOW_1_ID'),
-            'assessment_plan': os.getenv('FLOW_2_ID'),
-            'exercise_generation': os.getenv('FLOW_3_ID'),
-            'session_feedback': os.getenv('FLOW_4_ID')
+    """
+    Service class for interacting with LangFlow flows
+
+    The app creates one instance at startup (see app.main lifespan) and
+    shares it between requests, so its connection pool stays warm.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        config: Optional[LangFlowConfig] = None
+    ):
+        """
+        Args:
+            transport: httpx transport override (e.g. to point benchmarks at a stub)
+            config: Connection and flow settings (default: from the environment)
+
+        Raises:
+            ValueError: If the config is invalid (e.g. FLOW_1_ID is missing)
+        """
+        # Flow IDs, timeouts, limits and pool settings - replaced as a whole by apply_config
+        self.config = (config or LangFlowConfig.from_env()).validate()
+
+        # Resilience: retries for idempotent flows, optional hedging, per-flow breakers
+        self.retry_policy = RetryPolicy.from_env()
+        self.hedge_flows = {
+            name.strip() for name in os.getenv('LANGFLOW_HEDGE_FLOWS', '').split(",") if name.strip()
+        }
+        self.hedge_percentile = float(os.getenv('LANGFLOW_HEDGE_PERCENTILE', 95))
+        self.latency = {name: LatencyTracker() for name in FLOW_NUMBERS}
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv('LANGFLOW_BREAKER_FAILURES', 5)),
+                reset_timeout=float(os.getenv('LANGFLOW_BREAKER_RESET_SECONDS', 30))
+            )
+            for name in FLOW_NUMBERS
         }
 
-        # Validate required flows
-        if not self.flows['scenario_generation']:
-            raise ValueError("FLOW_1_ID is required in .env file")
+        # Admission control: per-flow concurrency limits with a bounded wait queue
+        self.limiters = self._build_limiters(self.config)
+
+        # Identical concurrent calls share one flow run (LANGFLOW_COALESCE=false to disable)
+        self.single_flight = (
+            SingleFlight() if os.getenv('LANGFLOW_COALESCE', 'true').lower() == 'true' else None
+        )
+
+        # Serialized intake form tweaks, cached per profile
+        self.tweak_templates = TweakTemplates(self.config.components)
+
+        # Optional Flow 1 response cache (SCENARIO_CACHE_ENABLED=true)
+        self.scenario_cache = ScenarioCache.from_env()
+
+        # Keep-alive connection pool owned by this service
+        self._transport = transport
+        self.client = _build_async_client(self.config, transport)
+        # Async requests and streams running per pool
+        self._in_flight: Dict[httpx.AsyncClient, int] = {}
+        # Pools replaced by apply_config -> set once their last request is done
+        self._retired_clients: Dict[httpx.AsyncClient, asyncio.Event] = {}
+        self._retiring: Set[asyncio.Task] = set()
+        # Longest timeout passed to acall_flow (e.g. JOB_FLOW_TIMEOUT for background jobs)
+        self._longest_timeout_override = 0.0
+
+    @property
+    def base_url(self) -> str:
+        return self.config.base_url
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return self.config.api_key
+
+    @property
+    def flows(self) -> Dict[str, Optional[str]]:
+        return self.config.flows
+
+    @property
+    def timeouts(self) -> Dict[str, float]:
+        return self.config.timeouts
+
+    def _build_limiters(self, config: LangFlowConfig) -> Dict[str, FlowLimiter]:
+        return {
+            name: FlowLimiter(
+                name,
+                max_concurrency=config.max_concurrency[name],
+                max_queue=config.max_queue,
+                queue_timeout=config.queue_timeout,
+                retry_after=lambda name=name: self.latency[name].percentile(50) or 1.0
+            )
+            for name in FLOW_NUMBERS
+        }
+
+    def apply_config(self, config: LangFlowConfig):
+        """
+        Switch to a new config snapshot, e.g. after the config file changed
+
+        Requests already running keep the URL, payload, timeout and
+        connection pool they started with; new requests use the new
+        settings. A replaced pool is closed once its last request or
+        stream is done, or after the longest time one may take (see
+        _retire_after). Call from the event loop.
+
+        Raises:
+            ValueError: If the config is invalid (the current one is kept)
+        """
+        config.validate()
+        old = self.config
+
+        if config.limit_settings() != old.limit_settings():
+            # Requests holding a slot release it on the old limiter
+            self.limiters = self._build_limiters(config)
+        if config.components != old.components:
+            self.tweak_templates = TweakTemplates(config.components)
+        if config.pool_settings() != old.pool_settings():
+            old_client = self.client
+            self.client = _build_async_client(config, self._transport)
+            idle = self._retired_clients[old_client] = asyncio.Event()
+            if not self._in_flight.get(old_client):
+                idle.set()
+            task = asyncio.ensure_future(self._close_retired(old_client, idle, self._retire_after(old)))
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+
+        self.config = config
+        logger.info("LangFlow config applied from %s", config.source)
+
+    def _retire_after(self, config: LangFlowConfig) -> float:
+        """Longest a request built from config can hold its pool, retries included"""
+        timeout = max(max(config.timeouts.values()), self._longest_timeout_override)
+        attempts = 1 + self.retry_policy.retries
+        return (
+            attempts * (config.queue_timeout + timeout + self.retry_policy.max_delay)
+            + DEFAULT_CONNECT_TIMEOUT
+        )
+
+    async def _close_retired(self, client: httpx.AsyncClient, idle: asyncio.Event, limit: float):
+        try:
+            await asyncio.wait_for(idle.wait(), limit)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Closing replaced LangFlow pool with %d requests still running",
+                self._in_flight.get(client, 0)
+            )
+        del self._retired_clients[client]
+        await client.aclose()
+
+    @contextmanager
+    def _pinned(self, client: httpx.AsyncClient) -> Iterator[httpx.AsyncClient]:
+        """Count a request or stream against its pool while it runs"""
+        self._in_flight[client] = self._in_flight.get(client, 0) + 1
+        try:
+            yield client
+        finally:
+            count = self._in_flight.pop(client) - 1
+            if count:
+                self._in_flight[client] = count
+            elif client in self._retired_clients:
+                self._retired_clients[client].set()
+
+    async def warm_up(self, connections: Optional[int] = None):
+        """
+        Open connections to LangFlow ahead of the first request
+
+        Failures are logged and ignored - LangFlow may still be starting up.
 
-    def _get_headers(self) -> Dict[str, str]:
+        Args:
+            connections: Number of connections to open (default: LANGFLOW_WARMUP_CONNECTIONS or 2)
+        """
+        if connections is None:
+            connections = int(os.getenv('LANGFLOW_WARMUP_CONNECTIONS', 2))
+
+        async def ping():
+            try:
+                await self.client.get(
+                    f"{self.base_url}/health",
+                    headers=self._get_headers(),
+                    timeout=DEFAULT_CONNECT_TIMEOUT
+                )
+            except httpx.HTTPError as e:
+                logger.warning("LangFlow warm-up request failed: %r", e)
+
+        await asyncio.gather(*(ping() for _ in range(connections)))
+
+    async def aclose(self):
+        """Close the connection pool (and any pools replaced by apply_config)"""
+        for task in self._retiring:
+            task.cancel()
+        for client in [self.client, *self._retired_clients]:
+            await client.aclose()
+        self._retired_clients.clear()
+
+    def _get_headers(self, config: Optional[LangFlowConfig] = None) -> Dict[str, str]:
         """Get headers for API requests"""
         headers = {
             "Content-Type": "application/json"
         }
 
         # Add API key if available (for LangFlow Cloud or authenticated instances)
-        if self.api_key:
-            headers["x-api-key"] = self.api_key
+        api_key = (config or self.config).api_key
+        if api_key:
+            headers["x-api-key"] = api_key
 
         return headers
 
-    def call_flow(
+    def _build_request(
         self,
         flow_name: str,
         input_value: Any,
-        session_id: Optional[str] = None,
-        output_type: str = "chat",
-        input_type: str = "chat",
-        tweaks: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
+        session_id: Optional[str],
+        output_type: str,
+        input_type: str,
+        tweaks: Optional[Dict[str, Any]],
+        tweaks_json: Optional[str] = None
+    ) -> _RunRequest:
         """
-        Call a LangFlow flow by name
+        Build the run request for a flow from the current config snapshot
 
-        Args:
-            flow_name: Name of the flow (e.g., 'scenario_generation')
-            input_value: Input data for the flow (will be converted to JSON string if dict)
-            session_id: Optional session ID for conversation tracking
-            output_type: Type of output (default: "chat")
-            input_type: Type of input (default: "chat")
-            tweaks: Optional tweaks to modify component parameters
-
-        Returns:
-            Dict containing the flow response
+        The payload is serialized once here and reused for retries and
+        hedged requests. tweaks_json (already serialized, e.g. by
+        TweakTemplates) is spliced into the JSON text as-is.
 
         Raises:
-            ValueError: If flow name is not found
-            requests.exceptions.RequestException: If API request fails
+            ValueError: If flow name is not found, or both tweaks and tweaks_json are given
         """
-        import json as json_lib
+        if tweaks and tweaks_json:
+            raise ValueError("Pass tweaks or tweaks_json, not both")
+        config = self.config
 
         # Get flow ID
-        flow_id = self.flows.get(flow_name)
+        flow_id = config.flows.get(flow_name)
         if not flow_id:
-            raise ValueError(f"Flow '{flow_name}' not found. Available flows: {list(self.flows.keys())}")
+            raise ValueError(f"Flow '{flow_name}' not found. Available flows: {list(config.flows.keys())}")
 
-        # Build URL - add ?no_cache=true to prevent response caching
-        url = f"{self.base_url}/api/v1/run/{flow_id}"
+        url = f"{config.base_url}/api/v1/run/{flow_id}"
 
         # Convert input_value to string if it's a dict
         if isinstance(input_value, dict):
-            input_value = json_lib.dumps(input_value)
+            input_value = json.dumps(input_value)
 
         # Build payload
         payload = {
@@ -94,33 +362,265 @@ class LangFlowService:
         if tweaks:
             payload["tweaks"] = tweaks
 
-        # Get headers
-        headers = self._get_headers()
+        body = fastjson.dumps(payload)
+        if tweaks_json:
+            body = b'%s,"tweaks":%s}' % (body[:-1], tweaks_json.encode("utf-8"))
+        return _RunRequest(
+            url, body, config.timeouts.get(flow_name, DEFAULT_TIMEOUT), self._get_headers(config), self.client
+        )
 
-        try:
-            # Send API request with cache control params
-            params = {
-                "stream": False  # Disable streaming for consistent responses
-            }
+    def call_flow(
+        self,
+        flow_name: str,
+        input_value: Any,
+        session_id: Optional[str] = None,
+        output_type: str = "chat",
+        input_type: str = "chat",
+        tweaks: Optional[Dict[str, Any]] = None,
+        tweaks_json: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Call a LangFlow flow by name (blocking)
 
-            response = requests.post(
-                url,
-                json=payload,
-                headers=headers,
-                params=params,
-                timeout=30  # 30 second timeout
-            )
-            response.raise_for_status()
+        Prefer acall_flow from async code - this blocks the calling thread
+        for the whole flow run. Idempotent flows (LANGFLOW_RETRY_FLOWS) are
+        retried on timeouts, connection errors and 429/500/502-504 responses.
 
-            # Parse and return response
-            return response.json()
+        Args:
+            flow_name: Name of the flow (e.g., 'scenario_generation')
+            input_value: Input data for the flow (will be converted to JSON string if dict)
+            session_id: Optional session ID for conversation tracking
+            output_type: Type of output (default: "chat")
+            input_type: Type of input (default: "chat")
+            tweaks: Optional tweaks to modify component parameters
+            tweaks_json: Optional tweaks already serialized as a JSON object
+                (not together with tweaks)
+
+        Returns:
+            Dict containing the flow response
+
+        Raises:
+            ValueError: If flow name is not found, or both tweaks and tweaks_json are given
+            LangFlowError: If the API request fails (timeout, connection, HTTP
+                status or unparseable response), or CircuitOpenError while
+                the flow's circuit breaker is open
+        """
+        request = self._build_request(
+            flow_name, input_value, session_id, output_type, input_type, tweaks, tweaks_json
+        )
+        breaker = self.breakers[flow_name]
+        attempts = self.retry_policy.attempts(flow_name)
+
+        for attempt in range(1, attempts + 1):
+            trial = breaker.before_call()
+            try:
+                with LANGFLOW_REQUEST_SECONDS.time(flow=flow_name):
+                    response = requests.post(
+                        request.url,
+                        data=request.body,
+                        headers=request.headers,
+                        params={"stream": False},  # Disable streaming for consistent responses
+                        timeout=request.timeout
+                    )
+                    response.raise_for_status()
+
+                    # Parse and return response
+                    result = fastjson.loads(response.content)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                error = _langflow_error(e, flow_name)
+                breaker.record_error(error, trial)
+                if not error.retryable or attempt == attempts:
+                    raise error from e
+                LANGFLOW_RETRIES.inc(flow=flow_name)
+                time.sleep(self.retry_policy.backoff(attempt))
+            else:
+                breaker.record_success()
+                return result
+
+    async def acall_flow(
+        self,
+        flow_name: str,
+        input_value: Any,
+        session_id: Optional[str] = None,
+        output_type: str = "chat",
+        input_type: str = "chat",
+        tweaks: Optional[Dict[str, Any]] = None,
+        tweaks_json: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Call a LangFlow flow by name without blocking the event loop
+
+        Uses the service's keep-alive connection pool, so repeated calls
+        reuse open connections to LangFlow. Retries like call_flow, and for
+        flows in LANGFLOW_HEDGE_FLOWS sends a second request once the first
+        is slower than the flow's recent p95. Concurrent identical calls
+        (same flow, session_id, input and tweaks) share one run and get the
+        same result object. Takes the same arguments as call_flow, plus
+        timeout to override the flow's configured request timeout (e.g. for
+        background jobs, which no client is waiting on).
+
+        Returns:
+            Dict containing the flow response
+
+        Raises:
+            ValueError: If flow name is not found, or both tweaks and tweaks_json are given
+            LangFlowError: If the API request fails (timeout, connection, HTTP
+                status or unparseable response), CircuitOpenError while
+                the flow's circuit breaker is open, or AdmissionRejected when
+                the flow is at its concurrency limit and the queue is full or
+                the wait deadline passes
+        """
+        request = self._build_request(
+            flow_name, input_value, session_id, output_type, input_type, tweaks, tweaks_json
+        )
+        if timeout is not None:
+            request = request._replace(timeout=timeout)
+            self._longest_timeout_override = max(self._longest_timeout_override, timeout)
+        if self.single_flight is None:
+            return await self._acall_with_retries(flow_name, request)
+
+        key = flight_key(flow_name, session_id, input_value, tweaks if tweaks_json is None else tweaks_json)
+        return await self.single_flight.do(
+            key,
+            lambda: self._acall_with_retries(flow_name, request),
+            flow_name
+        )
+
+    async def _acall_with_retries(self, flow_name: str, request: _RunRequest) -> Dict[str, Any]:
+        """Run a flow through its circuit breaker, with retries and hedging where allowed"""
+        with self._pinned(request.client):
+            breaker = self.breakers[flow_name]
+            attempts = self.retry_policy.attempts(flow_name)
+
+            for attempt in range(1, attempts + 1):
+                trial = breaker.before_call()
+                try:
+                    result = await hedged(
+                        lambda: self._apost_flow(flow_name, request),
+                        self._hedge_delay(flow_name),
+                        flow_name
+                    )
+                except LangFlowError as e:
+                    breaker.record_error(e, trial)
+                    if not e.retryable or attempt == attempts:
+                        raise
+                    LANGFLOW_RETRIES.inc(flow=flow_name)
+                    await asyncio.sleep(self.retry_policy.backoff(attempt))
+                except BaseException as e:
+                    # Cancelled (e.g. client went away) - free a half-open trial slot
+                    breaker.record_error(e, trial)
+                    raise
+                else:
+                    breaker.record_success()
+                    return result
+
+    def _hedge_delay(self, flow_name: str) -> Optional[float]:
+        """Seconds before sending a hedged request, or None to not hedge"""
+        if flow_name not in self.hedge_flows or flow_name not in self.retry_policy.flows:
+            return None  # Only idempotent flows may run twice
+        return self.latency[flow_name].percentile(self.hedge_percentile)
+
+    async def _apost_flow(self, flow_name: str, request: _RunRequest) -> Dict[str, Any]:
+        """One non-streaming run request - raises a typed LangFlowError on failure"""
+        timeout = request.timeout
+        async with self.limiters[flow_name].slot():
+            start = time.perf_counter()
+            try:
+                with LANGFLOW_REQUEST_SECONDS.time(flow=flow_name):
+                    response = await request.client.post(
+                        request.url,
+                        content=request.body,
+                        headers=request.headers,
+                        params={"stream": "false"},  # Disable streaming for consistent responses
+                        timeout=httpx.Timeout(timeout, connect=min(timeout, DEFAULT_CONNECT_TIMEOUT))
+                    )
+                    response.raise_for_status()
+
+                    # Parse and return response
+                    result = fastjson.loads(response.content)
+            except (httpx.HTTPError, ValueError) as e:
+                raise _langflow_error(e, flow_name) from e
+
+        self.latency[flow_name].record(time.perf_counter() - start)
+        return result
+
+    async def astream_flow(
+        self,
+        flow_name: str,
+        input_value: Any,
+        session_id: Optional[str] = None,
+        output_type: str = "chat",
+        input_type: str = "chat",
+        tweaks: Optional[Dict[str, Any]] = None,
+        tweaks_json: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Call a LangFlow flow in stream mode and yield its events as they arrive
 
-        except requests.exceptions.Timeout:
-            raise Exception(f"LangFlow request timed out for flow '{flow_name}'")
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Error calling LangFlow flow '{flow_name}': {str(e)}")
-        except ValueError as e:
-            raise Exception(f"Error parsing LangFlow response for flow '{flow_name}': {str(e)}")
+        LangFlow streams one JSON event per line, e.g.
+        {"event": "token", "data": {"chunk": "..."}} for each generated token
+        and {"event": "end", "data": {"result": {...}}} with the final run
+        response. Nothing is buffered beyond the current line, and closing
+        the generator (e.g. when the client disconnects) closes the upstream
+        connection. Takes the same arguments as call_flow.
+
+        Yields:
+            Dict for each LangFlow event
+
+        Raises:
+            ValueError: If flow name is not found, or both tweaks and tweaks_json are given
+            LangFlowError: If the API request fails (timeout, connection, HTTP
+                status or unparseable response), CircuitOpenError while
+                the flow's circuit breaker is open, or AdmissionRejected when
+                the flow is at its concurrency limit (see acall_flow)
+        """
+        request = self._build_request(
+            flow_name, input_value, session_id, output_type, input_type, tweaks, tweaks_json
+        )
+        timeout = request.timeout
+        breaker = self.breakers[flow_name]
+        trial = breaker.before_call()
+
+        try:
+            with self._pinned(request.client) as client:
+                async with self.limiters[flow_name].slot():
+                    with LANGFLOW_REQUEST_SECONDS.time(flow=flow_name):
+                        async with client.stream(
+                            "POST",
+                            request.url,
+                            content=request.body,
+                            headers=request.headers,
+                            params={"stream": "true"},
+                            timeout=httpx.Timeout(timeout, connect=min(timeout, DEFAULT_CONNECT_TIMEOUT))
+                        ) as response:
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                line = line.strip()
+                                if line:
+                                    yield fastjson.loads(line)
+
+        except (httpx.HTTPError, ValueError) as e:
+            error = _langflow_error(e, flow_name)
+            breaker.record_error(error, trial)
+            raise error from e
+        except BaseException as e:
+            # Closed early (client disconnected) - free a half-open trial slot
+            breaker.record_error(e, trial)
+            raise
+        else:
+            breaker.record_success()
+
+    def _log_scenario_request(self, student_data: Dict[str, Any]):
+        # No name - only the fields that shape the scenario
+        logger.debug(
+            "Flow 1 request: age_group=%s writing_challenge=%s audience=%s interests=%d chars cultural_refs=%d chars",
+            student_data.get('age_group', ''),
+            student_data.get('hardest', ''),
+            student_data.get('audience', ''),
+            len(student_data.get('interests') or ''),
+            len(student_data.get('cultural_refs') or '')
+        )
 
     def generate_scenario(self, student_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -132,50 +632,93 @@ class LangFlowService:
         Returns:
             Generated scenario and exercise prompts
         """
-        import time
-
-        # Extract form fields for LangFlow Intake Form component
-        # Pass individual fields as tweaks with correct component ID structure
-        # Component ID: IntakeFormLearnerProfile-lSOHp (from flow 341a8f52-0532-4767-9185-90a6bf69d91d)
-        intake_form_tweaks = {
-            "IntakeFormLearnerProfile-lSOHp": {
-                "full_name": student_data.get("full_name", ""),
-                "age_group": student_data.get("age_group", ""),
-                "interests": student_data.get("interests", ""),
-                "cultural_refs": student_data.get("cultural_refs", ""),
-                "writing_challenge": student_data.get("hardest", ""),  # Map 'hardest' to 'writing_challenge'
-                "audience": student_data.get("audience", "")
-            }
-        }
+        self._log_scenario_request(student_data)
+        intake_fields = intake_form_fields(student_data)
 
-        # Debug logging
-        print(f"DEBUG LANGFLOW: Sending intake form data via tweaks:")
-        print(f"  full_name: {student_data.get('full_name', '')}")
-        print(f"  age_group: {student_data.get('age_group', '')}")
-        print(f"  interests: {student_data.get('interests', '')}")
-        print(f"  cultural_refs: {student_data.get('cultural_refs', '')}")
-        print(f"  writing_challenge: {student_data.get('hardest', '')}")
-        print(f"  audience: {student_data.get('audience', '')}")
+        if self.scenario_cache:
+            cached = self.scenario_cache.get(intake_fields)
+            if cached is not None:
+                logger.debug("Scenario cache hit")
+                return cached
 
         # Use a simple trigger message as input_value
         # The actual form data is passed via tweaks to override the Intake Form component fields
-        trigger_message = "lets start"
-
         result = self.call_flow(
             flow_name='scenario_generation',
-            input_value=trigger_message,
-            tweaks=intake_form_tweaks
+            input_value="lets start",
+            tweaks_json=self.tweak_templates.scenario(student_data)
         )
 
-        print(f"DEBUG LANGFLOW: Received response keys: {result.keys() if isinstance(result, dict) else type(result)}")
+        logger.debug("Flow 1 response keys: %s", result.keys() if isinstance(result, dict) else type(result))
+
+        if self.scenario_cache:
+            self.scenario_cache.put(intake_fields, result)
 
         return result
 
+    async def agenerate_scenario(self, student_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Awaitable version of generate_scenario (Flow 1)"""
+        self._log_scenario_request(student_data)
+        intake_fields = intake_form_fields(student_data)
+
+        # Identical profiles skip the LLM round-trip entirely
+        if self.scenario_cache:
+            cached = self.scenario_cache.get(intake_fields)
+            if cached is not None:
+                logger.debug("Scenario cache hit")
+                return cached
+
+        result = await self.acall_flow(
+            flow_name='scenario_generation',
+            input_value="lets start",
+            tweaks_json=self.tweak_templates.scenario(student_data)
+        )
+
+        logger.debug("Flow 1 response keys: %s", result.keys() if isinstance(result, dict) else type(result))
+
+        if self.scenario_cache:
+            self.scenario_cache.put(intake_fields, result)
+
+        return result
+
+    async def astream_generate_scenario(self, student_data: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming version of generate_scenario (Flow 1) - yields LangFlow events
+
+        A cache hit yields a single end event with the cached response; a
+        miss streams tokens and caches the result from the end event.
+        """
+        self._log_scenario_request(student_data)
+        intake_fields = intake_form_fields(student_data)
+
+        if self.scenario_cache:
+            cached = self.scenario_cache.get(intake_fields)
+            if cached is not None:
+                logger.debug("Scenario cache hit")
+                yield {"event": "end", "data": {"result": cached}}
+                return
+
+        events = self.astream_flow(
+            flow_name='scenario_generation',
+            input_value="lets start",
+            tweaks_json=self.tweak_templates.scenario(student_data)
+        )
+        try:
+            async for event in events:
+                if event.get("event") == "end" and self.scenario_cache:
+                    result = (event.get("data") or {}).get("result")
+                    if isinstance(result, dict):
+                        self.scenario_cache.put(intake_fields, result)
+                yield event
+        finally:
+            await events.aclose()
+
     def start_exercise(
         self,
         student_data: Dict[str, Any],
         exercise_topic: str,
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        curriculum: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Start an exercise session (Flow: 319348b5-d0e0-463e-af41-3d0989b9a4f6)
@@ -184,41 +727,43 @@ class LangFlowService:
             student_data: Dictionary containing student information (for Intake Form)
             exercise_topic: The exercise topic/title (for Text Input)
             session_id: Optional session ID for conversation tracking
+            curriculum: Curriculum snippets for Flow 3 (see services.curriculum)
 
         Returns:
             Exercise session response
         """
-        # Pass form data to IntakeFormLearnerProfile component via tweaks
-        # Pass exercise topic to TextInput component via tweaks
-        # Component IDs from flow 319348b5-d0e0-463e-af41-3d0989b9a4f6
-        exercise_tweaks = {
-            "IntakeFormLearnerProfile-OnNnU": {
-                "full_name": student_data.get("full_name", ""),
-                "age_group": student_data.get("age_group", ""),
-                "interests": student_data.get("interests", ""),
-                "cultural_refs": student_data.get("cultural_refs", ""),
-                "writing_challenge": student_data.get("hardest", ""),
-                "audience": student_data.get("audience", "")
-            },
-            "TextInput-1AsYl": {
-                "input_value": exercise_topic
-            }
-        }
-
-        # Debug logging
-        print(f"DEBUG LANGFLOW EXERCISE: Starting exercise session")
-        print(f"  Exercise topic: {exercise_topic}")
-        print(f"  Student: {student_data.get('full_name', '')}")
+        logger.debug("Starting exercise session %s: topic=%r", session_id, exercise_topic)
 
         # Use exercise topic as input_value trigger
         result = self.call_flow(
             flow_name='exercise_generation',
             input_value=exercise_topic,
             session_id=session_id,
-            tweaks=exercise_tweaks
+            tweaks_json=self.tweak_templates.exercise(student_data, exercise_topic, curriculum)
+        )
+
+        logger.debug("Flow 3 response keys: %s", result.keys() if isinstance(result, dict) else type(result))
+
+        return result
+
+    async def astart_exercise(
+        self,
+        student_data: Dict[str, Any],
+        exercise_topic: str,
+        session_id: Optional[str] = None,
+        curriculum: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Awaitable version of start_exercise (Flow 3)"""
+        logger.debug("Starting exercise session %s: topic=%r", session_id, exercise_topic)
+
+        result = await self.acall_flow(
+            flow_name='exercise_generation',
+            input_value=exercise_topic,
+            session_id=session_id,
+            tweaks_json=self.tweak_templates.exercise(student_data, exercise_topic, curriculum)
         )
 
-        print(f"DEBUG LANGFLOW EXERCISE: Received response keys: {result.keys() if isinstance(result, dict) else type(result)}")
+        logger.debug("Flow 3 response keys: %s", result.keys() if isinstance(result, dict) else type(result))
 
         return result
 
@@ -239,38 +784,69 @@ class LangFlowService:
         Returns:
             AI coach response
         """
-        # Pass form data to IntakeFormLearnerProfile component via tweaks
-        # The user message is passed as input_value
-        # Component IDs from flow 319348b5-d0e0-463e-af41-3d0989b9a4f6
-        exercise_tweaks = {
-            "IntakeFormLearnerProfile-OnNnU": {
-                "full_name": student_data.get("full_name", ""),
-                "age_group": student_data.get("age_group", ""),
-                "interests": student_data.get("interests", ""),
-                "cultural_refs": student_data.get("cultural_refs", ""),
-                "writing_challenge": student_data.get("hardest", ""),
-                "audience": student_data.get("audience", "")
-            }
-        }
-
-        # Debug logging
-        print(f"DEBUG LANGFLOW CHAT: Continuing exercise conversation")
-        print(f"  User message: {user_message}")
-        print(f"  Session ID: {session_id}")
-        print(f"  Student: {student_data.get('full_name', '')}")
+        logger.debug("Continuing exercise session %s: message=%d chars", session_id, len(user_message))
 
         # Use the same session_id to maintain conversation history
         result = self.call_flow(
             flow_name='exercise_generation',
             input_value=user_message,
             session_id=session_id,
-            tweaks=exercise_tweaks
+            tweaks_json=self.tweak_templates.exercise(student_data)
         )
 
-        print(f"DEBUG LANGFLOW CHAT: Received response keys: {result.keys() if isinstance(result, dict) else type(result)}")
+        logger.debug("Flow 3 response keys: %s", result.keys() if isinstance(result, dict) else type(result))
 
         return result
 
+    async def acontinue_exercise(
+        self,
+        student_data: Dict[str, Any],
+        user_message: str,
+        session_id: str
+    ) -> Dict[str, Any]:
+        """Awaitable version of continue_exercise (Flow 3)"""
+        logger.debug("Continuing exercise session %s: message=%d chars", session_id, len(user_message))
+
+        result = await self.acall_flow(
+            flow_name='exercise_generation',
+            input_value=user_message,
+            session_id=session_id,
+            tweaks_json=self.tweak_templates.exercise(student_data)
+        )
+
+        logger.debug("Flow 3 response keys: %s", result.keys() if isinstance(result, dict) else type(result))
+
+        return result
+
+    def astream_start_exercise(
+        self,
+        student_data: Dict[str, Any],
+        exercise_topic: str,
+        session_id: Optional[str] = None,
+        curriculum: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming version of start_exercise (Flow 3) - yields LangFlow events"""
+        return self.astream_flow(
+            flow_name='exercise_generation',
+            input_value=exercise_topic,
+            session_id=session_id,
+            tweaks_json=self.tweak_templates.exercise(student_data, exercise_topic, curriculum)
+        )
+
+    def astream_continue_exercise(
+        self,
+        student_data: Dict[str, Any],
+        user_message: str,
+        session_id: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming version of continue_exercise (Flow 3) - yields LangFlow events"""
+        return self.astream_flow(
+            flow_name='exercise_generation',
+            input_value=user_message,
+            session_id=session_id,
+            tweaks_json=self.tweak_templates.exercise(student_data)
+        )
+
     def assess_and_plan(self, assessment_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Assess student writing and generate learning plan (Flow 2)
@@ -286,6 +862,20 @@ class LangFlowService:
             input_value=assessment_data
         )
 
+    async def aassess_and_plan(
+        self,
+        assessment_data: Dict[str, Any],
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Awaitable version of assess_and_plan (Flow 2), optionally with a longer timeout"""
+        return await self.acall_flow(
+            flow_name='assessment_plan',
+            input_value=assessment_data,
+            session_id=session_id,
+            timeout=timeout
+        )
+
     def generate_exercise(
         self,
         student_id: str,
@@ -338,6 +928,25 @@ class LangFlowService:
             }
         )
 
+    async def asession_feedback(
+        self,
+        conversation_history: list,
+        student_id: str,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Awaitable version of session_feedback (Flow 4), optionally with a longer timeout"""
+        if not self.flows['session_feedback']:
+            raise ValueError("FLOW_4_ID not configured. Required for Iteration 2.")
+
+        return await self.acall_flow(
+            flow_name='session_feedback',
+            input_value={
+                'conversation': conversation_history,
+                'student_id': student_id
+            },
+            timeout=timeout
+        )
+
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+"""
+Resilience - typed LangFlow errors, retries, hedging and circuit breakers
+
+LangFlowService wraps every call in a per-flow CircuitBreaker. Idempotent
+flows (no conversation memory, e.g. Flow 1 scenario generation) are also
+retried with jittered exponential backoff, and can be hedged: if the first
+request is slower than that flow's recent p95, a second one is sent and
+whichever finishes first wins.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Set, TypeVar
+
+from services.metrics import Counter, Gauge
+
+T = TypeVar("T")
+
+# Upstream statuses that mean "try again" rather than "bad request". LangFlow
+# answers 500 when a component fails (e.g. the LLM call), which is usually transient.
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+LANGFLOW_RETRIES = Counter(
+    "langflow_retries_total",
+    "LangFlow calls retried after a retryable error",
+    ["flow"]
+)
+LANGFLOW_HEDGES = Counter(
+    "langflow_hedged_requests_total",
+    "Hedged second requests sent, by which request won",
+    ["flow", "winner"]
+)
+CIRCUIT_STATE = Gauge(
+    "langflow_circuit_open",
+    "1 while the flow's circuit breaker is open (failing fast), else 0",
+    ["flow"]
+)
+
+
+# --- Typed errors ------------------------------------------------------------
+# Messages keep the old wording ("timed out", "Connection refused") so log
+# searches and older callers that match on text still work.
+
+class LangFlowError(Exception):
+    """Base class for LangFlow call failures"""
+
+    # Whether the failure says the upstream is unhealthy (counts toward the breaker)
+    upstream_failure = True
+    retryable = False
+
+    def __init__(self, message: str, flow_name: str = ""):
+        super().__init__(message)
+        self.flow_name = flow_name
+
+
+class LangFlowTimeoutError(LangFlowError):
+    """LangFlow did not answer within the flow's timeout"""
+    retryable = True
+
+
+class LangFlowConnectionError(LangFlowError):
+    """LangFlow could not be reached"""
+    retryable = True
+
+
+class LangFlowHTTPError(LangFlowError):
+    """LangFlow answered with an error status (or the request failed mid-way)"""
+
+    def __init__(self, message: str, flow_name: str = "", status_code: Optional[int] = None):
+        super().__init__(message, flow_name)
+        self.status_code = status_code
+        self.retryable = status_code is None or status_code in RETRYABLE_STATUSES
+        # 4xx means our request was wrong, not that LangFlow is down
+        self.upstream_failure = status_code is None or status_code >= 500
+
+
+class LangFlowResponseError(LangFlowError):
+    """LangFlow answered 200 with a body that isn't valid JSON"""
+    upstream_failure = False
+
+
+class CircuitOpenError(LangFlowError):
+    """The flow's circuit breaker is open - failing fast without calling LangFlow"""
+    upstream_failure = False
+
+    def __init__(self, message: str, flow_name: str = "", retry_after: float = 0.0):
+        super().__init__(message, flow_name)
+        self.retry_after = retry_after
+
+
+# --- Retry policy ------------------------------------------------------------
+
+class RetryPolicy:
+    """Jittered exponential backoff for idempotent flows"""
+
+    def __init__(
+        self,
+        retries: int = 2,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        flows: Optional[Set[str]] = None
+    ):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.flows = flows if flows is not None else {"scenario_generation"}
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """
+        Create the policy from environment settings
+
+        Environment:
+            LANGFLOW_RETRIES: Extra attempts after a retryable error (default: 2)
+            LANGFLOW_RETRY_BASE_DELAY: First backoff in seconds (default: 0.2)
+            LANGFLOW_RETRY_MAX_DELAY: Backoff cap in seconds (default: 2)
+            LANGFLOW_RETRY_FLOWS: Comma-separated idempotent flow names
+                (default: scenario_generation)
+        """
+        flows = os.getenv('LANGFLOW_RETRY_FLOWS', 'scenario_generation')
+        return cls(
+            retries=int(os.getenv('LANGFLOW_RETRIES', 2)),
+            base_delay=float(os.getenv('LANGFLOW_RETRY_BASE_DELAY', 0.2)),
+            max_delay=float(os.getenv('LANGFLOW_RETRY_MAX_DELAY', 2.0)),
+            flows={name.strip() for name in flows.split(",") if name.strip()}
+        )
+
+    def attempts(self, flow_name: str) -> int:
+        """Total attempts allowed for a flow (1 for non-idempotent flows)"""
+        return 1 + self.retries if flow_name in self.flows else 1
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number attempt (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+# --- Circuit breaker ---------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    Per-flow circuit breaker
+
+    Closed: calls go through; failure_threshold consecutive upstream
+    failures open it. Open: calls fail fast with CircuitOpenError for
+    reset_timeout seconds. Half-open: one trial call goes through - success
+    closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, flow_name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.flow_name = flow_name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """
+        Check whether a call may go through
+
+        Returns:
+            True if the call is the half-open trial - pass it back to
+            record_error so only the trial releases its slot
+
+        Raises:
+            CircuitOpenError: While the circuit is open (or a half-open trial is running)
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+        raise CircuitOpenError(
+            f"LangFlow flow '{self.flow_name}' is unavailable (circuit open)",
+            self.flow_name,
+            retry_after=max(remaining, 1.0)
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_progress = False
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                CIRCUIT_STATE.set(0, flow=self.flow_name)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_progress = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                CIRCUIT_STATE.set(1, flow=self.flow_name)
+
+    def record_error(self, error: BaseException, trial: bool = False):
+        """
+        Record a call's outcome from the exception it raised
+
+        Args:
+            error: The exception
+            trial: Whether the call was the half-open trial (before_call's result)
+        """
+        if isinstance(error, LangFlowError) and error.upstream_failure:
+            self.record_failure()
+        elif trial:
+            # Not LangFlow's fault - don't hold the half-open trial slot
+            with self._lock:
+                self._trial_in_progress = False
+
+
+# --- Hedging -----------------------------------------------------------------
+
+class LatencyTracker:
+    """Recent successful call durations for one flow, for the hedge delay"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency percentile, or None until min_samples calls have been seen"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    flow_name: str
+) -> T:
+    """
+    Run call, starting a second copy if the first hasn't finished after delay
+
+    The first copy to succeed wins and the other is cancelled. If one copy
+    fails, the other's outcome is used.
+
+    Args:
+        call: Coroutine factory for one attempt
+        delay: Seconds before hedging (None: don't hedge)
+        flow_name: Flow name for metrics
+    """
+    if delay is None:
+        return await call()
+
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    error: Optional[BaseException] = None
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            pending = set()
+            return first.result()
+
+        second = asyncio.ensure_future(call())
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    LANGFLOW_HEDGES.inc(flow=flow_name, winner="first" if task is first else "hedge")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,285 @@
+"""
+Scenario Cache - In-process response cache for Flow 1 (scenario generation)
+
+Students in the same class often submit near-identical intake profiles.
+The cache keys on a canonical hash of the intake tweak fields so those
+profiles share one LangFlow run. With ignore_name enabled, the student's
+name is left out of the key and templated back into the cached response.
+
+Only the reply text (outputs[0].outputs[0].results.message.text, and its
+verbatim copies elsewhere in the envelope) is templated: the full name
+wherever it appears, the first name only where it greets or addresses
+the student ("Hi Maya", "Well done, Maya!"). A profile is not cached when
+that can't be done safely - the first name is also a common word ("Will",
+"Grace"), it is used some other way in the text, or the name appears
+elsewhere in the envelope - since a wrong guess would show up in every
+later student's reply.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Placeholders for the templated name in the reply text
+_FULL_NAME_PLACEHOLDER = "\x00"
+_FIRST_NAME_PLACEHOLDER = "\x01"
+
+# First names that are also everyday words - a reply using them can't be
+# templated without guessing, so those profiles aren't cached
+_COMMON_WORD_NAMES = frozenset("""
+    amber april art august autumn bill bob buck bud chase cliff crystal daisy dawn dean
+    destiny drew earl ernest faith frank gene ginger grace guy hazel heather holly honor
+    hope hunter iris ivy jack jade jewel joy june justice king lane lily mark mason max
+    may miles misty olive pat pearl penny rain ray reed rich river robin rock rose ruby
+    rusty sandy skip sky spring stone summer sunny tab victor violet wade ward will
+    win windy winter young
+""".split())
+
+# Where a first name is clearly the student being greeted or addressed
+_GREETINGS = (
+    r"hi|hello|hey|dear|welcome|thanks|thank you|good morning|good afternoon|good evening"
+    r"|great job|good job|well done|nice work|great work|nice job|way to go|congrats|congratulations"
+)
+
+# Intake fields holding comma-separated lists (order doesn't matter for the key)
+_LIST_FIELDS = ("interests", "cultural_refs")
+
+
+def _normalize_text(value: Any) -> str:
+    """Collapse whitespace and case so trivially different inputs match"""
+    return " ".join(str(value or "").split()).casefold()
+
+
+def _normalize_list(value: Any) -> str:
+    items = {_normalize_text(item) for item in str(value or "").split(",")}
+    return ",".join(sorted(item for item in items if item))
+
+
+def _reply_text(response: Any) -> Optional[str]:
+    """The reply text at outputs[0].outputs[0].results.message.text, if present"""
+    try:
+        text = response["outputs"][0]["outputs"][0]["results"]["message"]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return text if isinstance(text, str) else None
+
+
+def _replace_strings(value: Any, old: str, new: str) -> Any:
+    """Copy of a JSON value with every string equal to old replaced by new"""
+    if isinstance(value, str):
+        return new if value == old else value
+    if isinstance(value, dict):
+        return {key: _replace_strings(item, old, new) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_replace_strings(item, old, new) for item in value]
+    return value
+
+
+def _word(name: str) -> str:
+    return r"(?<!\w)" + re.escape(name) + r"(?!\w)"
+
+
+def _mentions_name(text: str, full_name: str) -> bool:
+    """Whether any part of the name appears in text as a word (any case)"""
+    return any(re.search(_word(part), text, re.IGNORECASE) for part in full_name.split(" ") if len(part) > 1)
+
+
+def _template_text(text: str, full_name: str) -> Optional[str]:
+    """
+    Reply text with the student's name replaced by placeholders
+
+    Returns:
+        The templated text, or None if the name can't be templated safely
+    """
+    parts = full_name.split(" ")
+    first_name = parts[0]
+    if first_name.casefold() in _COMMON_WORD_NAMES or len(first_name) < 3:
+        return None
+    if len(parts) > 1:
+        text = re.sub(_word(full_name), _FULL_NAME_PLACEHOLDER, text)
+
+    name = _word(first_name)
+    for address in (
+        r"(?i:\b(?:" + _GREETINGS + r"))\s*,?\s+(" + name + r")",   # "Hi Maya", "Well done, Maya"
+        r",\s*(" + name + r")(?=\s*[!.?,:;]|\s*$)",                  # "Nice try, Maya!"
+        r"(?m)^\W*(" + name + r")(?=\s*[,!])",                       # "Maya, let's start"
+    ):
+        text = re.sub(address, lambda m: m.group(0)[:m.start(1) - m.start()] + _FIRST_NAME_PLACEHOLDER, text)
+
+    if _mentions_name(text, full_name):
+        return None  # Used some other way - can't tell whether it's the student
+    return text
+
+
+class ScenarioCache:
+    """TTL + LRU cache of Flow 1 responses, bounded by entry count and size"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        max_entries: int = 256,
+        max_bytes: int = 32 * 1024 * 1024,
+        ignore_name: bool = True
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ignore_name = ignore_name
+
+        # key -> (expires_at, serialized response, size in bytes, templated
+        # reply text or None)
+        self._entries: "OrderedDict[str, Tuple[float, str, int, Optional[str]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0  # responses not cached because the name couldn't be templated
+
+    @classmethod
+    def from_env(cls) -> Optional["ScenarioCache"]:
+        """
+        Create the cache from environment settings, or None if disabled
+
+        Environment:
+            SCENARIO_CACHE_ENABLED: Turn the cache on (default: false)
+            SCENARIO_CACHE_TTL_SECONDS: Entry lifetime (default: 3600)
+            SCENARIO_CACHE_MAX_ENTRIES: Max cached profiles (default: 256)
+            SCENARIO_CACHE_MAX_MB: Max total size of cached responses (default: 32)
+            SCENARIO_CACHE_IGNORE_NAME: Share entries across student names (default: true)
+        """
+        if os.getenv('SCENARIO_CACHE_ENABLED', 'false').lower() != 'true':
+            return None
+        return cls(
+            ttl_seconds=float(os.getenv('SCENARIO_CACHE_TTL_SECONDS', 3600)),
+            max_entries=int(os.getenv('SCENARIO_CACHE_MAX_ENTRIES', 256)),
+            max_bytes=int(float(os.getenv('SCENARIO_CACHE_MAX_MB', 32)) * 1024 * 1024),
+            ignore_name=os.getenv('SCENARIO_CACHE_IGNORE_NAME', 'true').lower() == 'true'
+        )
+
+    def make_key(self, intake_fields: Dict[str, Any]) -> str:
+        """
+        Canonical hash of the intake tweak fields
+
+        Args:
+            intake_fields: IntakeFormLearnerProfile tweak fields
+
+        Returns:
+            Hex digest identifying the normalized profile
+        """
+        canonical = {}
+        for field, value in intake_fields.items():
+            if field == "full_name" and self.ignore_name:
+                continue
+            if field in _LIST_FIELDS:
+                canonical[field] = _normalize_list(value)
+            else:
+                canonical[field] = _normalize_text(value)
+
+        encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _fill_name(self, text: str, full_name: str) -> str:
+        """Put a student's name into templated reply text"""
+        full_name = " ".join(full_name.split())
+        first_name = full_name.split(" ")[0] if full_name else ""
+        return text.replace(_FULL_NAME_PLACEHOLDER, full_name).replace(_FIRST_NAME_PLACEHOLDER, first_name)
+
+    def get(self, intake_fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached Flow 1 response for an intake profile
+
+        Args:
+            intake_fields: IntakeFormLearnerProfile tweak fields
+
+        Returns:
+            A fresh copy of the cached response (with this student's name
+            filled in), or None on a miss
+        """
+        key = self.make_key(intake_fields)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, serialized, _, templated = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        response = json.loads(serialized)
+        if templated is not None:
+            filled = self._fill_name(templated, intake_fields.get("full_name", ""))
+            response = _replace_strings(response, templated, filled)
+        return response
+
+    def put(self, intake_fields: Dict[str, Any], response: Dict[str, Any]):
+        """
+        Cache a Flow 1 response for an intake profile
+
+        Args:
+            intake_fields: IntakeFormLearnerProfile tweak fields
+            response: Raw LangFlow response
+        """
+        key = self.make_key(intake_fields)
+        templated = None
+        full_name = " ".join(str(intake_fields.get("full_name") or "").split())
+        if self.ignore_name and full_name:
+            text = _reply_text(response)
+            templated = _template_text(text, full_name) if text is not None else None
+            if templated is None:
+                self.uncacheable += 1
+                return
+            response = _replace_strings(response, text, templated)
+            if _mentions_name(json.dumps(response, ensure_ascii=False), full_name):
+                # The name is somewhere other than the reply text - it would leak
+                self.uncacheable += 1
+                return
+        serialized = json.dumps(response, ensure_ascii=False, separators=(",", ":"))
+
+        size = len(serialized.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, serialized, size, templated)
+            self._size += size
+
+            # Evict least recently used entries until within limits
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def clear(self):
+        """Drop all cached responses"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "uncacheable": self.uncacheable,
+            "entries": len(self._entries),
+            "bytes": self._size,
+        }
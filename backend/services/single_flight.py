@@ -0,0 +1,92 @@
+"""
+Single-flight - coalesce concurrent identical LangFlow calls
+
+Double-clicks and frontend retries send the same request again while the
+first flow run is still going. SingleFlight lets every identical call
+await one shared upstream task instead of starting another run.
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.metrics import Counter
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "langflow_single_flight_calls_total",
+    "LangFlow calls by role: leader (ran the flow) or coalesced (shared a leader's run)",
+    ["flow", "role"]
+)
+
+
+def flight_key(
+    flow_name: str,
+    session_id: Optional[str],
+    input_value: Any,
+    tweaks: Optional[Dict[str, Any]]
+) -> str:
+    """Canonical key - identical calls give the same key regardless of dict order"""
+    return json.dumps(
+        [flow_name, session_id, input_value, tweaks or {}],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers share its result
+
+    Every caller gets the same result object, so treat it as read-only.
+    Exceptions are raised to every caller. If all callers go away (e.g.
+    client disconnects), the shared call is cancelled.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]], flow_name: str = "") -> Any:
+        """
+        Run call(), or join the identical call already in flight
+
+        Args:
+            key: Identifies identical calls (see flight_key)
+            call: Coroutine factory, only invoked by the leader
+            flow_name: Flow name for metrics
+
+        Returns:
+            The shared call's result
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            SINGLE_FLIGHT_CALLS.inc(flow=flow_name, role="leader")
+        else:
+            SINGLE_FLIGHT_CALLS.inc(flow=flow_name, role="coalesced")
+
+        flight.waiters += 1
+        try:
+            # Shielded so one caller being cancelled doesn't cancel everyone's call
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
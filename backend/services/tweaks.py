@@ -0,0 +1,117 @@
+"""
+Tweak templates - pre-serialized LangFlow tweaks for the intake form components
+
+Flows 1 and 3 receive the student's intake profile as tweaks keyed by
+component IDs from the flow definitions. The profile never changes during
+a session, so each component's tweak fragment is serialized once per
+profile and cached; a chat turn only looks it up, and starting an exercise
+splices the topic into it. Requests then embed the fragment in the run
+payload as JSON text instead of re-serializing nested dicts.
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Component IDs from flow 341a8f52-0532-4767-9185-90a6bf69d91d (Flow 1)
+# and flow 319348b5-d0e0-463e-af41-3d0989b9a4f6 (Flow 3)
+DEFAULT_COMPONENTS = {
+    "scenario_intake": "IntakeFormLearnerProfile-lSOHp",
+    "exercise_intake": "IntakeFormLearnerProfile-OnNnU",
+    "exercise_topic": "TextInput-1AsYl",
+    # Text input for curriculum snippets (see services.curriculum) - the
+    # stock flow has none, so nothing is sent until one is configured
+    "exercise_curriculum": "",
+}
+
+# Component -> env var that overrides its ID (see services.langflow_config)
+COMPONENT_ENV_VARS = {
+    "scenario_intake": "FLOW_1_INTAKE_COMPONENT",
+    "exercise_intake": "FLOW_3_INTAKE_COMPONENT",
+    "exercise_topic": "FLOW_3_TOPIC_COMPONENT",
+    "exercise_curriculum": "FLOW_3_CURRICULUM_COMPONENT",
+}
+
+# IntakeFormLearnerProfile field -> intake form data key
+_INTAKE_FIELDS = (
+    ("full_name", "full_name"),
+    ("age_group", "age_group"),
+    ("interests", "interests"),
+    ("cultural_refs", "cultural_refs"),
+    ("writing_challenge", "hardest"),  # Map 'hardest' to 'writing_challenge'
+    ("audience", "audience"),
+)
+
+
+def intake_form_fields(student_data: Dict[str, Any]) -> Dict[str, str]:
+    """Map intake form data onto the IntakeFormLearnerProfile component fields"""
+    return {field: student_data.get(key, "") for field, key in _INTAKE_FIELDS}
+
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+class TweakTemplates:
+    """Per-profile cache of serialized tweaks for the intake form components"""
+
+    def __init__(self, components: Optional[Dict[str, str]] = None, max_profiles: int = 4096):
+        """
+        Args:
+            components: Component IDs by role (see DEFAULT_COMPONENTS)
+            max_profiles: Serialized fragments kept per component (LRU)
+        """
+        self.components = {**DEFAULT_COMPONENTS, **(components or {})}
+        self.max_profiles = max_profiles
+        # (component role, profile values) -> '{"<component id>":{...fields}}'
+        self._fragments: "OrderedDict[Tuple[str, Tuple[Any, ...]], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _intake(self, role: str, student_data: Dict[str, Any]) -> str:
+        """Cached tweaks JSON object setting one intake component from the profile"""
+        key = (role, tuple(student_data.get(key, "") for _, key in _INTAKE_FIELDS))
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+
+        fragment = "{%s:%s}" % (_dumps(self.components[role]), _dumps(intake_form_fields(student_data)))
+        with self._lock:
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.max_profiles:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def scenario(self, student_data: Dict[str, Any]) -> str:
+        """Flow 1 tweaks JSON: the intake form"""
+        return self._intake("scenario_intake", student_data)
+
+    def exercise(
+        self,
+        student_data: Dict[str, Any],
+        exercise_topic: Optional[str] = None,
+        curriculum: Optional[str] = None
+    ) -> str:
+        """
+        Flow 3 tweaks JSON: the intake form, plus the exercise topic when starting
+
+        Args:
+            student_data: Intake form data
+            exercise_topic: Topic for the Text Input component (only sent
+                when starting an exercise)
+            curriculum: Curriculum snippets for the curriculum component
+                (only sent when that component is configured)
+        """
+        fragment = self._intake("exercise_intake", student_data)
+        extra = []
+        if exercise_topic is not None:
+            extra.append((self.components["exercise_topic"], exercise_topic))
+        if curriculum and self.components.get("exercise_curriculum"):
+            extra.append((self.components["exercise_curriculum"], curriculum))
+        if not extra:
+            return fragment
+        # Splice the text components into the cached object
+        return "%s,%s}" % (
+            fragment[:-1],
+            ",".join("%s:%s" % (_dumps(component), _dumps({"input_value": value})) for component, value in extra)
+        )
@@ -1,5 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
-import { sendExerciseMessage } from '../services/api';
+import { streamExerciseMessage } from '../services/api';
 import { useSession } from '../context/SessionContext';
 
 // Helper function to detect exercise content
@@ -168,11 +168,25 @@ const ChatInterface = ({ exercise }) => {
     setInputValue('');
     setIsTyping(true);
     setError(null);
+    // Set once the partial reply bubble is shown - an error then replaces it
+    let streamingStarted = false;
 
     try {
       // Call LangFlow API via backend
       console.log('📤 Sending message to LangFlow:', messageText);
-      const result = await sendExerciseMessage(scenarioData.session_id, messageText);
+      // Stream the reply: show the coach's message as tokens arrive
+      let streamedText = '';
+      const result = await streamExerciseMessage(scenarioData.session_id, messageText, (chunk) => {
+        streamedText += chunk;
+        const partial = { role: 'assistant', content: streamedText };
+        if (!streamingStarted) {
+          streamingStarted = true;
+          setIsTyping(false);
+          setMessages(prev => [...prev, partial]);
+        } else {
+          setMessages(prev => [...prev.slice(0, -1), partial]);
+        }
+      });
 
       if (result.success && result.data.message) {
         const aiMessage = {
@@ -180,14 +194,14 @@ const ChatInterface = ({ exercise }) => {
           content: result.data.message
         };
         console.log('📥 Received AI response:', result.data.message);
-        setMessages(prev => [...prev, aiMessage]);
+        setMessages(prev => streamingStarted ? [...prev.slice(0, -1), aiMessage] : [...prev, aiMessage]);
       } else {
         // Error from API
         const errorMessage = {
           role: 'assistant',
           content: `Sorry, I encountered an error: ${result.error || 'Unable to get response'}. Please try again.`
         };
-        setMessages(prev => [...prev, errorMessage]);
+        setMessages(prev => streamingStarted ? [...prev.slice(0, -1), errorMessage] : [...prev, errorMessage]);
         setError(result.error);
       }
     } catch (err) {
@@ -196,7 +210,7 @@ const ChatInterface = ({ exercise }) => {
         role: 'assistant',
         content: "Sorry, I'm having trouble connecting right now. Please try again."
       };
-      setMessages(prev => [...prev, errorMessage]);
+      setMessages(prev => streamingStarted ? [...prev.slice(0, -1), errorMessage] : [...prev, errorMessage]);
       setError('Network error');
     } finally {
       setIsTyping(false);
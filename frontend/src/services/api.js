@@ -172,5 +172,63 @@ export const sendExerciseMessage = async (sessionId, message) => {
   }
 };
 
+/**
+ * Send a chat message and stream the AI coach's reply as it is generated
+ * Reads the Server-Sent Events from /api/onboarding/exercise/chat/stream
+ * @param {string} sessionId - Session ID from exercise start
+ * @param {string} message - User's message
+ * @param {Function} onToken - Called with each text chunk as it arrives
+ * @returns {Promise} Result with the complete message once the stream ends
+ */
+export const streamExerciseMessage = async (sessionId, message, onToken) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/onboarding/exercise/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ session_id: sessionId, message }),
+    });
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => ({}));
+      return { success: false, error: data?.detail || `Error ${response.status}` };
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let fullText = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const rawEvent of events) {
+        const eventLine = rawEvent.split('\n').find(line => line.startsWith('event: '));
+        const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '));
+        if (!eventLine || !dataLine) continue;
+        const event = eventLine.slice(7);
+        const data = JSON.parse(dataLine.slice(6));
+
+        if (event === 'token') {
+          fullText += data.chunk;
+          onToken?.(data.chunk);
+        } else if (event === 'end') {
+          return { success: true, data: { message: data.message || fullText } };
+        } else if (event === 'error') {
+          return { success: false, error: data.detail };
+        }
+      }
+    }
+    // Stream ended without an `end` event (dropped connection, proxy cut-off) - the reply is incomplete
+    return { success: false, error: 'The reply was cut off' };
+  } catch (error) {
+    console.error('Error streaming message:', error);
+    return { success: false, error: `Network error: ${error.message}` };
+  }
+};
+
 export default api;
 